@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['deleted_at', 'updated_at'], name='accounts_ad_deleted_404f36_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='accounts_address_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['deleted_at', 'updated_at'], name='accounts_ot_deleted_7d7fd7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='accounts_otp_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='accounts_profile_keyset'),
+        ),
+    ]
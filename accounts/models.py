@@ -32,7 +32,7 @@ class Address(BaseModel):
     is_default = models.BooleanField(default=False)
     purpose = models.CharField(max_length=20, default="shipping") # shipping/billing
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         constraints = [
             models.UniqueConstraint(
                 fields=["user"],
@@ -57,5 +57,5 @@ class OTP(BaseModel):
     is_used = models.BooleanField(default=False)
 
 
-    class Meta:
-        indexes = [models.Index(fields=["target","purpose","expires_at"])]
\ No newline at end of file
+    class Meta(BaseModel.Meta):
+        indexes = [*BaseModel.Meta.indexes, models.Index(fields=["target","purpose","expires_at"])]
\ No newline at end of file
@@ -62,6 +62,7 @@ class LoginCoreSerializer(LoginRequestSerializer):
         if not getattr(user, "is_active", True):
             raise AuthenticationFailed("حساب کاربری غیرفعال است.")
 
+        self.user = user
         refresh = RefreshToken.for_user(user)
         return {
             "access": str(refresh.access_token),
@@ -1,8 +1,10 @@
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.utils.text import slugify
+
+from core import outbox
 from .models import User, Profile, Address, OTP
-from .tasks import send_otp_email_task, send_otp_sms_task
+from .tasks import send_otp_task
 
 @receiver(post_save, sender=User, dispatch_uid="accounts.create_profile")
 def create_profile(sender, instance: User, created, **kwargs):
@@ -58,22 +60,11 @@ def ensure_single_default_address(sender, instance: Address, **kwargs):
 @receiver(post_save, sender=OTP, dispatch_uid="accounts.send_otp_on_create")
 def send_otp_on_create(sender, instance: OTP, created, **kwargs):
     """
-    When an OTP is created, send it via the configured channel.
-    Uses Celery tasks if available; falls back to direct call if broker is unavailable.
+    When an OTP is created, send it via the configured channel. This is the
+    only place an OTP is sent from (core.notifications routes it to email or SMS).
+    The send goes through the outbox (core.outbox), so it is published even if
+    the broker is down right now, and the request never waits on the broker.
     """
     if not created:
         return
-
-    message = f"Your verification code is: {instance.code}"
-    try:
-        if instance.channel == "email":
-            send_otp_email_task.delay(instance.target, message)
-        else:
-            # default to sms
-            send_otp_sms_task.delay(instance.target, message)
-    except Exception:
-        # Fallback to synchronous execution in environments without broker
-        if instance.channel == "email":
-            send_otp_email_task(instance.target, message)
-        else:
-            send_otp_sms_task(instance.target, message)
+    outbox.enqueue(send_otp_task, str(instance.pk), dedup_key=f"otp:{instance.pk}")
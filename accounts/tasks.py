@@ -4,13 +4,14 @@
 from celery import shared_task
 from django.conf import settings
 # from django.core.exceptions import ImproperlyConfigured
-from django.core.mail import EmailMessage
 from django.utils import timezone
 
+from core.notifications import Notification, dispatch
+
 
 # Note: The SMS sending logic is kept here for completeness.
-# You would need a real SMS gateway provider for it to work.
-# For now, we will focus on the email functionality.
+# You would need a real SMS gateway provider for it to work; plug it into
+# core.notifications.SENDERS["sms"]. For now, we will focus on the email functionality.
 
 
 # def _send_sms_via_gateway(phone_number: str, message: str) -> None:
@@ -48,33 +49,38 @@ from django.utils import timezone
 
 
 @shared_task
-def send_otp_email_task(target_email: str, message: str):
+def send_otp_task(otp_id: str):
     """
-    Celery task to send an OTP code via email asynchronously.
+    Send an OTP code over its channel through the notification dispatcher
+    (core.notifications), once per code. The code is read here instead of
+    travelling in the task message; used or expired codes are not sent.
     """
-    try:
-        subject = getattr(settings, "OTP_EMAIL_SUBJECT", "Your Verification Code")
-        from_email = getattr(settings, "DEFAULT_FROM_EMAIL")
-        
-        email = EmailMessage(subject, message, from_email, [target_email])
-        email.send()
-        print(f"OTP email sent successfully to {target_email}")
-    except Exception as e:
-        # Log the exception in a real project
-        print(f"Failed to send email to {target_email}: {e}")
+    from .models import OTP
+
+    otp = OTP.objects.filter(pk=otp_id, is_used=False, expires_at__gt=timezone.now()).first()
+    if otp is None:
+        return
+    minutes = max(1, round((otp.expires_at - timezone.now()).total_seconds() / 60))
+    dispatch(Notification(
+        "otp",
+        otp.target,
+        f"Your verification code is {otp.code}. It expires in {minutes} minutes.",
+        subject=getattr(settings, "OTP_EMAIL_SUBJECT", "Your Verification Code"),
+        key=f"otp:{otp.pk}",
+        channel=otp.channel,
+    ))
+
+
+# Superseded by send_otp_task; kept so messages queued before it still deliver
+@shared_task
+def send_otp_email_task(target_email: str, message: str):
+    subject = getattr(settings, "OTP_EMAIL_SUBJECT", "Your Verification Code")
+    dispatch(Notification("otp", target_email, message, subject=subject, channel="email"))
+
 
 @shared_task
 def send_otp_sms_task(phone_number: str, message: str):
-    """
-    Celery task to send an OTP code via SMS asynchronously.
-    This is a placeholder and requires a real SMS gateway integration.
-    """
-    print(f"--- SIMULATING SMS ---")
-    print(f"To: {phone_number}")
-    print(f"Message: {message}")
-    print(f"--- END SIMULATION ---")
-    # In a real project, you would have your SMS gateway logic here.
-    # _send_sms_via_gateway(phone_number, message)
+    dispatch(Notification("otp", phone_number, message, channel="sms"))
 
 
 @shared_task
@@ -2,7 +2,7 @@ import random
 from datetime import timedelta
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiResponse
@@ -11,6 +11,7 @@ from rest_framework.permissions import AllowAny
 from rest_framework.throttling import AnonRateThrottle
 
 from marketplace.models import Seller, Store
+from sales import guest_cart
 from .models import Address, OTP, User
 from .permissions import IsOwner
 from .serializers import (
@@ -27,7 +28,6 @@ from .serializers import (
     OTPRequestResponseSerializer,
     OTPVerifyResponseSerializer,
 )
-from .tasks import send_otp_email_task, send_otp_sms_task
 
 
 class RegisterThrottle(AnonRateThrottle):
@@ -74,7 +74,9 @@ class LoginView(generics.GenericAPIView):
     def post(self, request, *args, **kwargs):
         ser = self.get_serializer(data=request.data)
         ser.is_valid(raise_exception=True)
-        return response.Response(ser.validated_data, status=status.HTTP_200_OK)
+        res = response.Response(ser.validated_data, status=status.HTTP_200_OK)
+        guest_cart.merge_on_login(request, res, ser.user)
+        return res
 
 
 class MeView(generics.RetrieveUpdateAPIView):
@@ -166,27 +168,22 @@ class OTPRequestView(generics.CreateAPIView):
         expires_at = timezone.now() + timedelta(minutes=expiry_minutes)
         channel = "email" if "@" in target else "sms"
 
-        OTP.objects.create(
-            target=target,
-            purpose=purpose,
-            code=code,
-            expires_at=expires_at,
-            channel=channel,
-        )
-
-        message_text = f"Your verification code is {code}. It expires in {expiry_minutes} minutes."
+        # accounts.signals.send_otp_on_create sends the code; its outbox row
+        # commits together with the OTP
+        with transaction.atomic():
+            OTP.objects.create(
+                target=target,
+                purpose=purpose,
+                code=code,
+                expires_at=expires_at,
+                channel=channel,
+            )
 
         payload = {"message": "OTP sent successfully."}
         
         if settings.DEBUG:
             payload["code"] = code
 
-
-        if channel == "email":
-            send_otp_email_task.delay(target, message_text)
-        else:
-            send_otp_sms_task.delay(target, message_text)
-
         return response.Response(payload, status=status.HTTP_200_OK)
 
 
@@ -233,7 +230,9 @@ class OTPVerifyView(generics.CreateAPIView):
                 from rest_framework_simplejwt.tokens import RefreshToken
 
                 refresh = RefreshToken.for_user(user)
-                return response.Response({"access": str(refresh.access_token), "refresh": str(refresh)})
+                res = response.Response({"access": str(refresh.access_token), "refresh": str(refresh)})
+                guest_cart.merge_on_login(request, res, user)
+                return res
 
             return response.Response({"error": "User Not Found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -4,9 +4,19 @@ from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
 from core.admin import SoftDeleteAdminMixin
+from .cache import bump_catalog_version
 from .models import Category, Product, ProductVariant
 
 
+class CatalogCacheAdminMixin(SoftDeleteAdminMixin):
+    """Bulk actions use queryset.update() and skip signals; retire cached API responses after them."""
+
+    def response_action(self, request, queryset):
+        response = super().response_action(request, queryset)
+        bump_catalog_version()
+        return response
+
+
 class ProductVariantInline(admin.TabularInline):
     model = ProductVariant
     extra = 0
@@ -16,7 +26,7 @@ class ProductVariantInline(admin.TabularInline):
 
 
 @admin.register(Product)
-class ProductAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
+class ProductAdmin(CatalogCacheAdminMixin, admin.ModelAdmin):
     class HasImageFilter(admin.SimpleListFilter):
         title = _("Has image")
         parameter_name = "has_image"
@@ -98,7 +108,7 @@ class ProductAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
 
 
 @admin.register(ProductVariant)
-class ProductVariantAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
+class ProductVariantAdmin(CatalogCacheAdminMixin, admin.ModelAdmin):
     list_display = (
         "product",
         "name",
@@ -116,7 +126,7 @@ class ProductVariantAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
 
 
 @admin.register(Category)
-class CategoryAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
+class CategoryAdmin(CatalogCacheAdminMixin, admin.ModelAdmin):
     list_display = ("name", "slug", "products_count", "created_at")
     list_filter = ("created_at",)
     search_fields = ("name", "slug")
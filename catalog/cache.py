@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.instrumentation import counter
+
+# How long a cached catalog response may live; a version bump normally retires it first.
+CATALOG_RESPONSE_TTL = getattr(settings, "CATALOG_CACHE_TTL", 300)
+
+VERSION_KEY = "catalog:version"
+
+# Per process, like every other metric served by /metrics (core.views.metrics)
+lookups = counter("catalog_cache_lookups_total", "Catalog response cache lookups by result.")
+
+
+def catalog_version() -> int:
+    """Current catalog version; part of every response key."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version() -> None:
+    """
+    Retire every cached catalog response in one round trip.
+
+    Products embed their category and variants embed their product title, so a
+    single version for the whole catalog keeps invalidation simple and correct.
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # key missing or evicted
+        cache.set(VERSION_KEY, 2, None)
+
+
+def response_key(version: int, full_path: str) -> str:
+    digest = hashlib.md5(full_path.encode()).hexdigest()
+    return f"catalog:response:{version}:{digest}"
+
+
+def compute_etag(data) -> str:
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(",", ":"))
+    return f'"{hashlib.md5(body.encode()).hexdigest()}"'
+
+
+def get_response(key: str):
+    return cache.get(key)
+
+
+def set_response(key: str, entry: dict) -> None:
+    cache.set(key, entry, CATALOG_RESPONSE_TTL)
+
+
+def record_hit() -> None:
+    lookups.inc(result="hit")
+
+
+def record_miss() -> None:
+    lookups.inc(result="miss")
+
+
+def cache_stats() -> dict:
+    values = lookups.snapshot()
+    return {"hits": values.get((("result", "hit"),), 0), "misses": values.get((("result", "miss"),), 0)}
+
+
+def reset_cache_stats() -> None:
+    lookups.reset()
@@ -0,0 +1,128 @@
+"""
+Attribute facet filtering for listings built on ProductVariant.
+
+``?attr.color=red&attr.storage=128GB`` keeps rows whose variant has every
+listed key; repeating a key (``attr.color=red&attr.color=blue``) ORs its values.
+Lookups go through the VariantAttribute side table, whose (key, value, variant)
+unique index answers both the filters and the facet counts.
+"""
+from __future__ import annotations
+
+from django.db.models import Count, Exists, F, OuterRef
+
+from marketplace.models import StoreItem
+from sales.reservations import with_available
+from .models import VariantAttribute
+from .serializers import OfferFilterSerializer
+
+ATTRIBUTE_PARAM_PREFIX = "attr."
+
+# Query params answered from store offers (price, live stock) rather than the catalog
+OFFER_PARAMS = tuple(OfferFilterSerializer().fields)
+
+
+def parse_attribute_filters(query_params) -> dict[str, list[str]]:
+    filters = {}
+    for param in query_params:
+        if param.startswith(ATTRIBUTE_PARAM_PREFIX):
+            values = [v for v in query_params.getlist(param) if v != ""]
+            if values:
+                filters[param[len(ATTRIBUTE_PARAM_PREFIX):]] = values
+    return filters
+
+
+def filter_by_attributes(queryset, filters: dict[str, list[str]], variant_path: str = "", exclude_key=None):
+    """
+    Restrict ``queryset`` to rows whose variant matches ``filters``.
+
+    ``variant_path`` is the lookup prefix from the queryset's model to
+    ProductVariant ("" for variants, "variant__" for store items).
+    """
+    for key, values in filters.items():
+        if key == exclude_key:
+            continue
+        variants = VariantAttribute.objects.filter(key=key, value__in=values).values("variant_id")
+        queryset = queryset.filter(**{f"{variant_path}pk__in": variants})
+    return queryset
+
+
+def _value_counts(queryset, variant_path: str, key=None) -> dict[str, list[dict]]:
+    rows = f"{variant_path}attribute_rows"
+    if key is not None:
+        queryset = queryset.filter(**{f"{rows}__key": key})
+    counts = (
+        queryset.order_by()
+        .values(facet_key=F(f"{rows}__key"), facet_value=F(f"{rows}__value"))
+        .annotate(count=Count("pk", distinct=True))
+    )
+    facets: dict[str, list[dict]] = {}
+    for row in counts:
+        if row["facet_key"] is not None:
+            facets.setdefault(row["facet_key"], []).append({"value": row["facet_value"], "count": row["count"]})
+    return facets
+
+
+def attribute_facets(queryset, filters: dict[str, list[str]], variant_path: str = "") -> dict[str, list[dict]]:
+    """
+    Per-key value counts for ``queryset`` (already narrowed by every non-attribute filter).
+
+    Counts for a key the client is filtering on ignore that key's own filter, so
+    the other values of a selected facet stay visible (disjunctive faceting).
+    Costs one grouped query plus one per filtered key.
+    """
+    facets = {
+        key: values
+        for key, values in _value_counts(filter_by_attributes(queryset, filters, variant_path), variant_path).items()
+        if key not in filters
+    }
+    for key in filters:
+        narrowed = filter_by_attributes(queryset, filters, variant_path, exclude_key=key)
+        facets[key] = _value_counts(narrowed, variant_path, key=key).get(key, [])
+    for values in facets.values():
+        values.sort(key=lambda facet: (-facet["count"], facet["value"]))
+    return facets
+
+
+class AttributeFacetMixin:
+    """
+    Adds attribute filters, price range and in-stock filtering to a list action,
+    and returns attribute facet counts next to the page as ``facets``.
+
+    Views set ``variant_path`` (see ``filter_by_attributes``) and ``offer_path``,
+    the StoreItem lookup pointing back at their rows ("variant" for variants,
+    "pk" for store items). Price and stock conditions keep rows with one active
+    offer meeting all of them; in stock means units left after live reservations.
+    """
+    variant_path = ""
+    offer_path = "variant"
+
+    def filter_offers(self, queryset, min_price=None, max_price=None, in_stock=False):
+        if min_price is None and max_price is None and not in_stock:
+            return queryset
+        offers = StoreItem.objects.filter(is_active=True, **{self.offer_path: OuterRef("pk")})
+        if min_price is not None:
+            offers = offers.filter(price__gte=min_price)
+        if max_price is not None:
+            offers = offers.filter(price__lte=max_price)
+        if in_stock:
+            offers = with_available(offers).filter(available__gt=0)
+        return queryset.filter(Exists(offers))
+
+    def _offer_filtered(self, queryset):
+        params = OfferFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return self.filter_offers(queryset, **params.validated_data)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action != "list":
+            return queryset
+        filters = parse_attribute_filters(self.request.query_params)
+        return filter_by_attributes(self._offer_filtered(queryset), filters, self.variant_path)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if isinstance(response.data, dict):
+            base = self._offer_filtered(self.get_queryset())
+            response.data["facets"] = attribute_facets(base, parse_attribute_filters(request.query_params), self.variant_path)
+        return response
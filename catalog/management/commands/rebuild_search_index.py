@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from catalog.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the product full-text search index from scratch (Postgres search_vector "
+        "or the SQLite FTS5 table). Run after bulk imports."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Product search index rebuilt."))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['deleted_at', 'updated_at'], name='catalog_cat_deleted_0d21c5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='catalog_category_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['deleted_at', 'updated_at'], name='catalog_pro_deleted_4b2efe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='catalog_product_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['deleted_at', 'updated_at'], name='catalog_pro_deleted_7d5e35_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='catalog_productvariant_keyset'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+# See catalog.search for how these structures are queried and maintained.
+FORWARD = {
+    "postgresql": [
+        "ALTER TABLE catalog_product ADD COLUMN search_vector tsvector",
+        "CREATE INDEX catalog_product_search_gin ON catalog_product USING GIN (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE catalog_product_fts USING fts5("
+        "product_id UNINDEXED, title, category, attributes, description, tokenize = 'unicode61 remove_diacritics 2')",
+    ],
+}
+
+BACKWARD = {
+    "postgresql": [
+        "DROP INDEX IF EXISTS catalog_product_search_gin",
+        "ALTER TABLE catalog_product DROP COLUMN IF EXISTS search_vector",
+    ],
+    "sqlite": ["DROP TABLE IF EXISTS catalog_product_fts"],
+}
+
+
+# Initial fill of the index, frozen here rather than imported from catalog.search,
+# which follows the current models. Placeholders: product, category, variant tables.
+FILL = {
+    "postgresql": (
+        "UPDATE {0} p SET search_vector = "
+        "setweight(to_tsvector('simple', coalesce(p.title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(c.name, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(("
+        "SELECT string_agg(a.value, ' ') FROM {2} v "
+        "CROSS JOIN LATERAL jsonb_each_text("
+        "CASE WHEN jsonb_typeof(v.attributes) = 'object' THEN v.attributes ELSE '{{}}'::jsonb END) a "
+        "WHERE v.product_id = p.id AND v.deleted_at IS NULL"
+        "), '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(p.description, '')), 'C') "
+        "FROM {1} c WHERE c.id = p.category_id"
+    ),
+    "sqlite": (
+        "INSERT INTO {0}_fts (product_id, title, category, attributes, description) "
+        "SELECT p.id, p.title, c.name, ("
+        "SELECT group_concat(j.value, ' ') FROM {2} v, json_each(v.attributes) j "
+        "WHERE v.product_id = p.id AND v.deleted_at IS NULL"
+        "), p.description "
+        "FROM {0} p JOIN {1} c ON c.id = p.category_id"
+    ),
+}
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = FORWARD.get(vendor)
+    if not statements:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+    tables = [apps.get_model("catalog", name)._meta.db_table for name in ("Product", "Category", "ProductVariant")]
+    schema_editor.execute(FILL[vendor].format(*tables))
+
+
+def drop_search_index(apps, schema_editor):
+    for sql in BACKWARD.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
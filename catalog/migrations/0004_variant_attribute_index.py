@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:27
+
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def attribute_pairs(attributes):
+    """Frozen copy of catalog.models.attribute_pairs as of this migration."""
+    if not isinstance(attributes, dict):
+        return []
+    pairs = set()
+    for key, value in attributes.items():
+        for item in value if isinstance(value, list) else [value]:
+            if item is None:
+                continue
+            text = item if isinstance(item, str) else json.dumps(item, ensure_ascii=False)
+            pairs.add((str(key)[:64], text[:255]))
+    return sorted(pairs)
+
+
+def backfill_variant_attributes(apps, schema_editor):
+    ProductVariant = apps.get_model("catalog", "ProductVariant")
+    VariantAttribute = apps.get_model("catalog", "VariantAttribute")
+    rows = []
+    for variant_id, attributes in ProductVariant.objects.filter(attributes__isnull=False).values_list("id", "attributes").iterator():
+        rows.extend(VariantAttribute(variant_id=variant_id, key=k, value=v) for k, v in attribute_pairs(attributes))
+        if len(rows) >= 1000:
+            VariantAttribute.objects.bulk_create(rows)
+            rows = []
+    VariantAttribute.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariantAttribute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('value', models.CharField(max_length=255)),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attribute_rows', to='catalog.productvariant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('key', 'value', 'variant'), name='uniq_variant_attribute')],
+            },
+        ),
+        migrations.RunPython(backfill_variant_attributes, migrations.RunPython.noop),
+    ]
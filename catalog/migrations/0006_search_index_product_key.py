@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# 0003 first keyed the SQLite FTS5 table on catalog_product's rowid, which table
+# rebuilds renumber. Databases created that way get the table re-created keyed
+# on product_id and refilled; newer ones already have it and are left alone.
+CREATE = (
+    "CREATE VIRTUAL TABLE {0}_fts USING fts5("
+    "product_id UNINDEXED, title, category, attributes, description, "
+    "tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+FILL = (
+    "INSERT INTO {0}_fts (product_id, title, category, attributes, description) "
+    "SELECT p.id, p.title, c.name, ("
+    "SELECT group_concat(j.value, ' ') FROM {2} v, json_each(v.attributes) j "
+    "WHERE v.product_id = p.id AND v.deleted_at IS NULL"
+    "), p.description "
+    "FROM {0} p JOIN {1} c ON c.id = p.category_id"
+)
+
+
+def key_search_index_on_product_id(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    tables = [apps.get_model("catalog", name)._meta.db_table for name in ("Product", "Category", "ProductVariant")]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA table_info({tables[0]}_fts)")
+        columns = [row[1] for row in cursor.fetchall()]
+    if "product_id" in columns:
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {tables[0]}_fts")
+    schema_editor.execute(CREATE.format(*tables))
+    schema_editor.execute(FILL.format(*tables))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(key_search_index_on_product_id, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,14 @@
+import json
+
 from django.db import models
 from django.utils.text import slugify
-from core.models import BaseModel
+from core.models import BaseModel, RatingSummary
 
 class Category(BaseModel):
     name = models.CharField(max_length=120, unique=True)
     slug = models.SlugField(max_length=140, unique=True, blank=True)
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         ordering = ["name"]
 
     def save(self, *args, **kwargs):
@@ -33,7 +35,7 @@ class Category(BaseModel):
 #     def __str__(self):
 #         return self.name
 
-class Product(BaseModel):
+class Product(BaseModel, RatingSummary):
     category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name="products")
     title = models.CharField(max_length=180)
     slug = models.SlugField(max_length=200, unique=True, blank=True)
@@ -42,11 +44,18 @@ class Product(BaseModel):
     is_active = models.BooleanField(default=True)
     image = models.ImageField(upload_to="products/", blank=True, null=True)
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         ordering = ["title"]
         indexes = [
+            *BaseModel.Meta.indexes,
             models.Index(fields=["slug"]),
             models.Index(fields=["is_active"]),
+            # ?ordering=-rating_avg walks this index (see core.pagination)
+            models.Index(
+                fields=["-rating_avg", "-created_at", "-id"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="catalog_product_rating",
+            ),
         ]
 
     def save(self, *args, **kwargs):
@@ -63,8 +72,56 @@ class ProductVariant(BaseModel):
     attributes = models.JSONField(blank=True, null=True) # {"color":"red","storage":"128GB","warranty":"IR"}
     is_active = models.BooleanField(default=True)
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         unique_together = (("product", "name"),)
 
     def __str__(self):
         return f"{self.product.title} - {self.name}"
+
+    def sync_attribute_index(self):
+        """
+        Rewrite this variant's VariantAttribute rows from ``attributes``
+        (one delete + one bulk insert).
+        """
+        VariantAttribute.objects.filter(variant=self).delete()
+        VariantAttribute.objects.bulk_create(
+            [VariantAttribute(variant=self, key=key, value=value) for key, value in attribute_pairs(self.attributes)]
+        )
+        return self
+
+
+def attribute_pairs(attributes):
+    """
+    Flatten an attributes dict into (key, value) string pairs as they are matched
+    by ``?attr.<key>=<value>``. Lists give one pair per element; other non-string
+    values are stored as their JSON text ("true", "4").
+    """
+    if not isinstance(attributes, dict):
+        return []
+    pairs = set()
+    for key, value in attributes.items():
+        for item in value if isinstance(value, list) else [value]:
+            if item is None:
+                continue
+            text = item if isinstance(item, str) else json.dumps(item, ensure_ascii=False)
+            pairs.add((str(key)[:64], text[:255]))
+    return sorted(pairs)
+
+
+class VariantAttribute(models.Model):
+    """
+    Normalized copy of ProductVariant.attributes, one row per key/value pair,
+    so attribute filters and facet counts are index lookups instead of JSON scans.
+    Maintained by catalog.signals via ProductVariant.sync_attribute_index().
+    """
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name="attribute_rows")
+    key = models.CharField(max_length=64)
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["key", "value", "variant"], name="uniq_variant_attribute"),
+        ]
+
+    def __str__(self):
+        return f"{self.key}={self.value}"
@@ -0,0 +1,225 @@
+"""
+Full-text product search backed by a database-maintained inverted index.
+
+Each supported database gets its own index structure, created by the
+``catalog`` migration ``0003_product_search_index``:
+
+- PostgreSQL: a ``search_vector tsvector`` column on ``catalog_product`` with a
+  GIN index. Title (A), category and variant attribute values (B) and description
+  (C) are weighted; ranking uses ``ts_rank``.
+- SQLite: an FTS5 shadow table ``catalog_product_fts`` keyed by the product's
+  id in an UNINDEXED ``product_id`` column; ranking uses ``bm25``. Rowids of
+  ``catalog_product`` (a UUID primary key) are not stable: table rebuilds by
+  later migrations, VACUUM and reuse after deletes renumber them.
+
+Documents are refreshed by catalog.signals on Product/Category/ProductVariant
+writes. Soft-deleted and inactive products stay indexed and are filtered at
+query time, so queryset-level soft deletes/restores need no reindex. Paths that
+change indexed text without signals (bulk_create, queryset.update) should call
+``reindex_products`` or the ``rebuild_search_index`` command.
+"""
+from __future__ import annotations
+
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+from .models import Category, Product, ProductVariant
+
+PRODUCT_TABLE = Product._meta.db_table
+CATEGORY_TABLE = Category._meta.db_table
+VARIANT_TABLE = ProductVariant._meta.db_table
+FTS_TABLE = f"{PRODUCT_TABLE}_fts"
+
+MAX_TERMS = 8
+
+_TERM_RE = re.compile(r"\w+")
+
+
+def parse_terms(query: str) -> list[str]:
+    """Split a user query into lowercase word tokens; punctuation never reaches the engine."""
+    return _TERM_RE.findall((query or "").lower())[:MAX_TERMS]
+
+
+class PostgresSearchBackend:
+    from_sql = f"{PRODUCT_TABLE} p"
+
+    def reindex(self, where: str, params: list) -> None:
+        attributes = (
+            f"SELECT string_agg(a.value, ' ') FROM {VARIANT_TABLE} v "
+            "CROSS JOIN LATERAL jsonb_each_text("
+            "CASE WHEN jsonb_typeof(v.attributes) = 'object' THEN v.attributes ELSE '{}'::jsonb END) a "
+            "WHERE v.product_id = p.id AND v.deleted_at IS NULL"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {PRODUCT_TABLE} p SET search_vector = "
+                "setweight(to_tsvector('simple', coalesce(p.title, '')), 'A') || "
+                "setweight(to_tsvector('simple', coalesce(c.name, '')), 'B') || "
+                f"setweight(to_tsvector('simple', coalesce(({attributes}), '')), 'B') || "
+                "setweight(to_tsvector('simple', coalesce(p.description, '')), 'C') "
+                f"FROM {CATEGORY_TABLE} c WHERE c.id = p.category_id AND {where}",
+                params,
+            )
+
+    def unindex(self, where: str, params: list) -> None:
+        # The vector lives on the product row and goes away with it
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def match(self, terms: list[str]) -> tuple[str, list, str, list]:
+        """Return (where, params, order_by, order_params) for the given terms."""
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        return (
+            "p.search_vector @@ to_tsquery('simple', %s)",
+            [tsquery],
+            "ts_rank(p.search_vector, to_tsquery('simple', %s)) DESC",
+            [tsquery],
+        )
+
+
+class SQLiteSearchBackend:
+    from_sql = f"{FTS_TABLE} f JOIN {PRODUCT_TABLE} p ON p.id = f.product_id"
+
+    def reindex(self, where: str, params: list) -> None:
+        attributes = (
+            f"SELECT group_concat(j.value, ' ') FROM {VARIANT_TABLE} v, json_each(v.attributes) j "
+            "WHERE v.product_id = p.id AND v.deleted_at IS NULL"
+        )
+        with connection.cursor() as cursor:
+            self._delete(cursor, where, params)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (product_id, title, category, attributes, description) "
+                f"SELECT p.id, p.title, c.name, ({attributes}), p.description "
+                f"FROM {PRODUCT_TABLE} p JOIN {CATEGORY_TABLE} c ON c.id = p.category_id "
+                f"WHERE {where}",
+                params,
+            )
+
+    def unindex(self, where: str, params: list) -> None:
+        with connection.cursor() as cursor:
+            self._delete(cursor, where, params)
+
+    def clear(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    def _delete(self, cursor, where: str, params: list) -> None:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE product_id IN (SELECT p.id FROM {PRODUCT_TABLE} p WHERE {where})",
+            params,
+        )
+
+    def match(self, terms: list[str]) -> tuple[str, list, str, list]:
+        expression = " ".join(f'"{term}"*' for term in terms)
+        # bm25 weights follow column order: product_id (unindexed), title, category, attributes, description
+        return f"{FTS_TABLE} MATCH %s", [expression], f"bm25({FTS_TABLE}, 0.0, 10.0, 4.0, 4.0, 1.0)", []
+
+
+_BACKENDS = {
+    "postgresql": PostgresSearchBackend,
+    "sqlite": SQLiteSearchBackend,
+}
+
+
+def get_backend():
+    """Search backend for the default database, or None if its vendor has no index."""
+    backend = _BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+def _pk(value):
+    return Product._meta.pk.get_db_prep_value(value, connection)
+
+
+def _in_clause(column: str, values) -> tuple[str, list]:
+    values = [_pk(v) for v in values]
+    return f"{column} IN ({', '.join(['%s'] * len(values))})", values
+
+
+def reindex_products(product_ids) -> None:
+    """Refresh the search documents of the given products (one statement per step)."""
+    backend = get_backend()
+    product_ids = list(product_ids)
+    if backend and product_ids:
+        backend.reindex(*_in_clause("p.id", product_ids))
+
+
+def reindex_category(category_id) -> None:
+    """A category rename changes the documents of every product in it."""
+    backend = get_backend()
+    if backend:
+        backend.reindex("p.category_id = %s", [_pk(category_id)])
+
+
+def unindex_products(product_ids) -> None:
+    """Drop search documents ahead of a hard delete, while the rows can still be found."""
+    backend = get_backend()
+    product_ids = list(product_ids)
+    if backend and product_ids:
+        backend.unindex(*_in_clause("p.id", product_ids))
+
+
+def rebuild_index() -> None:
+    backend = get_backend()
+    if backend is None:
+        raise ImproperlyConfigured(f"Product search is not supported on {connection.vendor!r}.")
+    backend.clear()
+    backend.reindex("1 = 1", [])
+
+
+def search_products(query: str, *, category_id=None, limit: int = 20, offset: int = 0) -> dict:
+    """
+    Rank active products matching every term of ``query`` (prefix matches included).
+
+    Returns ``{"count", "results", "facets"}``: ``results`` is a page of Product
+    instances in relevance order, and ``facets`` holds per-category match counts,
+    computed for the query without the category filter so clients can switch
+    categories. Ranking, filtering and counting all happen in the database.
+    """
+    backend = get_backend()
+    if backend is None:
+        raise ImproperlyConfigured(f"Product search is not supported on {connection.vendor!r}.")
+    terms = parse_terms(query)
+    if not terms:
+        return {"count": 0, "results": [], "facets": []}
+
+    match_where, match_params, order_by, order_params = backend.match(terms)
+    where = f"{match_where} AND p.deleted_at IS NULL AND p.is_active"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT p.category_id, COUNT(*) FROM {backend.from_sql} WHERE {where} GROUP BY p.category_id",
+            match_params,
+        )
+        category_counts = {Category._meta.pk.to_python(cid): n for cid, n in cursor.fetchall()}
+
+        page_where, page_params = where, list(match_params)
+        if category_id is not None:
+            page_where += " AND p.category_id = %s"
+            page_params.append(_pk(category_id))
+        cursor.execute(
+            f"SELECT p.id FROM {backend.from_sql} WHERE {page_where} "
+            f"ORDER BY {order_by}, p.id LIMIT %s OFFSET %s",
+            [*page_params, *order_params, limit, offset],
+        )
+        ids = [Product._meta.pk.to_python(row[0]) for row in cursor.fetchall()]
+
+    products = Product.objects.select_related("category").in_bulk(ids)
+    categories = Category.objects.in_bulk(list(category_counts))
+    facets = sorted(
+        (
+            {"id": cid, "name": categories[cid].name, "slug": categories[cid].slug, "count": n}
+            for cid, n in category_counts.items()
+            if cid in categories
+        ),
+        key=lambda facet: (-facet["count"], facet["name"]),
+    )
+    if category_id is None:
+        count = sum(category_counts.values())
+    else:
+        count = category_counts.get(Category._meta.pk.to_python(category_id), 0)
+    return {"count": count, "results": [products[pk] for pk in ids if pk in products], "facets": facets}
@@ -10,6 +10,7 @@ class CategorySerializer(serializers.ModelSerializer):
 
 class ProductSerializer(serializers.ModelSerializer):
     category_detail = CategorySerializer(source="category", read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = Product
@@ -17,9 +18,10 @@ class ProductSerializer(serializers.ModelSerializer):
             "id", "category", "category_detail",
             "title", "slug", "description",
             "price", "is_active", "image",
+            "rating_avg", "rating_count", "rating_histogram",
             "created_at", "updated_at",
         ]
-        read_only_fields = ["id", "slug", "created_at", "updated_at"]
+        read_only_fields = ["id", "slug", "rating_avg", "rating_count", "created_at", "updated_at"]
 
 class ProductVariantSerializer(serializers.ModelSerializer):
     product_title = serializers.CharField(source="product.title", read_only=True)
@@ -27,3 +29,30 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         model = ProductVariant
         fields = ["id","product","product_title","name","attributes","is_active","created_at","updated_at"]
         read_only_fields = ["id","created_at","updated_at"]
+
+
+class ProductSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    category = serializers.UUIDField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    offset = serializers.IntegerField(min_value=0, max_value=10_000, default=0)
+
+
+class CategoryFacetSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    name = serializers.CharField()
+    slug = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class ProductSearchResponseSerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    results = ProductSerializer(many=True)
+    facets = CategoryFacetSerializer(many=True)
+
+
+class OfferFilterSerializer(serializers.Serializer):
+    """Price range / availability query params shared by variant and store item listings."""
+    min_price = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    in_stock = serializers.BooleanField(required=False, default=False)
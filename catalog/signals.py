@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import Category, Product, ProductVariant
+from .search import reindex_category, reindex_products, unindex_products
+
+
+@receiver(post_save, sender=Category, dispatch_uid="catalog.invalidate_on_category_save")
+@receiver(post_delete, sender=Category, dispatch_uid="catalog.invalidate_on_category_delete")
+@receiver(post_save, sender=Product, dispatch_uid="catalog.invalidate_on_product_save")
+@receiver(post_delete, sender=Product, dispatch_uid="catalog.invalidate_on_product_delete")
+@receiver(post_save, sender=ProductVariant, dispatch_uid="catalog.invalidate_on_variant_save")
+@receiver(post_delete, sender=ProductVariant, dispatch_uid="catalog.invalidate_on_variant_delete")
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """
+    Any catalog write retires the cached API responses.
+
+    BaseModel.delete/restore save with update_fields, so soft deletes arrive here
+    as post_save; hard deletes arrive as post_delete. Queryset-level update()/
+    soft deletes skip signals and must call bump_catalog_version() themselves.
+    """
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product, dispatch_uid="catalog.reindex_product_on_save")
+def reindex_product_on_save(sender, instance: Product, **kwargs):
+    reindex_products([instance.pk])
+
+
+@receiver(pre_delete, sender=Product, dispatch_uid="catalog.unindex_product_on_delete")
+def unindex_product_on_delete(sender, instance: Product, **kwargs):
+    unindex_products([instance.pk])
+
+
+@receiver(post_save, sender=Category, dispatch_uid="catalog.reindex_category_on_save")
+def reindex_category_on_save(sender, instance: Category, created, **kwargs):
+    if not created:
+        reindex_category(instance.pk)
+
+
+@receiver(post_save, sender=ProductVariant, dispatch_uid="catalog.reindex_variant_on_save")
+@receiver(post_delete, sender=ProductVariant, dispatch_uid="catalog.reindex_variant_on_delete")
+def reindex_variant_product(sender, instance: ProductVariant, **kwargs):
+    """Variant attribute values are part of their product's search document."""
+    reindex_products([instance.product_id])
+
+
+@receiver(post_save, sender=ProductVariant, dispatch_uid="catalog.sync_variant_attribute_index")
+def sync_variant_attribute_index(sender, instance: ProductVariant, update_fields=None, **kwargs):
+    """Keep the VariantAttribute side table in step with ``attributes``; saves that skip it are ignored."""
+    if update_fields is not None and "attributes" not in update_fields:
+        return
+    instance.sync_attribute_index()
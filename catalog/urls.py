@@ -1,5 +1,6 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductVariantViewSet, ProductViewSet
+from .views import CategoryViewSet, ProductSearchView, ProductVariantViewSet, ProductViewSet
 
 router = DefaultRouter()
 router.register(r"categories", CategoryViewSet, basename="category")
@@ -7,4 +8,7 @@ router.register(r"products", ProductViewSet, basename="product")
 router.register(r"product-variants", ProductVariantViewSet, basename="product-variant")
 # router.register(r"variants", ProductVariantViewSet, basename="variant")
 
-urlpatterns = router.urls
+urlpatterns = [
+    path("search/", ProductSearchView.as_view(), name="product-search"),
+    *router.urls,
+]
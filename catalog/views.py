@@ -1,19 +1,110 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework import status
+from rest_framework.filters import OrderingFilter
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import AllowAny
+from . import cache as catalog_cache
+from .filters import OFFER_PARAMS, AttributeFacetMixin
+from core.instrumentation import InstrumentedViewMixin
 from .models import Category, Product, ProductVariant
-from .serializers import CategorySerializer, ProductSerializer, ProductVariantSerializer
+from .search import search_products
+from .serializers import (
+    CategorySerializer,
+    ProductSearchQuerySerializer,
+    ProductSearchResponseSerializer,
+    ProductSerializer,
+    ProductVariantSerializer,
+)
 
-class CategoryViewSet(ModelViewSet):
+
+class CachedReadMixin:
+    """
+    Serve list/retrieve from the versioned catalog response cache (see catalog.cache).
+
+    Responses are keyed by catalog version + full path (query string included) and
+    carry an ETag, so clients sending a matching If-None-Match get a 304. Catalog
+    reads are public, so the cached body is the same for every user.
+
+    Requests carrying one of ``uncached_params`` are always rendered: their
+    answer depends on data outside the catalog version (offer prices, stock).
+    """
+    uncached_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve, request, *args, **kwargs)
+
+    def _cached_response(self, render, request, *args, **kwargs):
+        if any(param in request.query_params for param in self.uncached_params):
+            return render(request, *args, **kwargs)
+        # Read the version before rendering: a write racing with us bumps it, and
+        # our (possibly stale) entry lands under a key nobody reads any more.
+        key = catalog_cache.response_key(catalog_cache.catalog_version(), request.get_full_path())
+        entry = catalog_cache.get_response(key)
+        if entry is None:
+            catalog_cache.record_miss()
+            response = render(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {"data": response.data, "etag": catalog_cache.compute_etag(response.data)}
+            catalog_cache.set_response(key, entry)
+        else:
+            catalog_cache.record_hit()
+
+        headers = {"ETag": entry["etag"]}
+        if_none_match = request.headers.get("If-None-Match", "")
+        if entry["etag"] in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(entry["data"], headers=headers)
+
+
+class CategoryViewSet(InstrumentedViewMixin, CachedReadMixin, ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
 
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(InstrumentedViewMixin, CachedReadMixin, ModelViewSet):
     queryset = Product.objects.select_related("category").all()
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    page_size = 24
+    max_page_size = 96
+    filter_backends = [OrderingFilter]
+    ordering_fields = ["rating_avg", "created_at"]
 
-class ProductVariantViewSet(ModelViewSet):
+class ProductVariantViewSet(InstrumentedViewMixin, CachedReadMixin, AttributeFacetMixin, ModelViewSet):
     queryset = ProductVariant.objects.select_related("product").all()
     serializer_class = ProductVariantSerializer
-    permission_classes = [AllowAny]
\ No newline at end of file
+    permission_classes = [AllowAny]
+    page_size = 24
+    max_page_size = 96
+    uncached_params = OFFER_PARAMS
+
+
+class ProductSearchView(CachedReadMixin, APIView):
+    """Ranked full-text search over products; see catalog.search."""
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        parameters=[ProductSearchQuerySerializer],
+        responses={200: ProductSearchResponseSerializer},
+        description="Search active products by title, description, category and variant attributes. "
+                    "Words match as prefixes; facets count matches per category.",
+    )
+    def get(self, request):
+        return self._cached_response(self._search, request)
+
+    def _search(self, request):
+        params = ProductSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        found = search_products(
+            params.validated_data["q"],
+            category_id=params.validated_data.get("category"),
+            limit=params.validated_data["limit"],
+            offset=params.validated_data["offset"],
+        )
+        return Response(ProductSearchResponseSerializer(found, context={"request": request}).data)
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.instrumentation.QueryMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -170,6 +171,9 @@ AUTH_USER_MODEL = "accounts.User"
 # Inventory alert threshold (can be overridden via env)
 INVENTORY_LOW_STOCK_THRESHOLD = int(os.getenv("INVENTORY_LOW_STOCK_THRESHOLD", 3))
 
+# Seconds a cached cart pricing snapshot may live (see sales.cache)
+CART_PRICING_CACHE_TTL = int(os.getenv("CART_PRICING_CACHE_TTL", 300))
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -177,7 +181,10 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    # Keyset pagination on (created_at, id); views can tune page_size/max_page_size
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 20,
 }
 
 permission_classes = [
@@ -237,9 +244,11 @@ SPECTACULAR_SETTINGS = {
 
 
     - سبد خرید و سفارش:
-      - GET /api/sales/cart/ → مشاهده سبد (اتوماتیک ساخته می‌شود)
+      - GET /api/sales/cart/ → مشاهده سبد (مهمان‌ها: سبد مهمان در Redis با کوکی امضاشده)
       - POST /api/sales/cart/add-item/
         {"store_item": "<UUID>", "quantity": 2}
+      - PATCH /api/sales/cart/items/ → تغییر چند ردیف سبد در یک درخواست
+        {"items": [{"store_item": "<UUID>", "quantity": 3}, {"store_item": "<UUID>", "delta": -1}]}
       - POST /api/sales/cart/checkout/ → ساخت Order از Cart
 
 
@@ -251,7 +260,7 @@ SPECTACULAR_SETTINGS = {
       
 
     3) رویدادها و سیگنال‌ها (Behavior):
-    - ساخت Cart خودکار: بعد از ثبت‌نام کاربر
+    - ساخت Cart: با اولین افزودن کالا؛ سبد مهمان هنگام ورود (login/OTP) ادغام می‌شود
     - Address پیش‌فرض تکی: هنگام ذخیره آدرس جدید با is_default=True
     - همگام‌سازی Payment: با تغییر آیتم‌های سفارش یا authority/amount
     - تغییر وضعیت سفارش:
@@ -442,6 +451,30 @@ try:
             "task": "accounts.tasks.prune_expired_otps_task",
             "schedule": crontab(minute=0),  # hourly at minute 0
         },
+        "reconcile-rating-aggregates-nightly": {
+            "task": "reviews.tasks.reconcile_rating_aggregates_task",
+            "schedule": crontab(hour=3, minute=30),
+        },
+        "expire-stale-reservations-every-minute": {
+            "task": "sales.tasks.expire_stale_reservations_task",
+            "schedule": crontab(minute="*"),
+        },
+        "reconcile-hot-stock-every-minute": {
+            "task": "marketplace.tasks.reconcile_hot_stock_task",
+            "schedule": crontab(minute="*"),
+        },
+        "relay-outbox-every-10-seconds": {
+            "task": "core.tasks.relay_outbox_task",
+            "schedule": 10.0,
+        },
+        "prune-outbox-nightly": {
+            "task": "core.tasks.prune_outbox_task",
+            "schedule": crontab(hour=4, minute=0),
+        },
+        "reconcile-stale-payments-every-5-minutes": {
+            "task": "payments.tasks.reconcile_payments_task",
+            "schedule": crontab(minute="*/5"),
+        },
     }
 except Exception:
     # Celery may not be installed during some CI steps; ignore
@@ -458,14 +491,79 @@ CELERY_RESULT_BACKEND = "redis://127.0.0.1:6379/0"
 #     },
 # }
 
-# CACHES = {
-#     "default": {
-#         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-#     }
-# }
-
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+}
+
+# Seconds a cached catalog API response may live (see catalog.cache)
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", 300))
+
+# Seconds checkout holds stock for an unpaid order (see sales.reservations)
+STOCK_RESERVATION_TTL = int(os.getenv("STOCK_RESERVATION_TTL", 15 * 60))
+
+# Redis holding the stock counters of hot (flash-sale) StoreItems (see marketplace.hot_stock)
+HOT_STOCK_REDIS_URL = os.getenv("HOT_STOCK_REDIS_URL", REDIS_URL)
+
+# Checkout admission control for carts with hot items (see sales.waiting_room):
+# passes per second, burst size, pass lifetime and how long a silent client keeps its place
+WAITING_ROOM_REDIS_URL = os.getenv("WAITING_ROOM_REDIS_URL", REDIS_URL)
+WAITING_ROOM = {
+    "ENABLED": os.getenv("WAITING_ROOM_ENABLED", "1") == "1",
+    "RATE": float(os.getenv("WAITING_ROOM_RATE", 10)),
+    "BURST": int(os.getenv("WAITING_ROOM_BURST", 10)),
+    "PASS_TTL": 120,
+    "HEARTBEAT_TTL": 30,
+}
+
+# Anonymous shoppers' carts (see sales.guest_cart): cookie name and idle lifetime
+GUEST_CART_REDIS_URL = os.getenv("GUEST_CART_REDIS_URL", REDIS_URL)
+GUEST_CART = {
+    "COOKIE": "guest_cart",
+    "TTL": int(os.getenv("GUEST_CART_TTL", 7 * 24 * 60 * 60)),
+}
+
+# Idempotency-Key replay window, and how long a duplicate may wait for the first
+# request (lock outlives the 15s gateway timeout) (see core.idempotency)
+IDEMPOTENCY = {"TTL": 24 * 60 * 60, "LOCK_TTL": 30, "WAIT": 20}
+
+# Transactional outbox for Celery tasks (see core.outbox): rows per relay batch,
+# publish attempts before a row is DEAD, backoff base/cap and sent-row retention
+# in seconds, and the idle poll of `manage.py outbox_relay`
+OUTBOX = {
+    "BATCH_SIZE": 200,
+    "MAX_ATTEMPTS": 10,
+    "BACKOFF": 2,
+    "MAX_BACKOFF": 300,
+    "RETENTION": 7 * 24 * 60 * 60,
+    "POLL_INTERVAL": float(os.getenv("OUTBOX_POLL_INTERVAL", 1.0)),
+}
+
+# Notification dispatcher (see core.notifications): how long an event key blocks
+# repeats, and per-kind windows (seconds) in which a recipient's messages are sent as one
+NOTIFICATIONS_REDIS_URL = os.getenv("NOTIFICATIONS_REDIS_URL", REDIS_URL)
+NOTIFICATIONS = {
+    "DEDUP_TTL": int(os.getenv("NOTIFICATIONS_DEDUP_TTL", 60 * 60)),
+    "COALESCE": {"low_stock": 5 * 60},
+}
+
+# Max database queries per request (see core.instrumentation). ROUTES overrides
+# DEFAULT per URL route pattern; RAISE turns an overrun into an error instead of a warning.
+QUERY_BUDGET = {
+    "DEFAULT": int(os.getenv("QUERY_BUDGET_DEFAULT", 50)),
+    "ROUTES": {},
+    "RAISE": False,
+}
+
+# /metrics (core.views.metrics) is open to anyone only when METRICS_PUBLIC;
+# otherwise to staff users and to scrapers from METRICS_ALLOWED_IPS.
+METRICS_PUBLIC = DEBUG
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1").split(",") if ip]
+
 ZP_MERCHANT = os.getenv("ZP_MERCHANT", "xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx")
 ZP_BASE = os.getenv("ZP_BASE", "https://sandbox.zarinpal.com")
 PRICE_UNIT = os.getenv("PRICE_UNIT", "TOMAN")
@@ -476,6 +574,30 @@ ZP_REQUEST = f"{ZP_BASE}/pg/v4/payment/request.json"
 ZP_VERIFY = f"{ZP_BASE}/pg/v4/payment/verify.json"
 ZP_STARTPAY = f"{ZP_BASE}/pg/StartPay/"
 
+# Pooled Zarinpal client (see payments.gateway); BASE_URL may point at
+# `manage.py run_gateway_stub` for load runs. Timeouts in seconds.
+PAYMENT_GATEWAY = {
+    "BASE_URL": ZP_BASE,
+    "MERCHANT_ID": ZP_MERCHANT,
+    "CONNECT_TIMEOUT": float(os.getenv("ZP_CONNECT_TIMEOUT", 3.05)),
+    "READ_TIMEOUT": float(os.getenv("ZP_READ_TIMEOUT", 10)),
+    "RETRIES": 2,
+    "BACKOFF": 0.2,
+    "POOL_SIZE": int(os.getenv("ZP_POOL_SIZE", 20)),
+    "BREAKER_THRESHOLD": 5,
+    "BREAKER_RESET": 30,
+}
+
+# Sweep of payments left INITIATED/CALLBACK_OK (see payments.reconcile): age in
+# seconds before a payment is re-checked (below STOCK_RESERVATION_TTL), batch size,
+# batches per run, parallel gateway calls
+PAYMENT_RECONCILE = {
+    "STALE_AFTER": int(os.getenv("PAYMENT_RECONCILE_STALE_AFTER", 10 * 60)),
+    "BATCH_SIZE": 100,
+    "MAX_BATCHES": 50,
+    "CONCURRENCY": 8,
+}
+
 # --- Zarinpal ---
 # ZP_MODE = os.getenv("ZP_MODE", "sandbox").lower()
 # if ZP_MODE == "production":
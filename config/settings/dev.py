@@ -13,4 +13,6 @@ CELERY_TASK_ALWAYS_EAGER = False
 CELERY_TASK_EAGER_PROPAGATES = True
 
 CELERY_BROKER_URL = REDIS_URL
-CELERY_RESULT_BACKEND = REDIS_URL
\ No newline at end of file
+CELERY_RESULT_BACKEND = REDIS_URL
+
+CACHES["default"]["LOCATION"] = REDIS_URL
@@ -1,2 +1,3 @@
 from .base import *
 DEBUG = False
+METRICS_PUBLIC = False
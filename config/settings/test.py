@@ -29,3 +29,12 @@ DEBUG = False
 CELERY_TASK_ALWAYS_EAGER = False
 CELERY_TASK_EAGER_PROPAGATES = False
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Fail the request (and so the test) when a route goes over its query budget
+QUERY_BUDGET = {**QUERY_BUDGET, "RAISE": True}
@@ -27,7 +27,7 @@ from drf_spectacular.views import (
     SpectacularYAMLAPIView,
 )
 from core.views import SwaggerPlusView
-from core.views import health_check
+from core.views import health_check, metrics
 from django.utils.html import format_html
 # from rest_framework.routers import DefaultRouter
 
@@ -64,6 +64,7 @@ urlpatterns = [
     path("api/redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
     path("api/docs+/", SwaggerPlusView.as_view(), name="swagger-plus"),
     path("health/", health_check, name="health-check"),
+    path("metrics", metrics, name="metrics"),
 ]
 
 if settings.DEBUG:
@@ -1,6 +1,9 @@
 ﻿from django.contrib import admin
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .models import OutboxMessage
+
 
 class SoftDeleteAdminMixin(admin.ModelAdmin):
     """Common helpers for models that implement BaseModel soft deletes."""
@@ -42,3 +45,17 @@ class SoftDeleteAdminMixin(admin.ModelAdmin):
 # Example:
 # @admin.register(YourModel)
 # class YourModelAdmin(SoftDeleteAdminMixin): ...
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("id", "task", "status", "attempts", "available_at", "sent_at", "dedup_key")
+    list_filter = ("status", "task")
+    search_fields = ("task", "dedup_key")
+    readonly_fields = ("task", "args", "kwargs", "dedup_key", "attempts", "created_at", "sent_at", "last_error")
+    ordering = ("-id",)
+    actions = ("requeue",)
+
+    @admin.action(description=_("Requeue selected"))
+    def requeue(self, request, queryset):
+        queryset.exclude(status="PENDING").update(status="PENDING", attempts=0, available_at=timezone.now())
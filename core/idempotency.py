@@ -0,0 +1,111 @@
+"""
+``Idempotency-Key`` support for retried POST endpoints.
+
+Decorate a DRF view method with ``@idempotent("scope")``. When the request has an
+``Idempotency-Key`` header, the first final response is stored in the cache, keyed
+by scope, user and key, for ``IDEMPOTENCY["TTL"]`` seconds. Retries with the same
+key get it back, marked ``Idempotent-Replayed: true``, without running the view.
+While the first request is still running, a duplicate waits on a cache lock (up to
+``WAIT`` seconds, then 409) instead of running in parallel. Reusing a key for a
+different request body is rejected with 422.
+
+Server errors (5xx) and non-final answers (202 Accepted, 409, 429) are not stored,
+so those retries run again.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+NOT_STORED = {status.HTTP_202_ACCEPTED, status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS}
+
+DEFAULTS = {"TTL": 24 * 60 * 60, "LOCK_TTL": 30, "WAIT": 20}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "IDEMPOTENCY", {})}
+
+
+def response_key(scope: str, user_id, key: str) -> str:
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"idempotency:{scope}:{user_id}:{digest}"
+
+
+def lock_key(scope: str, user_id, key: str) -> str:
+    return response_key(scope, user_id, key) + ":lock"
+
+
+def fingerprint(request, args, kwargs) -> str:
+    payload = json.dumps([request.path, kwargs, request.data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _replay(stored: dict, request_fingerprint: str) -> Response:
+    if stored["fingerprint"] != request_fingerprint:
+        return Response(
+            {"detail": f"{HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(stored["data"], status=stored["status"], headers={"Idempotent-Replayed": "true"})
+
+
+def idempotent(scope: str):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return method(view, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({"detail": f"{HEADER} is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+            conf = config()
+            stored_key = response_key(scope, request.user.pk, key)
+            held_key = lock_key(scope, request.user.pk, key)
+            request_fingerprint = fingerprint(request, args, kwargs)
+            owner = uuid.uuid4().hex
+            deadline = time.monotonic() + conf["WAIT"]
+            while True:
+                stored = cache.get(stored_key)
+                if stored is not None:
+                    return _replay(stored, request_fingerprint)
+                if cache.add(held_key, owner, timeout=conf["LOCK_TTL"]):
+                    break
+                if time.monotonic() >= deadline:
+                    return Response(
+                        {"detail": "A request with this Idempotency-Key is still in progress."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                time.sleep(POLL_INTERVAL)
+
+            try:
+                # The holder before us may have finished between our get and add
+                stored = cache.get(stored_key)
+                if stored is not None:
+                    return _replay(stored, request_fingerprint)
+                response = method(view, request, *args, **kwargs)
+                if response.status_code < 500 and response.status_code not in NOT_STORED:
+                    cache.set(
+                        stored_key,
+                        {"status": response.status_code, "data": response.data, "fingerprint": request_fingerprint},
+                        timeout=conf["TTL"],
+                    )
+                return response
+            finally:
+                if cache.get(held_key) == owner:
+                    cache.delete(held_key)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,328 @@
+"""
+Per-request query/latency instrumentation.
+
+``QueryMetricsMiddleware`` counts the database queries of each request and times
+them, the serializers (via ``InstrumentedViewMixin``) and the whole request. The
+numbers go out as a ``Server-Timing`` header and into an in-process per-route
+registry, which ``core.views.metrics`` serves in Prometheus text format with
+p50/p95/p99 over a sliding window of recent requests. Each worker process keeps
+its own registry.
+
+Code that calls other services (e.g. payments.gateway) records its latency in a
+named ``histogram``, and in-process events (e.g. catalog cache hits) are tallied
+in a named ``counter``; both are served from the same endpoint.
+
+Routes can be given a query budget in ``settings.QUERY_BUDGET``; requests over
+it are logged, or raise ``QueryBudgetExceeded`` when ``RAISE`` is set (the test
+settings do this so N+1 regressions fail the suite).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 1024  # recent requests per route kept for quantiles
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass
+class RequestMetrics:
+    queries: int = 0
+    db_time: float = 0.0
+    serializer_time: float = 0.0
+
+
+_current: ContextVar[RequestMetrics | None] = ContextVar("request_metrics", default=None)
+
+
+def current_metrics() -> RequestMetrics | None:
+    return _current.get()
+
+
+def _count_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.db_time += time.perf_counter() - start
+
+
+class _Series:
+    __slots__ = ("count", "total", "window")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.window = deque(maxlen=WINDOW)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.window.append(value)
+
+    def quantiles(self) -> dict[float, float]:
+        ordered = sorted(self.window)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class RouteRegistry:
+    """Thread-safe per-(method, route) series of duration, db time and query counts."""
+
+    METRICS = {
+        "duration": ("http_request_duration_seconds", "Wall time spent serving the request."),
+        "db": ("http_request_db_seconds", "Time spent in database queries."),
+        "serializer": ("http_request_serializer_seconds", "Time spent in DRF serializers."),
+        "queries": ("http_request_queries", "Database queries issued by the request."),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = defaultdict(lambda: {name: _Series() for name in self.METRICS})
+
+    def observe(self, method: str, route: str, *, duration: float, metrics: RequestMetrics) -> None:
+        with self._lock:
+            series = self._series[(method, route)]
+            series["duration"].observe(duration)
+            series["db"].observe(metrics.db_time)
+            series["serializer"].observe(metrics.serializer_time)
+            series["queries"].observe(metrics.queries)
+
+    def snapshot(self) -> dict:
+        """{(method, route): {metric: {"count", "sum", "quantiles"}}}"""
+        with self._lock:
+            return {
+                key: {
+                    name: {"count": s.count, "sum": s.total, "quantiles": s.quantiles()}
+                    for name, s in series.items()
+                }
+                for key, series in self._series.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name, (metric, help_text) in self.METRICS.items():
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary"]
+            for (method, route), series in sorted(snapshot.items()):
+                data = series[name]
+                labels = f'method="{method}",route="{_escape(route)}"'
+                for q, value in data["quantiles"].items():
+                    lines.append(f'{metric}{{{labels},quantile="{q}"}} {value:.6g}')
+                lines.append(f"{metric}_sum{{{labels}}} {data['sum']:.6g}")
+                lines.append(f"{metric}_count{{{labels}}} {data['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = RouteRegistry()
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Thread-safe cumulative latency histogram per label set, for outbound calls."""
+
+    def __init__(self, metric: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.metric = metric
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, seconds: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0})
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series["buckets"][i] += 1
+            series["count"] += 1
+            series["sum"] += seconds
+
+    def snapshot(self) -> dict:
+        """{((label, value), ...): {"buckets": [cumulative counts], "count", "sum"}}"""
+        with self._lock:
+            return {key: {**series, "buckets": list(series["buckets"])} for key, series in self._series.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render_prometheus(self) -> str:
+        lines = [f"# HELP {self.metric} {self.help_text}", f"# TYPE {self.metric} histogram"]
+        for key, series in sorted(self.snapshot().items()):
+            labels = ",".join(f'{name}="{_escape(str(value))}"' for name, value in key)
+            sep = "," if labels else ""
+            for bound, count in zip(self.buckets, series["buckets"]):
+                lines.append(f'{self.metric}_bucket{{{labels}{sep}le="{bound:g}"}} {count}')
+            lines.append(f'{self.metric}_bucket{{{labels}{sep}le="+Inf"}} {series["count"]}')
+            lines.append(f"{self.metric}_sum{{{labels}}} {series['sum']:.6g}")
+            lines.append(f"{self.metric}_count{{{labels}}} {series['count']}")
+        return "\n".join(lines) + "\n"
+
+
+histograms: dict[str, Histogram] = {}
+
+
+def histogram(metric: str, help_text: str, buckets=LATENCY_BUCKETS) -> Histogram:
+    """The process-wide Histogram called ``metric`` (created on first use); served by core.views.metrics."""
+    return histograms.setdefault(metric, Histogram(metric, help_text, buckets))
+
+
+class Counter:
+    """Thread-safe monotonic counter per label set."""
+
+    def __init__(self, metric: str, help_text: str):
+        self.metric = metric
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values = defaultdict(int)
+
+    def inc(self, amount: int = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] += amount
+
+    def snapshot(self) -> dict:
+        """{((label, value), ...): count}"""
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render_prometheus(self) -> str:
+        lines = [f"# HELP {self.metric} {self.help_text}", f"# TYPE {self.metric} counter"]
+        for key, value in sorted(self.snapshot().items()):
+            labels = ",".join(f'{name}="{_escape(str(v))}"' for name, v in key)
+            lines.append(f"{self.metric}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+counters: dict[str, Counter] = {}
+
+
+def counter(metric: str, help_text: str) -> Counter:
+    """The process-wide Counter called ``metric`` (created on first use); served by core.views.metrics."""
+    return counters.setdefault(metric, Counter(metric, help_text))
+
+
+def render_prometheus() -> str:
+    """Route metrics followed by every registered histogram and counter."""
+    return (
+        registry.render_prometheus()
+        + "".join(h.render_prometheus() for h in histograms.values())
+        + "".join(c.render_prometheus() for c in counters.values())
+    )
+
+
+def query_budget(route: str) -> int | None:
+    config = getattr(settings, "QUERY_BUDGET", {})
+    return config.get("ROUTES", {}).get(route, config.get("DEFAULT"))
+
+
+def route_of(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.route if match is not None else "<unmatched>"
+
+
+class QueryMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(_count_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - start
+
+        route = route_of(request)
+        response["Server-Timing"] = (
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries", '
+            f"serializer;dur={metrics.serializer_time * 1000:.1f}, "
+            f"total;dur={duration * 1000:.1f}"
+        )
+        if route != "<unmatched>":
+            registry.observe(request.method, route, duration=duration, metrics=metrics)
+            self._check_budget(request, route, metrics)
+        return response
+
+    def _check_budget(self, request, route: str, metrics: RequestMetrics) -> None:
+        budget = query_budget(route)
+        if budget is None or metrics.queries <= budget:
+            return
+        message = f"{request.method} {request.path} ({route}) ran {metrics.queries} queries; budget is {budget}"
+        if getattr(settings, "QUERY_BUDGET", {}).get("RAISE"):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+_timed_serializer_classes: dict[type, type] = {}
+
+
+def timed_serializer_class(serializer_class):
+    """Subclass of ``serializer_class`` whose to_representation time feeds RequestMetrics."""
+    timed = _timed_serializer_classes.get(serializer_class)
+    if timed is None:
+        def to_representation(self, instance):
+            metrics = _current.get()
+            start = time.perf_counter()
+            try:
+                return super(timed, self).to_representation(instance)
+            finally:
+                if metrics is not None:
+                    metrics.serializer_time += time.perf_counter() - start
+
+        timed = type(serializer_class.__name__, (serializer_class,), {
+            "to_representation": to_representation,
+            "__module__": serializer_class.__module__,
+            "__qualname__": serializer_class.__qualname__,
+        })
+        _timed_serializer_classes[serializer_class] = timed
+    return timed
+
+
+class InstrumentedViewMixin:
+    """Time this view's serializers into the request's Server-Timing/metrics."""
+
+    def get_serializer_class(self):
+        serializer_class = super().get_serializer_class()
+        # Only inside an instrumented request; schema generation sees the real class
+        if _current.get() is None or getattr(self, "swagger_fake_view", False):
+            return serializer_class
+        return timed_serializer_class(serializer_class)
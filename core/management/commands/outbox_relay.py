@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = "Publish transactional outbox messages to the Celery broker (see core.outbox)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the due messages once and exit.")
+        parser.add_argument("--interval", type=float, default=None, help="Seconds to sleep when idle (OUTBOX['POLL_INTERVAL']).")
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, once, interval, batch_size, **options):
+        conf = outbox.config()
+        if batch_size:
+            conf["BATCH_SIZE"] = batch_size
+        interval = conf["POLL_INTERVAL"] if interval is None else interval
+        try:
+            while True:
+                counts = outbox.drain(conf)
+                if counts:
+                    self.stdout.write(", ".join(f"{key}={value}" for key, value in sorted(counts.items())))
+                if once:
+                    return
+                if counts["sent"] < conf["BATCH_SIZE"]:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
@@ -1,3 +1,4 @@
+import copy
 import uuid
 from django.db import models
 from django.utils import timezone
@@ -50,6 +51,11 @@ class BaseModel(models.Model):
         (updates deleted_at and updated_at); otherwise, the change remains only in memory.
     - is_deleted (property):
         Boolean convenience property that returns True if deleted_at is set.
+    - previous(field) / has_changed(field) / changed_fields:
+        Dirty-field tracking. Field values are snapshotted when a row is loaded (from_db),
+        saved or refreshed, so pre_save/post_save receivers can see what a save changes
+        without re-reading the row. A field deferred at load time is fetched once on first
+        ``previous()``; unsaved new instances report every field as changed.
     Usage Notes
     - Inherit this class for models that need soft-delete semantics and shared timestamp fields.
     - Prefer objects for normal queries to avoid returning soft-deleted rows; use all_objects
@@ -57,6 +63,8 @@ class BaseModel(models.Model):
     - The save calls use update_fields to minimize the columns updated; be mindful of any
       model signal handlers or custom save overrides that depend on full saves.
     - Consider wrapping multi-row hard deletes or restores in transactions when performing bulk operations.
+    - Subclasses that declare their own Meta should inherit ``BaseModel.Meta`` (and extend
+      ``BaseModel.Meta.indexes``) so the soft-delete and keyset pagination indexes are kept.
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -68,7 +76,74 @@ class BaseModel(models.Model):
 
     class Meta:
         abstract = True
-        indexes = [models.Index(fields=["deleted_at", "updated_at"])]
+        indexes = [
+            models.Index(fields=["deleted_at", "updated_at"]),
+            # Keyset (cursor) pagination walks live rows by (created_at, id); see core.pagination
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="%(app_label)s_%(class)s_keyset",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot(kwargs.get("update_fields"))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._snapshot(fields)
+
+    def _snapshot(self, fields=None):
+        """Record the current (saved/loaded) value of ``fields``, or of every loaded field."""
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        if fields is None:
+            attnames = [f.attname for f in self._meta.concrete_fields]
+        else:
+            attnames = [self._meta.get_field(name).attname for name in fields]
+        for attname in attnames:
+            if attname in self.__dict__:
+                # JSON fields are mutated in place; keep our own copy
+                value = self.__dict__[attname]
+                loaded[attname] = copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+    def previous(self, field):
+        """
+        Value of ``field`` as last loaded from or saved to the database (None if never saved).
+        A deferred field is fetched on demand, so ask before the row is written (pre_save).
+        """
+        if self._state.adding:
+            return None
+        attname = self._meta.get_field(field).attname
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        if attname not in loaded:
+            loaded[attname] = (
+                type(self).all_objects.using(self._state.db or "default")
+                .filter(pk=self.pk).values_list(attname, flat=True).first()
+            )
+        return loaded[attname]
+
+    def has_changed(self, field):
+        if self._state.adding:
+            return True
+        return self.previous(field) != getattr(self, self._meta.get_field(field).attname)
+
+    @property
+    def changed_fields(self):
+        """Names of loaded fields whose value differs from the snapshot (all fields when unsaved)."""
+        if self._state.adding:
+            return {f.name for f in self._meta.concrete_fields}
+        loaded = self.__dict__.get("_loaded_values", {})
+        return {
+            f.name for f in self._meta.concrete_fields
+            if f.attname in loaded and f.attname in self.__dict__ and loaded[f.attname] != self.__dict__[f.attname]
+        }
 
     def delete(self, using=None, keep_parents=False):
         if self.deleted_at is None:
@@ -91,3 +166,56 @@ class BaseModel(models.Model):
         Boolean convenience property that returns True if deleted_at is set.
         """
         return self.deleted_at is not None
+
+
+class RatingSummary(models.Model):
+    """
+    Abstract block of denormalized review aggregates (average, count, 1..5 histogram).
+
+    Kept current incrementally by reviews.signals and reconciled periodically by
+    reviews.tasks.reconcile_rating_aggregates_task; never write these by hand.
+    """
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def rating_histogram(self):
+        return {str(star): getattr(self, f"rating_{star}") for star in range(1, 6)}
+
+
+class OutboxMessage(models.Model):
+    """
+    A Celery task call recorded in the same transaction as the change that causes it.
+
+    Written by core.outbox.enqueue and published to the broker by the relay
+    (core.outbox.relay); see that module. ``dedup_key`` makes enqueueing the same
+    event twice a no-op while the row is kept (OUTBOX["RETENTION"]).
+    """
+    STATUS = [("PENDING", "Pending"), ("SENT", "Sent"), ("DEAD", "Dead")]
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    dedup_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS, default="PENDING")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The relay's queue: due messages in arrival order
+            models.Index(fields=["available_at", "id"], condition=models.Q(status="PENDING"), name="core_outbox_due"),
+        ]
+
+    def __str__(self):
+        return f"{self.task}{tuple(self.args)} [{self.status}]"
@@ -0,0 +1,172 @@
+"""
+Notification dispatcher: one outbound message per logical event.
+
+Notification tasks (OTP codes, order and low-stock emails) render their message
+and hand it to ``dispatch`` instead of sending it themselves. ``dispatch``:
+
+- drops an event whose ``key`` was already dispatched: the key is claimed in
+  Redis with ``SET NX EX NOTIFICATIONS["DEDUP_TTL"]``, so outbox redeliveries,
+  retried tasks and bursts of the same event send once;
+- routes by channel: ``email`` or ``sms``, taken from the recipient (an address
+  with ``@`` is email) unless given;
+- coalesces per recipient: for kinds listed in ``NOTIFICATIONS["COALESCE"]``
+  (seconds), messages are parked in a Redis list and the first one schedules
+  ``core.tasks.flush_notifications_task``, which sends everything gathered in
+  the window as one message.
+
+Producers give each event a stable key (``otp:<id>``, ``order-paid:<id>``,
+``low-stock:<store item>``), which is also the outbox ``dedup_key`` (see
+core.outbox), so duplicates stop before the broker as well. If Redis is down,
+messages are sent straight away, undeduplicated and uncoalesced, rather than lost.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import asdict, dataclass
+
+import redis
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "notify:"
+
+DEFAULTS = {
+    "DEDUP_TTL": 60 * 60,
+    "COALESCE": {},
+}
+
+# KEYS: pending list, window flag. ARGV: message, window. Returns 1 when this
+# message opened the window (the caller schedules the flush).
+PARK_SCRIPT = """
+redis.call('RPUSH', KEYS[1], ARGV[1])
+if redis.call('SET', KEYS[2], 1, 'NX', 'EX', tonumber(ARGV[2]) * 2) then
+    return 1
+end
+return 0
+"""
+
+# KEYS: pending list, window flag. Returns the parked messages and closes the window.
+TAKE_SCRIPT = """
+local parked = redis.call('LRANGE', KEYS[1], 0, -1)
+redis.call('DEL', KEYS[1], KEYS[2])
+return parked
+"""
+
+
+@dataclass
+class Notification:
+    kind: str
+    recipient: str
+    body: str
+    subject: str = ""
+    key: str | None = None
+    channel: str | None = None
+
+    def __post_init__(self):
+        if self.channel is None:
+            self.channel = "email" if "@" in self.recipient else "sms"
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(getattr(settings, "NOTIFICATIONS_REDIS_URL", settings.REDIS_URL))
+    return _client
+
+
+def set_client(client) -> None:
+    """Swap the Redis connection (tests use fakeredis)."""
+    global _client
+    _client = client
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "NOTIFICATIONS", {})}
+
+
+def send_email(notification: Notification) -> None:
+    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", None)
+    EmailMessage(notification.subject, notification.body, from_email, [notification.recipient]).send()
+
+
+def send_sms(notification: Notification) -> None:
+    # Placeholder until an SMS gateway is wired in (see accounts.tasks)
+    logger.info("SMS to %s: %s", notification.recipient, notification.body)
+
+
+SENDERS = {"email": send_email, "sms": send_sms}
+
+
+def deliver(notification: Notification) -> None:
+    try:
+        SENDERS[notification.channel](notification)
+    except Exception:
+        # In dev, the email backend may be console or misconfigured; a lost notification must not fail the task
+        logger.exception("Could not send %s %s to %s", notification.channel, notification.kind, notification.recipient)
+
+
+def _window_keys(kind: str, channel: str, recipient: str) -> list[str]:
+    base = f"{KEY_PREFIX}pending:{kind}:{channel}:{recipient}"
+    return [base, f"{base}:open"]
+
+
+def claim(key: str, conf: dict | None = None) -> bool:
+    """True the first time ``key`` is seen within DEDUP_TTL (and whenever Redis cannot tell)."""
+    conf = conf or config()
+    try:
+        return bool(get_client().set(f"{KEY_PREFIX}seen:{key}", 1, nx=True, ex=conf["DEDUP_TTL"]))
+    except redis.RedisError:
+        logger.warning("Notification dedup unavailable; sending %s anyway", key)
+        return True
+
+
+def dispatch(notification: Notification) -> str:
+    """
+    Send, park or drop ``notification``; returns ``"sent"``, ``"coalesced"`` or ``"duplicate"``.
+    """
+    conf = config()
+    if notification.key and not claim(notification.key, conf):
+        return "duplicate"
+    window = conf["COALESCE"].get(notification.kind, 0)
+    if window:
+        keys = _window_keys(notification.kind, notification.channel, notification.recipient)
+        try:
+            opened = get_client().eval(PARK_SCRIPT, 2, *keys, json.dumps(asdict(notification)), window)
+        except redis.RedisError:
+            logger.warning("Notification coalescing unavailable; sending %s now", notification.key)
+        else:
+            if opened:
+                from .tasks import flush_notifications_task
+                flush_notifications_task.apply_async(
+                    (notification.kind, notification.channel, notification.recipient), countdown=window
+                )
+            return "coalesced"
+    deliver(notification)
+    return "sent"
+
+
+def flush(kind: str, channel: str, recipient: str) -> int:
+    """Send what was parked for a recipient as one message; returns how many it carried."""
+    parked = [
+        Notification(**json.loads(raw))
+        for raw in get_client().eval(TAKE_SCRIPT, 2, *_window_keys(kind, channel, recipient))
+    ]
+    if not parked:
+        return 0
+    first = parked[0]
+    if len(parked) > 1:
+        first = Notification(
+            kind=kind,
+            recipient=recipient,
+            channel=channel,
+            subject=f"{first.subject} (+{len(parked) - 1} more)",
+            body="\n\n---\n\n".join(n.body for n in parked),
+        )
+    deliver(first)
+    return len(parked)
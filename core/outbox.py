@@ -0,0 +1,154 @@
+"""
+Transactional outbox for Celery task calls.
+
+Instead of ``transaction.on_commit(lambda: task.delay(...))``, code that changes
+data records the task call with ``enqueue`` (one INSERT, in the same transaction).
+The call is published only if the change commits, is never lost when the broker
+is down, and a request never waits on the broker.
+
+    outbox.enqueue(send_order_paid_email_task, str(order.pk), dedup_key=f"order-paid:{order.pk}")
+    outbox.enqueue_all([outbox.message(task, str(pk)) for pk in order_ids])
+
+The relay (``relay``/``drain``; run by ``manage.py outbox_relay`` or the
+``core.tasks.relay_outbox_task`` beat job) claims due rows in batches with
+``SELECT ... FOR UPDATE SKIP LOCKED``, so several relays can run at once, and
+publishes a batch over one broker connection. A failed publish is retried with
+jittered exponential backoff. After ``MAX_ATTEMPTS`` failures the row is marked
+DEAD and left for an operator (admin "Requeue" action).
+
+Delivery is at least once: a relay that dies between publishing and committing
+publishes those rows again. The Celery task id is ``outbox-<row id>``, so tasks
+can recognise a redelivery.
+"""
+from __future__ import annotations
+
+import random
+from collections import Counter
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+DEFAULTS = {
+    "BATCH_SIZE": 200,
+    "MAX_ATTEMPTS": 10,
+    "BACKOFF": 2,
+    "MAX_BACKOFF": 300,
+    "RETENTION": 7 * 24 * 60 * 60,
+    "POLL_INTERVAL": 1.0,
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "OUTBOX", {})}
+
+
+def _task_name(task) -> str:
+    return task if isinstance(task, str) else task.name
+
+
+def message(task, *args, dedup_key: str | None = None, **kwargs) -> OutboxMessage:
+    """An unsaved outbox row for ``task(*args, **kwargs)``; ``task`` is a Celery task or its name."""
+    return OutboxMessage(task=_task_name(task), args=list(args), kwargs=kwargs, dedup_key=dedup_key)
+
+
+def enqueue_all(messages) -> None:
+    """Record many task calls with one INSERT; rows whose ``dedup_key`` is already stored are skipped."""
+    messages = list(messages)
+    if messages:
+        OutboxMessage.objects.bulk_create(messages, ignore_conflicts=True)
+
+
+def enqueue(task, *args, dedup_key: str | None = None, **kwargs) -> None:
+    """Record ``task(*args, **kwargs)`` to be published once the current transaction commits."""
+    enqueue_all([message(task, *args, dedup_key=dedup_key, **kwargs)])
+
+
+def backoff(attempts: int, conf: dict) -> timedelta:
+    delay = min(conf["MAX_BACKOFF"], conf["BACKOFF"] * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def _publish(batch) -> tuple[list, Exception | None]:
+    """Publish rows in order over one producer; stops at the first failure."""
+    app = current_app
+    sent = []
+    try:
+        with app.producer_or_acquire() as producer:
+            for row in batch:
+                task_id = f"outbox-{row.pk}"
+                if app.conf.task_always_eager:
+                    app.tasks[row.task].apply(args=row.args, kwargs=row.kwargs, task_id=task_id, throw=True)
+                else:
+                    app.send_task(row.task, args=row.args, kwargs=row.kwargs, task_id=task_id, producer=producer, retry=False)
+                sent.append(row)
+    except Exception as exc:
+        return sent, exc
+    return sent, None
+
+
+def relay(conf: dict | None = None) -> Counter:
+    """
+    Publish one batch of due messages; returns counts of ``sent``, ``retry`` and ``dead``.
+    Rows after a failed publish are left untouched for the next batch.
+    """
+    conf = {**config(), **(conf or {})}
+    counts = Counter()
+    with transaction.atomic():
+        batch = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status="PENDING", available_at__lte=timezone.now())
+            .order_by("available_at", "id")[:conf["BATCH_SIZE"]]
+        )
+        if not batch:
+            return counts
+        sent, error = _publish(batch)
+        now = timezone.now()
+        for row in sent:
+            row.status, row.sent_at = "SENT", now
+            row.attempts += 1
+        changed = list(sent)
+        if error is not None:
+            failed = batch[len(sent)]
+            failed.attempts += 1
+            failed.last_error = repr(error)[:1000]
+            if failed.attempts >= conf["MAX_ATTEMPTS"]:
+                failed.status = "DEAD"
+                counts["dead"] += 1
+            else:
+                failed.available_at = now + backoff(failed.attempts, conf)
+                counts["retry"] += 1
+            changed.append(failed)
+        OutboxMessage.objects.bulk_update(changed, ["status", "sent_at", "attempts", "available_at", "last_error"])
+    if sent:
+        counts["sent"] = len(sent)
+    return counts
+
+
+def drain(conf: dict | None = None, max_batches: int = 50) -> Counter:
+    """Relay batches until the due queue is empty, a publish fails or ``max_batches`` ran."""
+    conf = {**config(), **(conf or {})}
+    counts = Counter()
+    for _ in range(max_batches):
+        done = relay(conf)
+        counts += done
+        if done["sent"] < conf["BATCH_SIZE"]:
+            break
+    return counts
+
+
+def prune(conf: dict | None = None) -> int:
+    """Delete SENT rows older than ``RETENTION`` seconds (their dedup keys expire with them)."""
+    conf = {**config(), **(conf or {})}
+    cutoff = timezone.now() - timedelta(seconds=conf["RETENTION"])
+    stale = OutboxMessage.objects.filter(status="SENT", sent_at__lt=cutoff)
+    deleted = 0
+    while True:
+        ids = list(stale.values_list("pk", flat=True)[:conf["BATCH_SIZE"] * 10])
+        if not ids:
+            return deleted
+        deleted += OutboxMessage.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,35 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination over ``(created_at, id)`` for BaseModel list endpoints.
+
+    Pages are fetched with ``WHERE created_at < <cursor> ORDER BY created_at DESC, id DESC
+    LIMIT n``, served by the partial ``<app>_<model>_keyset`` index declared on
+    BaseModel, so the cost of a page does not depend on how deep it is or on table size.
+    ``id`` breaks ties between rows created in the same microsecond.
+
+    Views with an OrderingFilter may expose other cursor fields (``?ordering=-rating_avg``);
+    those should be backed by a matching ``(<field>, created_at, id)`` index.
+
+    Views may override the defaults with ``page_size`` / ``max_page_size`` attributes;
+    clients may ask for a smaller/larger page with ``?page_size=`` up to that maximum.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+
+    def get_ordering(self, request, queryset, view):
+        # An OrderingFilter on the view (e.g. ?ordering=-rating_avg) picks the cursor
+        # field; (created_at, id) are appended so ties page deterministically.
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        fields = {field.lstrip("-") for field in ordering}
+        return ordering + tuple(f for f in self.ordering if f.lstrip("-") not in fields)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = getattr(view, "page_size", type(self).page_size)
+        self.max_page_size = getattr(view, "max_page_size", type(self).max_page_size)
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from celery import shared_task
+
+
+@shared_task
+def relay_outbox_task() -> dict:
+    """Publish due outbox messages (see core.outbox); `manage.py outbox_relay` does the same continuously."""
+    from . import outbox
+    return dict(outbox.drain())
+
+
+@shared_task
+def prune_outbox_task() -> int:
+    """Delete outbox rows published more than OUTBOX["RETENTION"] seconds ago."""
+    from . import outbox
+    return outbox.prune()
+
+
+@shared_task
+def flush_notifications_task(kind: str, channel: str, recipient: str) -> int:
+    """Send a recipient's coalesced notifications as one message (see core.notifications)."""
+    from . import notifications
+    return notifications.flush(kind, channel, recipient)
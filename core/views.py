@@ -1,10 +1,13 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.urls import reverse
 from django.views.generic import TemplateView
 from django.db import connections
 from django.db.utils import OperationalError
 import redis
 
+from .instrumentation import render_prometheus
+
 
 def health_check(request):
     db_status = "ok"
@@ -30,6 +33,23 @@ def health_check(request):
     })
 
 
+def metrics(request):
+    """
+    Per-route request metrics and outbound call histograms of this process, in Prometheus text format.
+
+    Route names and traffic are internal: unless METRICS_PUBLIC, only staff users
+    and clients from METRICS_ALLOWED_IPS may read them.
+    """
+    allowed = (
+        getattr(settings, "METRICS_PUBLIC", settings.DEBUG)
+        or request.user.is_staff
+        or request.META.get("REMOTE_ADDR") in getattr(settings, "METRICS_ALLOWED_IPS", [])
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 class SwaggerPlusView(TemplateView):
     template_name = "swagger/custom_ui.html"
 
@@ -1,9 +1,11 @@
 from django.contrib import admin
+from django.db import transaction
 from django.db.models import Count, Q
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
 from core.admin import SoftDeleteAdminMixin
+from . import hot_stock
 from .models import Seller, Store, StoreItem
 
 class StoreInline(admin.TabularInline):
@@ -102,8 +104,8 @@ class StoreAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
 @admin.register(StoreItem)
 class StoreItemAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
     # Include the real model field "price" in list_display to allow inline editing
-    list_display = ("sku", "store", "product_title", "variant", "price", "stock", "is_active", "created_at")
-    list_filter = ("is_active", "store", "created_at")
+    list_display = ("sku", "store", "product_title", "variant", "price", "stock", "is_active", "is_hot", "created_at")
+    list_filter = ("is_active", "is_hot", "store", "created_at")
     search_fields = ("sku", "variant__name", "variant__product__title", "store__name")
     autocomplete_fields = ("store", "variant")
     list_select_related = ("store", "variant", "variant__product")
@@ -111,7 +113,7 @@ class StoreItemAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
     list_editable = ("price", "stock", "is_active")
     readonly_fields = ("created_at", "updated_at", "deleted_at")
     date_hierarchy = "created_at"
-    actions = ("activate_items", "deactivate_items")
+    actions = ("activate_items", "deactivate_items", "enable_hot_stock", "disable_hot_stock")
 
     @admin.display(description=_("Product"))
     def product_title(self, obj):
@@ -122,6 +124,21 @@ class StoreItemAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
     def price_formatted(self, obj):
         return f"{obj.price:,.0f}" if obj.price is not None else "—"
 
+    @admin.action(description=_("Enable hot-SKU mode (Redis stock counters)"))
+    def enable_hot_stock(self, request, queryset):
+        ids = list(queryset.filter(is_hot=False).values_list("pk", flat=True))
+        StoreItem.objects.filter(pk__in=ids).update(is_hot=True)
+        # update() skips the counter receiver
+        transaction.on_commit(lambda: hot_stock.prime(ids, overwrite=True))
+        self.message_user(request, _("{} items switched to hot-SKU mode.").format(len(ids)))
+
+    @admin.action(description=_("Disable hot-SKU mode"))
+    def disable_hot_stock(self, request, queryset):
+        ids = list(queryset.filter(is_hot=True).values_list("pk", flat=True))
+        StoreItem.objects.filter(pk__in=ids).update(is_hot=False)
+        transaction.on_commit(lambda: hot_stock.forget(ids))
+        self.message_user(request, _("{} items switched back to database stock.").format(len(ids)))
+
     @admin.action(description=_("Activate selected items"))
     def activate_items(self, request, queryset):
         updated = queryset.update(is_active=True)
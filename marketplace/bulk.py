@@ -0,0 +1,235 @@
+"""
+Bulk StoreItem import/export for sellers.
+
+Imports stream the uploaded CSV/JSONL file row by row and upsert by sku in
+chunks of ``IMPORT_CHUNK_SIZE``, so memory stays bounded however large the file
+is. Each chunk costs a fixed number of queries: one for the variants it
+references, one locking the StoreItems already holding its skus or variants,
+one ``bulk_update`` of the store's own rows, one ``bulk_create(ignore_conflicts=True)``
+of the new ones and one to check which new skus this store actually got (plus
+one for the carts to re-price when prices changed). A sku another store claims
+concurrently is reported, never overwritten. Exports stream a store's inventory
+with ``.iterator()`` in the same columns, so a file exported here can be edited
+and imported back.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from catalog.models import ProductVariant
+from sales.cache import invalidate_cart_pricing
+from sales.models import CartItem
+from . import hot_stock
+from .models import ItemImport, StoreItem
+from .signals import enqueue_low_stock_alert
+
+COLUMNS = ("sku", "variant", "price", "stock", "is_active")
+IMPORT_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportRowSerializer(serializers.Serializer):
+    """Shape checks only; variant existence and store ownership are checked per chunk."""
+    sku = serializers.CharField(max_length=64)
+    variant = serializers.UUIDField()
+    price = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0)
+    stock = serializers.IntegerField(min_value=0)
+    is_active = serializers.BooleanField(required=False, default=True)
+
+
+def read_rows(fileobj, file_format: str):
+    """Yield (row_number, dict) from a binary file object without loading it whole."""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if file_format == "jsonl":
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else {"_error": "Invalid JSON object."}
+    else:
+        # Row numbers count the header as row 1, as spreadsheets show them
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            yield number, row
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_chunk(store, rows) -> tuple[int, int, list[dict]]:
+    """
+    Validate and upsert one chunk of (row_number, raw_row) for ``store``.
+    Returns (created, updated, errors).
+    """
+    errors = []
+    valid = {}  # sku -> (row_number, data); a later row for the same sku wins
+    for number, raw in rows:
+        if "_error" in raw:
+            errors.append({"row": number, "sku": None, "errors": {"row": [raw["_error"]]}})
+            continue
+        # Blank CSV cells mean "not given", so optional columns fall back to their defaults
+        raw = {k: v for k, v in raw.items() if k is not None and v not in ("", None)}
+        row = ImportRowSerializer(data=raw)
+        if row.is_valid():
+            valid[row.validated_data["sku"]] = (number, row.validated_data)
+        else:
+            errors.append({"row": number, "sku": raw.get("sku"), "errors": row.errors})
+
+    variant_ids = {data["variant"] for _, data in valid.values()}
+    known_variants = set(ProductVariant.objects.filter(pk__in=variant_ids).values_list("pk", flat=True))
+    existing = {}  # sku -> (pk, store_id, variant_id, stock, price, is_hot)
+    variant_owner = {}  # variant_id -> sku already holding it in this store
+    # Locked until the chunk commits, so the ownership checks below hold for the writes
+    holders = StoreItem.all_objects.select_for_update().filter(
+        Q(sku__in=list(valid)) | Q(store=store, variant_id__in=variant_ids)
+    )
+    for pk, sku, store_id, variant_id, stock, price, is_hot in holders.order_by("pk").values_list(
+        "pk", "sku", "store_id", "variant_id", "stock", "price", "is_hot"
+    ):
+        existing[sku] = (pk, store_id, variant_id, stock, price, is_hot)
+        if store_id == store.pk:
+            variant_owner[variant_id] = sku
+
+    new_items, updated_items, old_stock, repriced, hot_deltas = {}, [], {}, [], {}
+    for sku, (number, data) in valid.items():
+        row_errors = {}
+        current = existing.get(sku)
+        if current and current[1] != store.pk:
+            row_errors["sku"] = ["This sku belongs to another store."]
+        if data["variant"] not in known_variants:
+            row_errors["variant"] = ["Unknown product variant."]
+        elif variant_owner.get(data["variant"], sku) != sku:
+            row_errors["variant"] = [f"Variant already listed in this store as {variant_owner[data['variant']]}."]
+        if row_errors:
+            errors.append({"row": number, "sku": sku, "errors": row_errors})
+            continue
+        variant_owner[data["variant"]] = sku
+        if current:
+            pk, _, _, stock, price, is_hot = current
+            old_stock[sku] = (pk, stock)
+            if price != data["price"]:
+                repriced.append(pk)
+            if is_hot and stock != data["stock"]:
+                hot_deltas[pk] = data["stock"] - stock
+        item = StoreItem(
+            store=store,
+            variant_id=data["variant"],
+            sku=sku,
+            price=data["price"],
+            stock=data["stock"],
+            is_active=data["is_active"],
+            deleted_at=None,
+        )
+        if current:
+            item.pk = current[0]
+            updated_items.append(item)
+        else:
+            new_items[sku] = (number, item)
+
+    now = timezone.now()
+    if new_items:
+        StoreItem.all_objects.bulk_create([item for _, item in new_items.values()], ignore_conflicts=True)
+        # A conflicting row was written by a concurrent import after our read
+        claimed = dict(StoreItem.all_objects.filter(sku__in=list(new_items)).values_list("sku", "store_id"))
+        for sku, (number, _) in list(new_items.items()):
+            if claimed.get(sku) == store.pk:
+                continue
+            del new_items[sku]
+            if sku in claimed:
+                row_errors = {"sku": ["This sku belongs to another store."]}
+            else:
+                row_errors = {"variant": ["Variant already listed in this store."]}
+            errors.append({"row": number, "sku": sku, "errors": row_errors})
+
+    if updated_items:
+        for item in updated_items:
+            item.updated_at = now
+        StoreItem.all_objects.bulk_update(
+            updated_items, ["variant", "price", "stock", "is_active", "deleted_at", "updated_at"]
+        )
+        # bulk writes skip the pre_save low-stock receiver; alert on real crossings
+        for item in updated_items:
+            pk, stock = old_stock[item.sku]
+            enqueue_low_stock_alert(pk, item.sku, stock, item.stock)
+        # ... and the StoreItem post_save receivers: re-price carts holding changed
+        # prices, and move hot counters by the stock edit (as sync_hot_stock_counter does)
+        if repriced:
+            invalidate_cart_pricing(*set(
+                CartItem.objects.filter(store_item_id__in=repriced).values_list("cart_id", flat=True)
+            ))
+        if hot_deltas:
+            transaction.on_commit(lambda: hot_stock.adjust(hot_deltas))
+
+    errors.sort(key=lambda error: error["row"])
+    return len(new_items), len(updated_items), errors
+
+
+def run_import(item_import: ItemImport, chunk_size: int = IMPORT_CHUNK_SIZE) -> ItemImport:
+    """
+    Process an ItemImport, committing and reporting progress after every chunk.
+    A chunk whose upsert fails is rolled back on its own; earlier chunks stay applied.
+    """
+    ItemImport.objects.filter(pk=item_import.pk).update(status="RUNNING")
+    reported = list(item_import.errors)
+    try:
+        with item_import.file.open("rb") as fileobj:
+            for chunk in _chunks(read_rows(fileobj, item_import.file_format), chunk_size):
+                with transaction.atomic():
+                    created, updated, errors = import_chunk(item_import.store, chunk)
+                item_import.processed_rows += len(chunk)
+                item_import.created_count += created
+                item_import.updated_count += updated
+                item_import.error_count += len(errors)
+                reported.extend(errors[: max(0, MAX_REPORTED_ERRORS - len(reported))])
+                item_import.errors = reported
+                item_import.save(update_fields=[
+                    "processed_rows", "created_count", "updated_count", "error_count", "errors", "updated_at",
+                ])
+    except Exception as exc:
+        item_import.status = "FAILED"
+        item_import.errors = [*reported, {"row": None, "sku": None, "errors": {"file": [str(exc)]}}]
+    else:
+        item_import.status = "DONE"
+    item_import.finished_at = timezone.now()
+    item_import.save(update_fields=["status", "errors", "finished_at", "updated_at"])
+    return item_import
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer over a stream."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(store, file_format: str = "csv"):
+    """Yield a store's live inventory as CSV or JSONL lines, ordered by sku."""
+    rows = (
+        StoreItem.objects.filter(store=store)
+        .order_by("sku")
+        .values_list(*(f"{c}_id" if c == "variant" else c for c in COLUMNS))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    if file_format == "jsonl":
+        for sku, variant_id, price, stock, is_active in rows:
+            record = {"sku": sku, "variant": str(variant_id), "price": str(price), "stock": stock, "is_active": is_active}
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for sku, variant_id, price, stock, is_active in rows:
+        yield writer.writerow([sku, variant_id, price, stock, "true" if is_active else "false"])
@@ -0,0 +1,165 @@
+"""
+Redis stock counters for hot SKUs.
+
+StoreItems flagged ``is_hot`` keep their available-to-sell count in Redis, so
+flash-sale checkouts do not all queue on one ``marketplace_storeitem`` row lock.
+``take`` checks and decrements every hot line of a cart atomically in one Lua
+script: either the whole cart fits or nothing is taken. The database still
+records each sale as a StockReservation, so orders, cancellation and payment
+work as for any other item. Giving back units only touches counters that exist.
+
+The database stays the source of truth. Counters are primed from it when an item
+turns hot, adjusted after commit when stock or holds change, and checked by
+``reconcile`` (sales.reservations.with_available). Units of an expired hold stay
+taken until the expiry sweep releases the hold and gives them back, so the
+database side counts every ACTIVE hold, expired or not. A difference between a
+counter and the database is only corrected once it shows up unchanged on two
+runs in a row, because in-flight checkouts make both sides drift apart for a moment.
+"""
+from __future__ import annotations
+
+import logging
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "stock:hot:"
+DRIFT_KEY = "stock:hot-drift"
+
+# KEYS: counters, ARGV: quantities. Returns 0 when taken, i when line i is short,
+# -i when counter i is not loaded.
+TAKE_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    local left = redis.call('GET', key)
+    if not left then return -i end
+    if tonumber(left) < tonumber(ARGV[i]) then return i end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('DECRBY', key, ARGV[i])
+end
+return 0
+"""
+
+# KEYS: counters, ARGV: signed deltas; missing counters are left to be primed.
+ADJUST_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('INCRBY', key, ARGV[i])
+    end
+end
+return 0
+"""
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(getattr(settings, "HOT_STOCK_REDIS_URL", settings.REDIS_URL))
+    return _client
+
+
+def set_client(client) -> None:
+    """Swap the Redis connection (tests use fakeredis)."""
+    global _client
+    _client = client
+
+
+def counter_key(store_item_id) -> str:
+    return f"{KEY_PREFIX}{store_item_id}"
+
+
+def _db_available(store_item_ids) -> dict:
+    from sales.reservations import with_available
+    from .models import StoreItem
+
+    # Counters give back expired holds only when the sweep releases them (sales.services.restock_orders)
+    rows = with_available(StoreItem.objects.filter(pk__in=list(store_item_ids), is_hot=True), include_expired=True)
+    return dict(rows.values_list("pk", "available"))
+
+
+def prime(store_item_ids, *, overwrite=False) -> None:
+    """Load counters from the database (only where missing, unless ``overwrite``)."""
+    available = _db_available(store_item_ids)
+    pipe = get_client().pipeline()
+    for pk, count in available.items():
+        pipe.set(counter_key(pk), count, nx=not overwrite)
+    pipe.execute()
+
+
+def forget(store_item_ids) -> None:
+    keys = [counter_key(pk) for pk in store_item_ids]
+    if keys:
+        get_client().delete(*keys)
+        get_client().hdel(DRIFT_KEY, *keys)
+
+
+def take(lines: dict):
+    """
+    Atomically take ``{store_item_id: quantity}`` from the counters.
+    Returns None on success, or the id of the first line that is short.
+    """
+    if not lines:
+        return None
+    ids = list(lines)
+    keys = [counter_key(pk) for pk in ids]
+    quantities = [int(lines[pk]) for pk in ids]
+    client = get_client()
+    result = client.eval(TAKE_SCRIPT, len(keys), *keys, *quantities)
+    if result < 0:
+        # Counter(s) not loaded yet: prime from the database and try once more
+        prime(ids)
+        result = client.eval(TAKE_SCRIPT, len(keys), *keys, *quantities)
+    if result == 0:
+        return None
+    return ids[abs(result) - 1]
+
+
+def adjust(deltas: dict) -> None:
+    """Add signed ``{store_item_id: delta}`` to loaded counters (give-backs, stock edits)."""
+    deltas = {pk: int(delta) for pk, delta in deltas.items() if delta}
+    if deltas:
+        keys = [counter_key(pk) for pk in deltas]
+        get_client().eval(ADJUST_SCRIPT, len(keys), *keys, *deltas.values())
+
+
+def reconcile() -> dict:
+    """
+    Compare every hot counter with the database and fix differences that persisted
+    since the previous run. Returns ``{store_item_id: correction}`` applied.
+    """
+    from .models import StoreItem
+
+    hot_ids = list(StoreItem.objects.filter(is_hot=True).values_list("pk", flat=True))
+    if not hot_ids:
+        return {}
+    available = _db_available(hot_ids)
+    client = get_client()
+    keys = [counter_key(pk) for pk in hot_ids]
+    counters = client.mget(keys)
+    previous = client.hgetall(DRIFT_KEY)
+
+    corrections, drift = {}, {}
+    for pk, key, counter in zip(hot_ids, keys, counters):
+        if counter is None:
+            client.set(key, available[pk], nx=True)
+            continue
+        diff = available[pk] - int(counter)
+        if not diff:
+            continue
+        if previous.get(key.encode()) == str(diff).encode():
+            corrections[pk] = diff
+        else:
+            drift[key] = diff
+    pipe = client.pipeline()
+    pipe.delete(DRIFT_KEY)
+    if drift:
+        pipe.hset(DRIFT_KEY, mapping=drift)
+    pipe.execute()
+    if corrections:
+        logger.warning("Correcting hot stock counters: %s", corrections)
+        adjust(corrections)
+    return corrections
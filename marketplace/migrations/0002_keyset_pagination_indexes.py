@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_keyset_pagination_indexes'),
+        ('marketplace', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seller',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='marketplace_seller_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['deleted_at', 'updated_at'], name='marketplace_deleted_edab64_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='marketplace_store_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='storeitem',
+            index=models.Index(fields=['deleted_at', 'updated_at'], name='marketplace_deleted_a46a65_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storeitem',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='marketplace_storeitem_keyset'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-rating_avg', '-created_at', '-id'], name='marketplace_store_rating'),
+        ),
+    ]
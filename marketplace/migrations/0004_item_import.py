@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:32
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0003_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemImport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('file', models.FileField(upload_to='imports/store-items/')),
+                ('file_format', models.CharField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], default='csv', max_length=8)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=8)),
+                ('processed_rows', models.PositiveIntegerField(default=0)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('updated_count', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='store_item_imports', to=settings.AUTH_USER_MODEL)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_imports', to='marketplace.store')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['deleted_at', 'updated_at'], name='marketplace_deleted_18512c_idx'), models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='marketplace_itemimport_keyset')],
+            },
+        ),
+    ]
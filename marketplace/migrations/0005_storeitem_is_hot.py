@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0004_item_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storeitem',
+            name='is_hot',
+            field=models.BooleanField(default=False, help_text='Flash-sale mode: checkout takes stock from a Redis counter instead of locking this row'),
+        ),
+    ]
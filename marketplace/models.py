@@ -1,7 +1,7 @@
 from django.conf import settings
 from django.db import models
 from django.utils.text import slugify
-from core.models import BaseModel
+from core.models import BaseModel, RatingSummary
 
 class Seller(BaseModel):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="seller_profile")
@@ -11,7 +11,7 @@ class Seller(BaseModel):
     def __str__(self):
         return self.display_name or str(self.user)
 
-class Store(BaseModel):
+class Store(BaseModel, RatingSummary):
     owner = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name="stores")
     name = models.CharField(max_length=150, unique=True)
     slug = models.SlugField(max_length=170, unique=True, blank=True)
@@ -19,8 +19,16 @@ class Store(BaseModel):
     logo = models.ImageField(upload_to="stores/", blank=True, null=True)
     is_active = models.BooleanField(default=True)
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         ordering = ["name"]
+        indexes = [
+            *BaseModel.Meta.indexes,
+            models.Index(
+                fields=["-rating_avg", "-created_at", "-id"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="marketplace_store_rating",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -38,8 +46,12 @@ class StoreItem(BaseModel):
     price = models.DecimalField(max_digits=12, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
+    is_hot = models.BooleanField(
+        default=False,
+        help_text="Flash-sale mode: checkout takes stock from a Redis counter instead of locking this row",
+    )
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         # unique_together = (("store", "product"),)
         constraints = [
             models.UniqueConstraint(
@@ -49,10 +61,46 @@ class StoreItem(BaseModel):
         ]
         ordering = ["-created_at"]
         indexes = [
+            *BaseModel.Meta.indexes,
             models.Index(fields=["sku"]),
             models.Index(fields=["is_active"]),
         ]
 
     def __str__(self):
         return f"{self.store.name} · {self.variant} · {self.sku}"
-    
\ No newline at end of file
+    
+
+IMPORT_STATUS = (
+    ("PENDING", "Pending"),
+    ("RUNNING", "Running"),
+    ("DONE", "Done"),
+    ("FAILED", "Failed"),
+)
+
+IMPORT_FORMATS = (
+    ("csv", "CSV"),
+    ("jsonl", "JSON Lines"),
+)
+
+
+class ItemImport(BaseModel):
+    """
+    A seller's bulk StoreItem upsert (keyed on sku), processed in chunks by
+    marketplace.tasks.import_store_items_task; see marketplace.bulk.
+    """
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name="item_imports")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="store_item_imports")
+    file = models.FileField(upload_to="imports/store-items/")
+    file_format = models.CharField(max_length=8, choices=IMPORT_FORMATS, default="csv")
+    status = models.CharField(max_length=8, choices=IMPORT_STATUS, default="PENDING")
+
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    # First MAX_REPORTED_ERRORS failures: [{"row": 3, "sku": "...", "errors": {...}}]
+    errors = models.JSONField(default=list, blank=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"ItemImport<{self.id}> {self.store_id} {self.status}"
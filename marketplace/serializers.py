@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Seller, Store, StoreItem
+from .models import ItemImport, Seller, Store, StoreItem
 from catalog.serializers import ProductSerializer, ProductVariantSerializer
 
 class SellerSerializer(serializers.ModelSerializer):
@@ -10,24 +10,38 @@ class SellerSerializer(serializers.ModelSerializer):
 
 class StoreSerializer(serializers.ModelSerializer):
     owner_detail = SellerSerializer(source="owner", read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = Store
         fields = [
             "id", "owner", "owner_detail",
             "name", "slug", "description", "logo",
-            "is_active", "created_at", "updated_at",
+            "is_active", "rating_avg", "rating_count", "rating_histogram",
+            "created_at", "updated_at",
         ]
-        read_only_fields = ["id", "slug", "created_at", "updated_at"]
+        read_only_fields = ["id", "slug", "rating_avg", "rating_count", "created_at", "updated_at"]
 
 class StoreItemSerializer(serializers.ModelSerializer):
     variant_detail = ProductVariantSerializer(source="variant", read_only=True)
     store_name = serializers.CharField(source="store.name", read_only=True)
+    # Stock minus live checkout holds; annotated by StoreItemViewSet (sales.reservations.with_available)
+    available = serializers.IntegerField(read_only=True)
     # product_detail = ProductSerializer(source="product", read_only=True)
     class Meta:
         model = StoreItem
         fields = [
             "id","store","store_name","variant","variant_detail",
-            "sku","price","stock","is_active","created_at","updated_at"
+            "sku","price","stock","available","is_active","created_at","updated_at"
         ]
-        read_only_fields = ["id", "created_at", "updated_at"]
\ No newline at end of file
+        read_only_fields = ["id", "created_at", "updated_at"]
+
+class ItemImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ItemImport
+        fields = [
+            "id", "store", "file", "file_format", "status",
+            "processed_rows", "created_count", "updated_count", "error_count", "errors",
+            "created_at", "updated_at", "finished_at",
+        ]
+        read_only_fields = [f for f in fields if f not in ("file", "file_format")]
@@ -1,31 +1,30 @@
 from __future__ import annotations
 
+import time
+
 from django.conf import settings
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.db import transaction
 
+from core import notifications, outbox
+from . import hot_stock
 from .models import StoreItem
-from .tasks import notify_low_stock_email_task
+from .tasks import low_stock_key, notify_low_stock_email_task
 
 
-@receiver(pre_save, sender=StoreItem, dispatch_uid="marketplace.low_stock_alert_threshold_cross")
-def low_stock_alert(sender, instance: StoreItem, **kwargs):
-    """
-    Notify only when stock crosses from above threshold to at/below threshold.
+def enqueue_low_stock_alert(store_item_id, sku: str, old_stock: int | None, new_stock: int | None) -> bool:
     """
-    if not instance.pk:
-        return
-    threshold = getattr(settings, "INVENTORY_LOW_STOCK_THRESHOLD", 3)
-    try:
-        from .models import StoreItem as StoreItemModel
-        old_stock = StoreItemModel.objects.only("stock").get(pk=instance.pk).stock
-    except Exception:
-        old_stock = None
+    Record a low-stock email in the outbox (core.outbox) if stock crossed the threshold.
 
-    new_stock = instance.stock
+    Shared by the pre_save receiver and by bulk paths (checkout, restock)
+    that update stock with queryset.update() and therefore skip signals.
+    A burst of crossings for one item is recorded once per dedup window
+    (NOTIFICATIONS["DEDUP_TTL"]). Returns True when a notification was scheduled.
+    """
     if new_stock is None:
-        return
+        return False
+    threshold = getattr(settings, "INVENTORY_LOW_STOCK_THRESHOLD", 3)
     if old_stock is None:
         # If we don't know old stock, fall back to notifying only if clearly crossing
         should_notify = new_stock <= threshold
@@ -33,9 +32,39 @@ def low_stock_alert(sender, instance: StoreItem, **kwargs):
         should_notify = (old_stock > threshold and new_stock <= threshold)
 
     if not should_notify:
+        return False
+
+    window = int(time.time()) // notifications.config()["DEDUP_TTL"]
+    outbox.enqueue(
+        notify_low_stock_email_task, str(store_item_id), sku, int(new_stock), int(threshold),
+        dedup_key=f"{low_stock_key(store_item_id)}:{window}",
+    )
+    return True
+
+
+@receiver(pre_save, sender=StoreItem, dispatch_uid="marketplace.low_stock_alert_threshold_cross")
+def low_stock_alert(sender, instance: StoreItem, **kwargs):
+    """
+    Notify only when stock crosses from above threshold to at/below threshold.
+    The old stock comes from the instance's loaded snapshot (BaseModel.previous).
+    """
+    if instance._state.adding:
         return
+    enqueue_low_stock_alert(instance.pk, instance.sku, instance.previous("stock"), instance.stock)
 
-    def _enqueue():
-        notify_low_stock_email_task.delay(str(instance.pk), instance.sku, int(new_stock), int(threshold))
 
-    transaction.on_commit(_enqueue)
+@receiver(post_save, sender=StoreItem, dispatch_uid="marketplace.sync_hot_stock_counter")
+def sync_hot_stock_counter(sender, instance: StoreItem, created, **kwargs):
+    """
+    Keep the Redis counter of a hot item in step with saves (after commit):
+    prime it when the item turns hot, drop it when it cools down, and apply
+    stock edits as a delta so units taken by in-flight checkouts are kept.
+    """
+    pk = instance.pk
+    if instance.is_hot and (created or instance.has_changed("is_hot")):
+        transaction.on_commit(lambda: hot_stock.prime([pk], overwrite=True))
+    elif not instance.is_hot and not created and instance.has_changed("is_hot"):
+        transaction.on_commit(lambda: hot_stock.forget([pk]))
+    elif instance.is_hot and instance.has_changed("stock"):
+        delta = (instance.stock or 0) - (instance.previous("stock") or 0)
+        transaction.on_commit(lambda: hot_stock.adjust({pk: delta}))
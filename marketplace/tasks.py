@@ -1,15 +1,16 @@
 from __future__ import annotations
 
 from celery import shared_task
-from django.conf import settings
-from django.core.mail import EmailMessage
+
+from core.notifications import Notification, dispatch
 
 
 @shared_task
 def notify_low_stock_email_task(store_item_id: str, sku: str, stock: int, threshold: int):
     """
     Notify store owner by email when a StoreItem stock falls below threshold.
-    Idempotent and safe to run multiple times.
+    One alert per item per NOTIFICATIONS["DEDUP_TTL"]; an owner's alerts within
+    the low_stock coalescing window arrive as one email (core.notifications).
     """
     from .models import StoreItem
 
@@ -31,10 +32,32 @@ def notify_low_stock_email_task(store_item_id: str, sku: str, stock: int, thresh
         f"Threshold: {threshold}\n\n"
         f"Store: {item.store.name}"
     )
-    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", None)
+    dispatch(Notification("low_stock", to_email, body, subject=subject, key=low_stock_key(store_item_id)))
+
+
+def low_stock_key(store_item_id) -> str:
+    return f"low-stock:{store_item_id}"
+
+
+
+@shared_task
+def import_store_items_task(import_id: str):
+    """
+    Run a seller's bulk StoreItem import (see marketplace.bulk.run_import).
+    Imports that already ran are left alone, so redelivery is harmless.
+    """
+    from .bulk import run_import
+    from .models import ItemImport
+
     try:
-        EmailMessage(subject, body, from_email, [to_email]).send()
-    except Exception:
-        # In dev, email backend may be console or misconfigured; ignore failures
-        pass
+        item_import = ItemImport.objects.select_related("store").get(pk=import_id, status="PENDING")
+    except ItemImport.DoesNotExist:
+        return
+    run_import(item_import)
+
 
+@shared_task
+def reconcile_hot_stock_task() -> dict:
+    """Check hot-SKU Redis counters against the database (see marketplace.hot_stock)."""
+    from . import hot_stock
+    return {str(pk): delta for pk, delta in hot_stock.reconcile().items()}
@@ -1,6 +1,9 @@
+from datetime import timedelta
+
 import pytest
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError, transaction
+from django.utils import timezone
 from django.utils.text import slugify
 
 from marketplace.models import Seller, Store, StoreItem
@@ -44,3 +47,276 @@ def test_storeitem_unique_constraints():
     # sku must be unique globally
     with pytest.raises(IntegrityError), transaction.atomic():
         StoreItem.objects.create(store=store, variant=v2, sku="SAME-SKU", price=10, stock=1)
+
+
+@pytest.mark.django_db
+def test_storeitem_list_filters_by_attributes_price_and_stock_with_facets():
+    from rest_framework.test import APIClient
+
+    u = get_user_model().objects.create_user(username="s3", password="p")
+    store = Store.objects.create(owner=Seller.objects.create(user=u, display_name="S3"), name="Shop3")
+    p = Product.objects.create(category=Category.objects.create(name="Phones"), title="Phone", price=1)
+    specs = [
+        ("red-128", {"color": "red", "storage": "128GB"}, 100, 5),
+        ("red-256", {"color": "red", "storage": "256GB"}, 150, 0),
+        ("blue-128", {"color": "blue", "storage": "128GB"}, 120, 2),
+    ]
+    for name, attributes, price, stock in specs:
+        v = ProductVariant.objects.create(product=p, name=name, attributes=attributes)
+        StoreItem.objects.create(store=store, variant=v, sku=name, price=price, stock=stock)
+
+    client = APIClient()
+    res = client.get("/api/marketplace/items/", {"attr.color": "red"})
+    assert res.status_code == 200
+    assert {i["sku"] for i in res.json()["results"]} == {"red-128", "red-256"}
+    facets = res.json()["facets"]
+    # the selected key still lists its other values; other keys follow the filter
+    assert facets["color"] == [{"value": "red", "count": 2}, {"value": "blue", "count": 1}]
+    assert facets["storage"] == [{"value": "128GB", "count": 1}, {"value": "256GB", "count": 1}]
+
+    res = client.get("/api/marketplace/items/", {"attr.color": "red", "in_stock": "true"})
+    assert [i["sku"] for i in res.json()["results"]] == ["red-128"]
+    res = client.get("/api/marketplace/items/", {"min_price": "110", "max_price": "130"})
+    assert [i["sku"] for i in res.json()["results"]] == ["blue-128"]
+
+    # the side table follows attribute edits
+    v = ProductVariant.objects.get(name="blue-128")
+    v.attributes = {"color": "red", "storage": "128GB"}
+    v.save()
+    res = client.get("/api/catalog/product-variants/", {"attr.color": "red", "attr.storage": "128GB", "in_stock": "true"})
+    assert {i["name"] for i in res.json()["results"]} == {"red-128", "blue-128"}
+    assert res.json()["facets"]["color"] == [{"value": "red", "count": 2}]
+
+    # offer filters read live stock, so they are not served from the catalog cache
+    StoreItem.objects.filter(sku="red-128").update(stock=0)
+    res = client.get("/api/catalog/product-variants/", {"attr.color": "red", "attr.storage": "128GB", "in_stock": "true"})
+    assert {i["name"] for i in res.json()["results"]} == {"blue-128"}
+
+
+@pytest.mark.django_db
+def test_bulk_import_upserts_by_sku_and_export_round_trips(settings, tmp_path):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from rest_framework.test import APIClient
+    from marketplace.bulk import run_import
+    from core.models import OutboxMessage
+    from marketplace.models import ItemImport
+    from marketplace import tasks
+
+    settings.MEDIA_ROOT = tmp_path
+    u = get_user_model().objects.create_user(username="bulk", email="bulk@ex.com", password="p")
+    other = get_user_model().objects.create_user(username="rival", email="rival@ex.com", password="p")
+    store = Store.objects.create(owner=Seller.objects.create(user=u, display_name="B"), name="Bulk Shop")
+    rival = Store.objects.create(owner=Seller.objects.create(user=other, display_name="R"), name="Rival Shop")
+    p = Product.objects.create(category=Category.objects.create(name="Bulk"), title="Cable", price=1)
+    v1, v2, v3 = (ProductVariant.objects.create(product=p, name=f"V{i}") for i in range(3))
+    StoreItem.objects.create(store=store, variant=v1, sku="CAB-1", price=5, stock=1)
+    StoreItem.objects.create(store=rival, variant=v3, sku="RIVAL-1", price=5, stock=1)
+
+    csv_body = "\n".join([
+        "sku,variant,price,stock,is_active",
+        f"CAB-1,{v1.id},7.50,10,",                   # update
+        f"CAB-2,{v2.id},3.00,4,false",               # create
+        f"RIVAL-1,{v3.id},1.00,1,true",              # sku owned by another store
+        f"CAB-3,{v2.id},3.00,4,true",                # variant already used by CAB-2
+        "CAB-4,not-a-uuid,-1,2,true",                # shape errors
+    ])
+    client = APIClient(); client.force_authenticate(u)
+    res = client.post(
+        f"/api/marketplace/stores/{store.id}/items/import/",
+        {"file": SimpleUploadedFile("items.csv", csv_body.encode()), "file_format": "csv"},
+        format="multipart",
+    )
+    assert res.status_code == 202
+    enqueued = OutboxMessage.objects.filter(task=tasks.import_store_items_task.name)
+    assert list(enqueued.values_list("args", flat=True)) == [[res.json()["id"]]]
+
+    job = run_import(ItemImport.objects.get(pk=res.json()["id"]), chunk_size=2)
+    assert (job.status, job.processed_rows, job.created_count, job.updated_count, job.error_count) == ("DONE", 5, 1, 1, 3)
+    assert [e["row"] for e in job.errors] == [4, 5, 6]
+    item = StoreItem.objects.get(sku="CAB-1")
+    assert (item.price, item.stock, item.is_active) == (7.5, 10, True)
+    assert StoreItem.objects.get(sku="RIVAL-1").store_id == rival.id
+
+    res = client.get(f"/api/marketplace/stores/{store.id}/items/export/")
+    assert res.status_code == 200
+    lines = b"".join(res.streaming_content).decode().splitlines()
+    assert lines[0] == "sku,variant,price,stock,is_active"
+    assert [line.split(",")[0] for line in lines[1:]] == ["CAB-1", "CAB-2"]
+
+    rival_client = APIClient(); rival_client.force_authenticate(other)
+    assert rival_client.get(f"/api/marketplace/stores/{store.id}/items/export/").status_code == 403
+    assert rival_client.get(f"/api/marketplace/imports/{job.id}/").status_code == 404
+
+
+@pytest.fixture
+def fake_redis():
+    import fakeredis
+    from marketplace import hot_stock
+
+    server = fakeredis.FakeServer()
+    hot_stock.set_client(fakeredis.FakeRedis(server=server))
+    yield server
+    hot_stock.set_client(None)
+
+
+def test_hot_stock_take_never_oversells_under_concurrency(fake_redis):
+    """Many threads race for the same two counters; the Lua take is all-or-nothing."""
+    import threading
+    import fakeredis
+    from marketplace import hot_stock
+
+    client = fakeredis.FakeRedis(server=fake_redis)
+    client.set(hot_stock.counter_key("a"), 10)
+    client.set(hot_stock.counter_key("b"), 7)
+
+    results, start = [], threading.Barrier(40)
+
+    def buyer():
+        start.wait()
+        results.append(hot_stock.take({"a": 1, "b": 1}))
+
+    threads = [threading.Thread(target=buyer) for _ in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results.count(None) == 7
+    assert int(client.get(hot_stock.counter_key("a"))) == 3
+    assert int(client.get(hot_stock.counter_key("b"))) == 0
+
+
+@pytest.mark.django_db
+def test_hot_item_checkout_uses_counter_and_reconciles(fake_redis, django_capture_on_commit_callbacks, monkeypatch):
+    from marketplace import hot_stock
+    from sales import tasks
+    from sales.models import Cart, CartItem
+    from sales.services import cancel_orders, create_order_from_cart
+
+    monkeypatch.setattr(tasks.send_order_cancelled_email_task, "delay", lambda *a: None)
+    User = get_user_model()
+    seller = Seller.objects.create(user=User.objects.create_user(username="hs", email="hs@example.com", password="p"), display_name="H")
+    store = Store.objects.create(owner=seller, name="Hot Shop")
+    variant = ProductVariant.objects.create(product=Product.objects.create(category=Category.objects.create(name="C"), title="T", price=1), name="V")
+    with django_capture_on_commit_callbacks(execute=True):
+        item = StoreItem.objects.create(store=store, variant=variant, sku="HOT-1", price=5, stock=3, is_hot=True)
+    client = hot_stock.get_client()
+    assert int(client.get(hot_stock.counter_key(item.pk))) == 3
+
+    buyer = User.objects.create_user(username="hb", email="hb@example.com", password="p")
+    cart, _ = Cart.objects.get_or_create(user=buyer)
+    CartItem.objects.create(cart=cart, store_item=item, quantity=2)
+    order = create_order_from_cart(cart)
+    assert int(client.get(hot_stock.counter_key(item.pk))) == 1
+    CartItem.all_objects.filter(cart=cart).restore()
+    with pytest.raises(ValueError):
+        create_order_from_cart(cart)
+    assert int(client.get(hot_stock.counter_key(item.pk))) == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        cancel_orders([order.pk])
+    assert int(client.get(hot_stock.counter_key(item.pk))) == 3
+
+    # a seller restock applies as a delta
+    item = StoreItem.objects.get(pk=item.pk)
+    item.stock = 10
+    with django_capture_on_commit_callbacks(execute=True):
+        item.save(update_fields=["stock"])
+    assert int(client.get(hot_stock.counter_key(item.pk))) == 10
+
+    # drift is corrected only once it is seen twice in a row
+    client.set(hot_stock.counter_key(item.pk), 4)
+    assert hot_stock.reconcile() == {}
+    assert hot_stock.reconcile() == {item.pk: 6}
+    assert int(client.get(hot_stock.counter_key(item.pk))) == 10
+
+
+@pytest.mark.django_db
+def test_bulk_import_reprices_carts_and_moves_hot_counters(fake_redis, django_capture_on_commit_callbacks):
+    from marketplace import hot_stock
+    from marketplace.bulk import import_chunk
+    from sales.cache import get_cart_pricing
+    from sales.models import Cart, CartItem
+
+    User = get_user_model()
+    store = Store.objects.create(owner=Seller.objects.create(user=User.objects.create_user(username="bi", email="bi@example.com", password="p"), display_name="BI"), name="Import Shop")
+    variant = ProductVariant.objects.create(product=Product.objects.create(category=Category.objects.create(name="C"), title="T", price=1), name="V")
+    with django_capture_on_commit_callbacks(execute=True):
+        item = StoreItem.objects.create(store=store, variant=variant, sku="IMP-1", price=5, stock=3, is_hot=True)
+    cart, _ = Cart.objects.get_or_create(user=User.objects.create_user(username="bc", email="bc@example.com", password="p"))
+    CartItem.objects.create(cart=cart, store_item=item, quantity=1)
+    assert cart.pricing()["total_price"] == 5
+    hot_stock.take({item.pk: 1})  # a checkout in flight
+
+    row = {"sku": "IMP-1", "variant": str(variant.id), "price": "7.00", "stock": "8"}
+    with django_capture_on_commit_callbacks(execute=True):
+        assert import_chunk(store, [(2, row)]) == (0, 1, [])
+    assert get_cart_pricing(cart.pk) is None
+    assert cart.pricing()["total_price"] == 7
+    assert int(hot_stock.get_client().get(hot_stock.counter_key(item.pk))) == 7
+
+
+@pytest.mark.django_db
+def test_hot_counter_keeps_expired_holds_until_the_sweep_gives_them_back(fake_redis, django_capture_on_commit_callbacks):
+    from marketplace import hot_stock
+    from sales.models import Cart, CartItem, Order, StockReservation
+    from sales.services import create_order_from_cart
+    from sales.tasks import expire_stale_reservations_task
+
+    User = get_user_model()
+    store = Store.objects.create(owner=Seller.objects.create(user=User.objects.create_user(username="hx", email="hx@example.com", password="p"), display_name="HX"), name="Expiry Shop")
+    variant = ProductVariant.objects.create(product=Product.objects.create(category=Category.objects.create(name="C"), title="T", price=1), name="V")
+    with django_capture_on_commit_callbacks(execute=True):
+        item = StoreItem.objects.create(store=store, variant=variant, sku="HOT-X", price=5, stock=3, is_hot=True)
+    cart, _ = Cart.objects.get_or_create(user=User.objects.create_user(username="hy", email="hy@example.com", password="p"))
+    CartItem.objects.create(cart=cart, store_item=item, quantity=2)
+    order = create_order_from_cart(cart)
+    StockReservation.objects.filter(order=order).update(expires_at=timezone.now() - timedelta(minutes=1))
+    key = hot_stock.counter_key(item.pk)
+
+    # the expired hold is not drift: the sweep is about to give it back
+    assert hot_stock.reconcile() == {}
+    assert hot_stock.reconcile() == {}
+    assert int(hot_stock.get_client().get(key)) == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert expire_stale_reservations_task() == 1
+    assert Order.objects.get(pk=order.pk).status == "CANCELLED"
+    assert int(hot_stock.get_client().get(key)) == 3
+    assert hot_stock.reconcile() == {}
+    assert hot_stock.reconcile() == {}
+
+
+@pytest.mark.django_db
+def test_bulk_import_never_takes_over_a_sku_claimed_by_another_store(monkeypatch):
+    from marketplace.bulk import import_chunk
+
+    User = get_user_model()
+    store, rival = (
+        Store.objects.create(owner=Seller.objects.create(user=User.objects.create_user(username=n, email=f"{n}@example.com", password="p"), display_name=n), name=n)
+        for n in ("own", "rival")
+    )
+    product = Product.objects.create(category=Category.objects.create(name="C"), title="T", price=1)
+    ours, theirs, other = (ProductVariant.objects.create(product=product, name=f"V{i}") for i in range(3))
+    StoreItem.objects.create(store=rival, variant=theirs, sku="TAKEN", price=5, stock=1)
+
+    # another store's sku is refused outright
+    row = {"sku": "TAKEN", "variant": str(ours.id), "price": "9.00", "stock": "9"}
+    created, updated, errors = import_chunk(store, [(2, row)])
+    assert (created, updated) == (0, 0)
+    assert errors[0]["errors"] == {"sku": ["This sku belongs to another store."]}
+
+    # ... and so is one the rival inserts between our read and our insert
+    bulk_create = StoreItem.all_objects.bulk_create
+
+    def rival_first(items, **kwargs):
+        StoreItem.objects.create(store=rival, variant=other, sku="RACE", price=5, stock=1)
+        return bulk_create(items, **kwargs)
+
+    monkeypatch.setattr(StoreItem.all_objects, "bulk_create", rival_first)
+    row = {"sku": "RACE", "variant": str(ours.id), "price": "9.00", "stock": "9"}
+    created, updated, errors = import_chunk(store, [(3, row)])
+    assert (created, updated) == (0, 0)
+    assert errors == [{"row": 3, "sku": "RACE", "errors": {"sku": ["This sku belongs to another store."]}}]
+    race = StoreItem.objects.get(sku="RACE")
+    assert (race.store_id, race.variant_id, race.price, race.stock) == (rival.pk, other.pk, 5, 1)
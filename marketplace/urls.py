@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SellerViewSet, StoreViewSet, StoreItemViewSet
+from .views import ItemImportViewSet, SellerViewSet, StoreViewSet, StoreItemViewSet
 
 app_name = "marketplace"
 
@@ -8,6 +8,7 @@ router = DefaultRouter()
 router.register(r"sellers", SellerViewSet, basename="seller")
 router.register(r"stores", StoreViewSet, basename="store")
 router.register(r"items", StoreItemViewSet, basename="storeitem")
+router.register(r"imports", ItemImportViewSet, basename="itemimport")
 
 
 my_router = DefaultRouter()
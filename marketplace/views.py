@@ -1,12 +1,22 @@
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from rest_framework import decorators, response, status
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.parsers import MultiPartParser
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
-from .models import Seller, Store, StoreItem
-from .serializers import SellerSerializer, StoreSerializer, StoreItemSerializer
+from rest_framework.filters import OrderingFilter
+from catalog.filters import AttributeFacetMixin
+from sales.reservations import with_available
+from core import outbox
+from core.instrumentation import InstrumentedViewMixin
+from .bulk import export_rows
+from .models import ItemImport, Seller, Store, StoreItem
+from .serializers import ItemImportSerializer, SellerSerializer, StoreSerializer, StoreItemSerializer
+from .tasks import import_store_items_task
 from .permissions import IsOwnerOrReadOnly
 
-class SellerViewSet(ModelViewSet):
+class SellerViewSet(InstrumentedViewMixin, ModelViewSet):
     queryset = Seller.objects.select_related("user").all()
     serializer_class = SellerSerializer
 
@@ -34,9 +44,11 @@ class SellerViewSet(ModelViewSet):
         return super().get_queryset()
 
 
-class StoreViewSet(ModelViewSet):
+class StoreViewSet(InstrumentedViewMixin, ModelViewSet):
     queryset = Store.objects.select_related("owner", "owner__user").all()
     serializer_class = StoreSerializer
+    filter_backends = [OrderingFilter]
+    ordering_fields = ["rating_avg", "created_at"]
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
@@ -78,12 +90,59 @@ class StoreViewSet(ModelViewSet):
         if not seller:
             return response.Response({"detail": "Not a seller."}, status=status.HTTP_403_FORBIDDEN)
         qs = self.get_queryset().filter(owner=seller)
-        ser = self.get_serializer(qs, many=True)
-        return response.Response(ser.data)
+        page = self.paginate_queryset(qs)
+        ser = self.get_serializer(page, many=True)
+        return self.get_paginated_response(ser.data)
 
-class StoreItemViewSet(ModelViewSet):
-    queryset = StoreItem.objects.select_related("store", "store__owner", "store__owner__user", "product", "variant", "variant__product").all()
+    def _owned_store(self, request):
+        store = self.get_object()
+        seller = getattr(request.user, "seller_profile", None)
+        if not seller or store.owner_id != seller.id:
+            raise PermissionDenied("Only the store owner can manage its inventory in bulk.")
+        return store
+
+    @decorators.action(detail=True, methods=["post"], url_path="items/import", parser_classes=[MultiPartParser])
+    def import_items(self, request, pk=None):
+        """
+        Upload a CSV (header: sku,variant,price,stock,is_active) or JSONL file to
+        upsert this store's items by sku. Returns 202 with an import to poll at
+        /api/marketplace/imports/<id>/ for progress and per-row errors.
+        """
+        store = self._owned_store(request)
+        ser = ItemImportSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        with transaction.atomic():
+            item_import = ser.save(store=store, created_by=request.user)
+            outbox.enqueue(import_store_items_task, str(item_import.pk), dedup_key=f"item-import:{item_import.pk}")
+        return response.Response(ItemImportSerializer(item_import).data, status=status.HTTP_202_ACCEPTED)
+
+    @decorators.action(detail=True, methods=["get"], url_path="items/export")
+    def export_items(self, request, pk=None):
+        """Stream the store's full inventory as CSV (default) or JSONL (?file_format=jsonl)."""
+        store = self._owned_store(request)
+        file_format = "jsonl" if request.query_params.get("file_format") == "jsonl" else "csv"
+        content_type = "application/x-ndjson" if file_format == "jsonl" else "text/csv"
+        resp = StreamingHttpResponse(export_rows(store, file_format), content_type=content_type)
+        resp["Content-Disposition"] = f'attachment; filename="{store.slug}-items.{file_format}"'
+        return resp
+
+
+class ItemImportViewSet(InstrumentedViewMixin, ReadOnlyModelViewSet):
+    """A seller's bulk import jobs and their progress."""
+    serializer_class = ItemImportSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ItemImport.objects.filter(created_by=self.request.user)
+
+
+class StoreItemViewSet(InstrumentedViewMixin, AttributeFacetMixin, ModelViewSet):
+    queryset = StoreItem.objects.select_related("store", "store__owner", "store__owner__user", "variant", "variant__product").all()
     serializer_class = StoreItemSerializer
+    page_size = 24
+    max_page_size = 96
+    variant_path = "variant__"
+    offer_path = "pk"
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
@@ -98,7 +157,7 @@ class StoreItemViewSet(ModelViewSet):
         serializer.save()
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        qs = with_available(super().get_queryset())
         if self.request.method not in ("GET", "HEAD", "OPTIONS") and self.request.user.is_authenticated:
             seller = getattr(self.request.user, "seller_profile", None)
             if seller:
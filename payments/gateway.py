@@ -0,0 +1,225 @@
+"""
+Zarinpal gateway client.
+
+One ``ZarinpalClient`` per process keeps a pooled ``requests.Session``
+(keep-alive, up to ``POOL_SIZE`` connections) instead of opening a connection per
+payment. Calls use separate connect and read timeouts. Connection failures and
+502/503/504 answers are retried ``RETRIES`` times with jittered exponential
+backoff; read timeouts are not, so a slow gateway costs at most one read timeout.
+
+A circuit breaker opens after ``BREAKER_THRESHOLD`` consecutive failures. While
+it is open, calls fail at once with ``GatewayUnavailable`` instead of holding a
+worker for the timeouts. After ``BREAKER_RESET`` seconds one trial call is let
+through, and its outcome closes or re-opens the circuit.
+
+Every call is timed into the ``payment_gateway_request_duration_seconds``
+histogram (core.instrumentation), labelled by operation and outcome.
+
+``AsyncZarinpalClient`` offers the same calls as coroutines for ASGI views. It
+runs them on the pooled session in a bounded thread pool, so the event loop is
+never blocked and at most ``POOL_SIZE`` calls are in flight.
+
+``payments.stub_gateway`` serves the same contract locally for tests and load runs.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.instrumentation import histogram
+
+REQUEST_PATH = "/pg/v4/payment/request.json"
+VERIFY_PATH = "/pg/v4/payment/verify.json"
+STARTPAY_PATH = "/pg/StartPay/"
+HEADERS = {"accept": "application/json", "content-type": "application/json"}
+
+DEFAULTS = {
+    "BASE_URL": "https://sandbox.zarinpal.com",
+    "MERCHANT_ID": "xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx",
+    "CONNECT_TIMEOUT": 3.05,
+    "READ_TIMEOUT": 10,
+    "RETRIES": 2,
+    "BACKOFF": 0.2,
+    "POOL_SIZE": 20,
+    "BREAKER_THRESHOLD": 5,
+    "BREAKER_RESET": 30,
+}
+
+latency = histogram("payment_gateway_request_duration_seconds", "Zarinpal API call latency.")
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or did not answer with 200."""
+
+
+class GatewayUnavailable(GatewayError):
+    """The circuit is open: the call was refused without touching the network."""
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "PAYMENT_GATEWAY", {})}
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed → open → half-open → closed)."""
+
+    def __init__(self, threshold: int, reset_after: float, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if self.clock() - self._opened_at >= self.reset_after else "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self.clock() - self._opened_at < self.reset_after or self._trial:
+                raise GatewayUnavailable("Payment gateway circuit is open.")
+            self._trial = True  # half-open: let exactly one call through
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at = self.clock()
+            self._trial = False
+
+
+class ZarinpalClient:
+    def __init__(self, conf: dict | None = None):
+        self.conf = {**config(), **(conf or {})}
+        retry = Retry(
+            total=self.conf["RETRIES"],
+            connect=self.conf["RETRIES"],
+            read=0,
+            status=self.conf["RETRIES"],
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            backoff_factor=self.conf["BACKOFF"],
+            backoff_jitter=self.conf["BACKOFF"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.conf["POOL_SIZE"], max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.breaker = CircuitBreaker(self.conf["BREAKER_THRESHOLD"], self.conf["BREAKER_RESET"])
+
+    def _post(self, operation: str, path: str, payload: dict) -> dict:
+        self.breaker.before_call()
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                self.conf["BASE_URL"].rstrip("/") + path,
+                json=payload,
+                timeout=(self.conf["CONNECT_TIMEOUT"], self.conf["READ_TIMEOUT"]),
+            )
+        except requests.RequestException as exc:
+            self.breaker.record_failure()
+            raise GatewayError(f"Zarinpal {operation} failed: {exc}") from exc
+        else:
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                raise GatewayError(f"Zarinpal {operation} answered {response.status_code}")
+            self.breaker.record_success()
+            if response.status_code != 200:
+                raise GatewayError(f"Zarinpal {operation} answered {response.status_code}")
+            outcome = "ok"
+            return response.json()
+        finally:
+            latency.observe(time.perf_counter() - start, operation=operation, outcome=outcome)
+
+    def request_payment(self, amount: int, description: str, callback_url: str) -> dict:
+        """POST request.json; returns the gateway's JSON (``data.code == 100`` carries ``authority``)."""
+        return self._post("request", REQUEST_PATH, {
+            "merchant_id": self.conf["MERCHANT_ID"],
+            "amount": amount,
+            "callback_url": callback_url,
+            "description": description,
+        })
+
+    def verify(self, amount: int, authority: str) -> dict:
+        """POST verify.json; returns the gateway's JSON (``data.code`` 100 verified, 101 already verified)."""
+        return self._post("verify", VERIFY_PATH, {
+            "merchant_id": self.conf["MERCHANT_ID"],
+            "amount": amount,
+            "authority": authority,
+        })
+
+    def startpay_url(self, authority: str) -> str:
+        return f"{self.conf['BASE_URL'].rstrip('/')}{STARTPAY_PATH}{authority}"
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncZarinpalClient:
+    """Coroutine front for a ZarinpalClient, for ASGI views."""
+
+    def __init__(self, client: ZarinpalClient):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=client.conf["POOL_SIZE"], thread_name_prefix="zarinpal")
+
+    async def _run(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, method, *args)
+
+    async def request_payment(self, amount: int, description: str, callback_url: str) -> dict:
+        return await self._run(self.client.request_payment, amount, description, callback_url)
+
+    async def verify(self, amount: int, authority: str) -> dict:
+        return await self._run(self.client.verify, amount, authority)
+
+    def startpay_url(self, authority: str) -> str:
+        return self.client.startpay_url(authority)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_client = None
+_async_client = None
+
+
+def get_client() -> ZarinpalClient:
+    global _client
+    if _client is None:
+        _client = ZarinpalClient()
+    return _client
+
+
+def get_async_client() -> AsyncZarinpalClient:
+    global _async_client
+    if _async_client is None or _async_client.client is not get_client():
+        _async_client = AsyncZarinpalClient(get_client())
+    return _async_client
+
+
+def set_client(client: ZarinpalClient | None) -> None:
+    """Swap the process client (tests point it at payments.stub_gateway)."""
+    global _client
+    _client = client
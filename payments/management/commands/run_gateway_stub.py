@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from payments.stub_gateway import StubGateway
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local Zarinpal stand-in (request.json / verify.json / StartPay) for load runs. "
+        "Point PAYMENT_GATEWAY['BASE_URL'] at it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8700)
+        parser.add_argument("--delay", type=float, default=0.0, help="Seconds added to every response.")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with 503.")
+        parser.add_argument("--decline-rate", type=float, default=0.0, help="Share of verifications that fail (-51).")
+
+    def handle(self, *args, host, port, delay, error_rate, decline_rate, **options):
+        stub = StubGateway(host, port, delay=delay, error_rate=error_rate, decline_rate=decline_rate)
+        self.stdout.write(self.style.SUCCESS(f"Zarinpal stub listening on {stub.url}"))
+        try:
+            stub.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.server.server_close()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_keyset_pagination_indexes'),
+        ('sales', '0007_order_payment_authority_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status__in', ['INITIATED', 'CALLBACK_OK'])), fields=['updated_at', 'id'], name='payments_payment_unsettled'),
+        ),
+    ]
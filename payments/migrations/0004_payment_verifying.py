@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_payment_unsettled_index'),
+        ('sales', '0007_order_payment_authority_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payments_payment_unsettled',
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('INITIATED', 'Initiated'), ('CALLBACK_OK', 'Callback Ok'), ('VERIFYING', 'Verifying'), ('VERIFIED', 'Verified'), ('FAILED', 'Failed')], default='INITIATED', max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status__in', ['INITIATED', 'CALLBACK_OK', 'VERIFYING'])), fields=['updated_at', 'id'], name='payments_payment_unsettled'),
+        ),
+    ]
@@ -16,7 +16,7 @@ class Payment(BaseModel):
         status (CharField): the status of the payment
         paid_at (DateTimeField): the datetime when the payment was made
     """
-    STATUS = [("INITIATED","Initiated"),("CALLBACK_OK","Callback Ok"),("VERIFIED","Verified"),("FAILED","Failed")]
+    STATUS = [("INITIATED","Initiated"),("CALLBACK_OK","Callback Ok"),("VERIFYING","Verifying"),("VERIFIED","Verified"),("FAILED","Failed")]
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="payment")
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     provider = models.CharField(max_length=30)
@@ -24,6 +24,17 @@ class Payment(BaseModel):
     status = models.CharField(max_length=15, choices=STATUS, default="INITIATED")
     paid_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            *BaseModel.Meta.indexes,
+            # Reconciliation sweep (see payments.reconcile): unsettled payments, oldest first
+            models.Index(
+                fields=["updated_at", "id"],
+                condition=models.Q(status__in=["INITIATED", "CALLBACK_OK", "VERIFYING"]),
+                name="payments_payment_unsettled",
+            ),
+        ]
+
 
 class Transaction(BaseModel):
     """
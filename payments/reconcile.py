@@ -0,0 +1,128 @@
+"""
+Reconciliation of payments whose callback never arrived.
+
+A buyer who closes the browser on the gateway page leaves the Payment in
+INITIATED (or CALLBACK_OK / VERIFYING, if the callback died mid-verify).
+``sweep`` pages through such payments that have not moved for ``STALE_AFTER``
+seconds, in keyset batches over the ``payments_payment_unsettled`` index
+(``updated_at, id``), and asks the gateway about each one:
+
+- verified (100/101): the orders are paid in bulk (sales.services.pay_orders);
+- not paid or unknown authority (-51/-54): the orders are cancelled and
+  restocked in bulk (sales.services.cancel_orders);
+- anything else, or a failed call: left as is for the next sweep.
+
+Gateway calls of a batch run ``CONCURRENCY`` at a time on the pooled client
+(payments.gateway); database work stays on the calling thread. An open circuit
+ends the sweep early. Payments without an authority never reached the gateway
+and are left to the reservation expiry (sales.tasks.expire_stale_reservations_task),
+which in turn leaves every order with an authority to this sweep. ``STALE_AFTER``
+is kept below STOCK_RESERVATION_TTL so a payment is asked about before its hold lapses.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import outbox
+from sales.services import cancel_orders, pay_orders
+from . import gateway
+from .models import Payment
+from .services import VERIFIED_CODES, to_rial
+from .tasks import log_transaction_task
+
+# Gateway codes meaning the buyer did not pay: -51 unpaid session, -54 unknown authority
+FAILED_CODES = {-51, -54}
+
+DEFAULTS = {
+    "STALE_AFTER": 10 * 60,
+    "BATCH_SIZE": 100,
+    "MAX_BATCHES": 50,
+    "CONCURRENCY": 8,
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "PAYMENT_RECONCILE", {})}
+
+
+def stale_payments(stale_after: float):
+    return (
+        Payment.objects.filter(
+            status__in=["INITIATED", "CALLBACK_OK", "VERIFYING"],
+            updated_at__lte=timezone.now() - timedelta(seconds=stale_after),
+            order__status="PENDING",
+        )
+        .exclude(authority="")
+        .select_related("order")
+        .order_by("updated_at", "id")
+    )
+
+
+def _ask(client, payment: Payment):
+    try:
+        return client.verify(to_rial(payment.order.total_price), payment.authority)
+    except gateway.GatewayError as exc:
+        return exc
+
+
+def apply_outcomes(payments, answers) -> Counter:
+    """Settle a batch from the gateway's answers, with one bulk transition per outcome."""
+    counts = Counter()
+    paid, failed, payloads = {}, [], {}
+    for payment, answer in zip(payments, answers):
+        if isinstance(answer, Exception):
+            counts["errors"] += 1
+            continue
+        data = answer.get("data") or {}
+        code = data.get("code", (answer.get("errors") or {}).get("code"))
+        payloads[payment.order_id] = answer
+        if code in VERIFIED_CODES:
+            paid[payment.order_id] = str(data["ref_id"])
+        elif code in FAILED_CODES:
+            failed.append(payment.order_id)
+        else:
+            counts["unresolved"] += 1
+
+    with transaction.atomic():
+        paid_ids = pay_orders(paid) if paid else []
+        failed_ids = cancel_orders(failed, statuses=["PENDING"]) if failed else []
+        outbox.enqueue_all([
+            *(outbox.message(log_transaction_task, str(pk), paid[pk], payloads[pk], dedup_key=f"transaction:{pk}:{paid[pk]}")
+              for pk in paid_ids),
+            *(outbox.message(log_transaction_task, str(pk), "", payloads[pk], "FAILED", dedup_key=f"transaction:{pk}:failed")
+              for pk in failed_ids),
+        ])
+    counts["paid"] += len(paid_ids)
+    counts["failed"] += len(failed_ids)
+    return counts
+
+
+def sweep(conf: dict | None = None) -> Counter:
+    """
+    Reconcile stale payments; returns counts of ``paid``, ``failed``,
+    ``unresolved`` (answered with another code) and ``errors`` (call failed).
+    """
+    conf = {**config(), **(conf or {})}
+    client = gateway.get_client()
+    counts = Counter()
+    cursor = Q()
+    base = stale_payments(conf["STALE_AFTER"])
+    with ThreadPoolExecutor(max_workers=conf["CONCURRENCY"], thread_name_prefix="reconcile") as pool:
+        for _ in range(conf["MAX_BATCHES"]):
+            batch = list(base.filter(cursor)[:conf["BATCH_SIZE"]])
+            if not batch:
+                break
+            last = batch[-1]
+            cursor = Q(updated_at__gt=last.updated_at) | Q(updated_at=last.updated_at, id__gt=last.id)
+            answers = list(pool.map(lambda payment: _ask(client, payment), batch))
+            counts += apply_outcomes(batch, answers)
+            if any(isinstance(answer, gateway.GatewayUnavailable) for answer in answers):
+                break
+    return counts
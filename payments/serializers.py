@@ -20,7 +20,7 @@ class StartPayResponseSerializer(serializers.Serializer):
     startpay_url = serializers.URLField()
 
 class VerifyResponseSerializer(serializers.Serializer):
-    status = serializers.ChoiceField(choices=["success", "failed","canceled"])
+    status = serializers.ChoiceField(choices=["success", "failed","canceled", "processing"])
     ref_id = serializers.CharField(required=False, allow_blank=True)
     payload = serializers.JSONField(required=False)
     detail = serializers.CharField(required=False)
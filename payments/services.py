@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from core import outbox
+from sales.models import Order
+from sales.services import cancel_orders
+from . import gateway
+from .models import Payment
+from .tasks import log_transaction_task
+
+# Gateway codes meaning the payment is verified (101: verified by an earlier call)
+VERIFIED_CODES = {100, 101}
+
+
+def to_rial(amount_toman: Decimal | int | float) -> int:
+    return int(Decimal(str(amount_toman)) * 10)
+
+
+def stored_outcome(order: Order):
+    """The callback answer for an order that is already settled, or None if it is still pending."""
+    if order.status == "PAID":
+        return {"status": "success", "ref_id": order.payment_ref_id}, 200
+    if order.status == "CANCELLED":
+        return {"status": "canceled"}, 200
+    return None
+
+
+def mark_paid(order: Order, ref_id: str, payload: dict) -> None:
+    """
+    PAID transition for a locked, pending order. The Order pre_save receiver turns
+    the stock holds into a sale and queues the emails; the transaction log is
+    queued once, in the outbox.
+    """
+    order.status = "PAID"
+    order.payment_ref_id = ref_id
+    order.paid_at = timezone.now()
+    order.save(update_fields=["status", "payment_ref_id", "paid_at", "updated_at"])
+    # Log transaction asynchronously once the payment commits
+    outbox.enqueue(log_transaction_task, str(order.pk), ref_id, payload, dedup_key=f"transaction:{order.pk}:{ref_id}")
+
+
+def verify_callback(authority: str, callback_ok: bool):
+    """
+    Handle a gateway callback for ``authority``; returns ``(body, http_status)``.
+
+    Idempotent per authority. The order is found through the unique
+    ``payment_authority`` index, so the lookup cost does not grow with the table.
+    Orders that are already settled are answered from the database without
+    calling the gateway. Otherwise:
+
+    1. the callback claims verification by moving the Payment to VERIFYING with
+       one conditional UPDATE; a duplicate callback that loses the claim is
+       answered from the stored order, or with 202 while the claim is running;
+    2. the gateway verifies with no lock held (verify is idempotent: 101 means
+       verified by an earlier call);
+    3. the order is locked only to apply ``mark_paid``, unless the reconciler
+       (payments.reconcile) settled it in the meantime.
+
+    A failed verification hands the claim back (CALLBACK_OK); a claim left
+    behind by a crashed worker is picked up by the reconciliation sweeper.
+
+    :raises gateway.GatewayError: if the gateway cannot be reached (the Payment
+        goes back to CALLBACK_OK for a retry or the sweeper).
+    """
+    order = Order.objects.filter(payment_authority=authority).first()
+    if order is None:
+        return {"detail": "Order not found."}, 404
+    answer = stored_outcome(order)
+    if answer is not None:
+        return answer
+
+    if not callback_ok:
+        # Mark order as cancelled (and restocked) when user/payment provider returns non-OK
+        cancel_orders([order.pk], statuses=["PENDING"])
+        order.refresh_from_db(fields=["status", "payment_ref_id"])
+        return stored_outcome(order) or ({"status": "canceled"}, 200)
+
+    payment = Payment.objects.filter(order=order)
+    claimed = payment.filter(status__in=["INITIATED", "CALLBACK_OK"]).update(
+        status="VERIFYING", updated_at=timezone.now()
+    )
+    if not claimed:
+        order.refresh_from_db(fields=["status", "payment_ref_id"])
+        return stored_outcome(order) or ({"status": "processing"}, 202)
+
+    def release():
+        payment.filter(status="VERIFYING").update(status="CALLBACK_OK", updated_at=timezone.now())
+
+    try:
+        result = gateway.get_client().verify(to_rial(order.total_price), authority)
+    except gateway.GatewayError:
+        release()
+        raise
+    data = result.get("data") or {}
+    if data.get("code") not in VERIFIED_CODES:
+        release()
+        code = data.get("code", (result.get("errors") or {}).get("code"))
+        return {"status": "failed", "code": code}, 400
+
+    ref_id = str(data["ref_id"])
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        answer = stored_outcome(order)
+        if answer is not None:
+            return answer
+        mark_paid(order, ref_id, result)
+    return {"status": "success", "ref_id": ref_id}, 200
@@ -0,0 +1,141 @@
+"""
+Local stand-in for the Zarinpal v4 API, for tests and load runs.
+
+Serves ``POST /pg/v4/payment/request.json`` and ``POST /pg/v4/payment/verify.json``
+with the gateway's JSON contract, plus ``GET /pg/StartPay/<authority>``, which
+redirects straight back to the callback URL with ``Status=OK`` as if the buyer
+had paid. Every response can be delayed by ``delay`` seconds. A share of calls
+(``error_rate``) answers 503, and a share of verifications (``decline_rate``)
+reports a failed payment (code -51).
+
+    with StubGateway(delay=0.05, error_rate=0.1) as stub:
+        client = ZarinpalClient({"BASE_URL": stub.url})
+
+or from the shell: ``manage.py run_gateway_stub --port 8700 --delay 0.2``.
+"""
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+
+from .gateway import REQUEST_PATH, STARTPAY_PATH, VERIFY_PATH
+
+
+class StubGateway:
+    def __init__(self, host="127.0.0.1", port=0, *, delay=0.0, error_rate=0.0, decline_rate=0.0, seed=None):
+        self.delay = delay
+        self.error_rate = error_rate
+        self.decline_rate = decline_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.payments = {}  # authority -> {"amount", "callback_url", "ref_id"}
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self.server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubGateway":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="zarinpal-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _roll(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self.random.random() < rate
+
+    def request(self, body: dict) -> tuple[int, dict]:
+        if not body.get("merchant_id") or not body.get("amount") or not body.get("callback_url"):
+            return 200, _error(-9, "Validation error")
+        with self._lock:
+            self._sequence += 1
+            authority = f"A{self._sequence:035d}"
+            self.payments[authority] = {"amount": body["amount"], "callback_url": body["callback_url"], "ref_id": None}
+        return 200, {"data": {"code": 100, "message": "Success", "authority": authority, "fee_type": "Merchant", "fee": 0}, "errors": []}
+
+    def verify(self, body: dict) -> tuple[int, dict]:
+        with self._lock:
+            payment = self.payments.get(body.get("authority"))
+            if payment is None:
+                return 200, _error(-54, "Invalid authority.")
+            if payment["amount"] != body.get("amount"):
+                return 200, _error(-50, "Session is not valid, amounts values is not the same.")
+            if payment["ref_id"] is not None:
+                return 200, {"data": {"code": 101, "message": "Verified", "ref_id": payment["ref_id"]}, "errors": []}
+        if self._roll(self.decline_rate):
+            return 200, _error(-51, "Session is not valid, session is not active paid try.")
+        with self._lock:
+            self._sequence += 1
+            payment["ref_id"] = 100000 + self._sequence
+            return 200, {
+                "data": {"code": 100, "message": "Paid", "ref_id": payment["ref_id"], "card_pan": "502229******5995", "fee_type": "Merchant", "fee": 0},
+                "errors": [],
+            }
+
+
+def _error(code: int, message: str) -> dict:
+    return {"data": [], "errors": {"code": code, "message": message, "validations": []}}
+
+
+def _handler_for(stub: StubGateway):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real gateway
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, payload: dict | None = None, headers: dict | None = None):
+            body = json.dumps(payload).encode() if payload is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            operation = {REQUEST_PATH: "request", VERIFY_PATH: "verify"}.get(self.path)
+            if operation is None:
+                return self._send(404, _error(-1, "Not found"))
+            stub.calls[operation] += 1
+            if stub.delay:
+                time.sleep(stub.delay)
+            if stub._roll(stub.error_rate):
+                return self._send(503, _error(-1, "Service unavailable"))
+            self._send(*getattr(stub, operation)(body))
+
+        def do_GET(self):
+            if not self.path.startswith(STARTPAY_PATH):
+                return self._send(404, _error(-1, "Not found"))
+            authority = self.path[len(STARTPAY_PATH):]
+            stub.calls["startpay"] += 1
+            payment = stub.payments.get(authority)
+            if payment is None:
+                return self._send(404, _error(-54, "Invalid authority."))
+            query = urlencode({"Authority": authority, "Status": "OK"})
+            self._send(302, headers={"Location": f"{payment['callback_url']}?{query}"})
+
+    return Handler
@@ -29,3 +29,10 @@ def log_transaction_task(order_id: str, ref_id: str, payload: dict, status: str
         status=status or "VERIFIED",
     )
 
+
+
+@shared_task
+def reconcile_payments_task() -> dict:
+    """Settle payments whose callback never came (see payments.reconcile)."""
+    from . import reconcile
+    return dict(reconcile.sweep())
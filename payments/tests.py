@@ -3,16 +3,22 @@ from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 
+from core.models import OutboxMessage
+from payments.models import Payment
 from sales.models import Order
 
 
-class DummyResponse:
-    """A minimal dummy response object to mock requests.post."""
-    def __init__(self, status_code=200, json_data=None):
-        self.status_code = status_code
+def logged_transactions():
+    """Args of the log_transaction_task calls recorded in the outbox."""
+    return list(OutboxMessage.objects.filter(task="payments.tasks.log_transaction_task").values_list("args", flat=True))
+
+
+class DummyGateway:
+    """A minimal stand-in for payments.gateway.ZarinpalClient returning a canned verify answer."""
+    def __init__(self, json_data=None):
         self._json = json_data or {}
 
-    def json(self):
+    def verify(self, amount, authority):
         return self._json
 
 
@@ -22,7 +28,7 @@ def test_verify_success_marks_order_paid(monkeypatch):
     Verify endpoint should mark an order as PAID and set ref fields.
 
     - Arrange: create a user, an unpaid order with a known authority code.
-    - Mock: Zarinpal verify API to return code 100 and a ref_id.
+    - Mock: the gateway client's verify to return code 100 and a ref_id.
     - Act: call `payments:verify` with Status=OK and Authority.
     - Assert: status becomes "PAID", `payment_ref_id` set, and `paid_at` not null.
     """
@@ -30,11 +36,8 @@ def test_verify_success_marks_order_paid(monkeypatch):
     user = User.objects.create_user(username="u", email="u@x.com", password="p")
     order = Order.objects.create(user=user, payment_authority="AUTH123")
 
-    def fake_post(url, json=None, headers=None, timeout=15):
-        return DummyResponse(200, {"data": {"code": 100, "ref_id": 987654}})
-
     import payments.views as pv
-    monkeypatch.setattr(pv.requests, "post", fake_post)
+    monkeypatch.setattr(pv.gateway, "get_client", lambda: DummyGateway({"data": {"code": 100, "ref_id": 987654}}))
 
     c = APIClient()
     r = c.get(reverse("payments-verify"), {"Status": "OK", "Authority": "AUTH123"})
@@ -64,3 +67,239 @@ def test_verify_cancel_marks_order_cancelled():
     assert r.status_code == 200
     order.refresh_from_db()
     assert order.status == "CANCELLED"
+
+
+@pytest.fixture
+def stub_gateway():
+    from payments import gateway
+    from payments.stub_gateway import StubGateway
+
+    with StubGateway(seed=1) as stub:
+        gateway.set_client(gateway.ZarinpalClient({"BASE_URL": stub.url, "BACKOFF": 0}))
+        yield stub
+        gateway.get_client().close()
+        gateway.set_client(None)
+
+
+def test_gateway_client_talks_to_the_stub_over_one_pooled_connection(stub_gateway):
+    import asyncio
+    from payments import gateway
+
+    gateway.latency.reset()
+    client = gateway.get_client()
+    authority = client.request_payment(1000, "Order #1", "http://testserver/api/payments/verify/")["data"]["authority"]
+    assert client.verify(1000, authority)["data"]["code"] == 100
+    assert client.verify(1000, authority)["data"]["code"] == 101  # already verified
+    assert client.verify(999, authority)["errors"]["code"] == -50
+    assert client.startpay_url(authority) == f"{stub_gateway.url}/pg/StartPay/{authority}"
+
+    async def verify_many():
+        async_client = gateway.get_async_client()
+        return await asyncio.gather(*(async_client.verify(1000, authority) for _ in range(5)))
+
+    assert {r["data"]["code"] for r in asyncio.run(verify_many())} == {101}
+
+    assert stub_gateway.calls == {"request": 1, "verify": 8}
+    stats = gateway.latency.snapshot()
+    assert stats[(("operation", "verify"), ("outcome", "ok"))]["count"] == 8
+    assert "payment_gateway_request_duration_seconds_bucket" in APIClient().get("/metrics").content.decode()
+
+
+def test_gateway_retries_then_opens_the_circuit(stub_gateway):
+    from payments import gateway
+
+    client = gateway.ZarinpalClient({"BASE_URL": stub_gateway.url, "BACKOFF": 0, "RETRIES": 2, "BREAKER_THRESHOLD": 2})
+    stub_gateway.error_rate = 1.0
+    for _ in range(2):
+        with pytest.raises(gateway.GatewayError):
+            client.verify(1000, "A1")
+    assert stub_gateway.calls["verify"] == 2 * 3  # each call: 1 try + 2 retries
+    assert client.breaker.state == "open"
+    with pytest.raises(gateway.GatewayUnavailable):
+        client.verify(1000, "A1")
+    assert stub_gateway.calls["verify"] == 6  # refused without a network call
+
+    # after the reset window one trial call goes through and closes the circuit
+    stub_gateway.error_rate = 0.0
+    client.breaker.reset_after = 0
+    assert client.verify(1000, "A1")["errors"]["code"] == -54
+    assert client.breaker.state == "closed"
+
+
+@pytest.mark.django_db
+def test_start_and_verify_against_the_stub(stub_gateway):
+    User = get_user_model()
+    user = User.objects.create_user(username="stub", email="stub@x.com", password="p")
+    order = Order.objects.create(user=user, subtotal=100, item_count=1)
+    c = APIClient(); c.force_authenticate(user)
+
+    start = c.post(f"/api/payments/start/{order.pk}/")
+    assert start.status_code == 200
+    authority = start.json()["startpay_url"].rsplit("/", 1)[-1]
+    r = APIClient().get("/api/payments/verify/", {"Status": "OK", "Authority": authority})
+    assert r.status_code == 200 and r.json()["status"] == "success"
+    order.refresh_from_db()
+    assert order.status == "PAID"
+    assert stub_gateway.payments[authority]["amount"] == 1000  # toman → rial
+
+
+@pytest.mark.django_db
+def test_repeated_and_concurrent_callbacks_verify_once(stub_gateway):
+    """
+    A callback is verified with the gateway once; repeats are answered from the
+    stored order (or with 202 while another callback holds the verification
+    claim) and log one transaction.
+    """
+    import threading
+    from django.db import connection
+
+    User = get_user_model()
+    user = User.objects.create_user(username="dup", email="dup@x.com", password="p")
+    order = Order.objects.create(user=user, subtotal=100, item_count=1)
+    c = APIClient(); c.force_authenticate(user)
+    authority = c.post(f"/api/payments/start/{order.pk}/").json()["startpay_url"].rsplit("/", 1)[-1]
+
+    # another callback holds the claim: no second gateway call, no lock to wait on
+    Payment.objects.filter(order=order).update(status="VERIFYING")
+    busy = APIClient().get("/api/payments/verify/", {"Status": "OK", "Authority": authority})
+    assert (busy.status_code, busy.json()) == (202, {"status": "processing"})
+    assert stub_gateway.calls.get("verify", 0) == 0
+
+    # a gateway failure hands the claim back for the next callback
+    Payment.objects.filter(order=order).update(status="CALLBACK_OK")
+    stub_gateway.error_rate = 1.0
+    assert APIClient().get("/api/payments/verify/", {"Status": "OK", "Authority": authority}).status_code in (502, 503)
+    assert Payment.objects.get(order=order).status == "CALLBACK_OK"
+    stub_gateway.error_rate = 0.0
+    stub_gateway.calls.clear()
+
+    if connection.vendor != "sqlite":
+        # SQLite has no row locks to wait on; the race is exercised on Postgres only
+        answers = []
+        barrier = threading.Barrier(4)
+
+        def callback():
+            barrier.wait()
+            answers.append(APIClient().get("/api/payments/verify/", {"Status": "OK", "Authority": authority}).json())
+            connection.close()
+
+        threads = [threading.Thread(target=callback) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        statuses = [a["status"] for a in answers]
+        assert "success" in statuses and set(statuses) <= {"success", "processing"}
+
+    first = APIClient().get("/api/payments/verify/", {"Status": "OK", "Authority": authority})
+    again = APIClient().get("/api/payments/verify/", {"Status": "OK", "Authority": authority})
+    late_cancel = APIClient().get("/api/payments/verify/", {"Status": "NOK", "Authority": authority})
+    assert first.json() == again.json() == late_cancel.json()
+    assert first.json()["status"] == "success"
+    assert stub_gateway.calls["verify"] == 1
+    assert len(logged_transactions()) == 1
+    order.refresh_from_db()
+    assert order.status == "PAID" and order.payment.status == "VERIFIED"
+    assert order.updated_at >= order.paid_at
+    assert APIClient().get("/api/payments/verify/", {"Status": "OK", "Authority": "nope"}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_payment_authority_is_unique():
+    from django.db import IntegrityError, transaction
+
+    User = get_user_model()
+    user = User.objects.create_user(username="idx", email="idx@x.com", password="p")
+    Order.objects.create(user=user, payment_authority="A-1")
+    Order.objects.create(user=user)
+    Order.objects.create(user=user)  # many orders without an authority are fine
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Order.objects.create(user=user, payment_authority="A-1")
+
+
+
+@pytest.mark.django_db
+def test_reconcile_sweep_settles_stale_payments(stub_gateway):
+    """
+    Payments whose callback never came are verified in keyset batches: the paid
+    one takes its stock, the unknown one is cancelled and restocked, and fresh or
+    never-started payments are left alone.
+    """
+    from datetime import timedelta
+    from django.utils import timezone
+    from payments import gateway, reconcile
+    from payments.models import Payment
+    from payments.services import to_rial
+    from sales.services import create_order_from_cart
+    from sales.tests import _make_cart_with_lines
+
+    orders, items = {}, {}
+    for name in ("paid", "declined", "fresh", "unstarted"):
+        cart, (items[name],) = _make_cart_with_lines(f"rec-{name}", 1)
+        orders[name] = create_order_from_cart(cart)
+    for name in ("paid", "fresh"):
+        answer = gateway.get_client().request_payment(to_rial(orders[name].total_price), "test", "http://testserver/cb")
+        orders[name].payment_authority = answer["data"]["authority"]
+        orders[name].save()
+    orders["declined"].payment_authority = "A-never-issued"
+    orders["declined"].save()
+    Payment.objects.exclude(order=orders["fresh"]).update(updated_at=timezone.now() - timedelta(hours=1))
+
+    counts = reconcile.sweep({"BATCH_SIZE": 1, "CONCURRENCY": 2})
+    assert counts == {"paid": 1, "failed": 1}
+    assert stub_gateway.calls["verify"] == 2
+
+    for order in orders.values():
+        order.refresh_from_db()
+    for item in items.values():
+        item.refresh_from_db()
+    paid = orders["paid"]
+    assert paid.status == "PAID" and paid.paid_at is not None and paid.payment_ref_id
+    assert paid.payment.status == "VERIFIED" and paid.payment.paid_at == paid.paid_at
+    assert items["paid"].stock == 8
+    assert orders["declined"].status == "CANCELLED" and orders["declined"].payment.status == "FAILED"
+    assert items["declined"].stock == 10
+    assert orders["fresh"].status == orders["unstarted"].status == "PENDING"
+    # one transaction log per settled order; the declined one is logged as FAILED
+    logged = [tuple(args) for args in logged_transactions()]
+    assert {args[:2] for args in logged} == {(str(paid.pk), paid.payment_ref_id), (str(orders["declined"].pk), "")}
+    assert [args[3:] for args in sorted(logged, key=len)] == [(), ("FAILED",)]
+
+    assert reconcile.sweep() == {}
+    assert stub_gateway.calls["verify"] == 2
+
+
+@pytest.mark.django_db
+def test_expired_hold_of_a_started_payment_waits_for_the_gateway(stub_gateway):
+    """
+    Checkout, start-pay, then the callback is lost. 16 minutes later the hold has
+    expired, but the reservation sweeper leaves the order to the payment
+    reconciler, which finds it paid. An order that never reached the gateway is
+    cancelled as before.
+    """
+    from datetime import timedelta
+    from django.utils import timezone
+    from payments.models import Payment
+    from payments.tasks import reconcile_payments_task
+    from sales.models import StockReservation
+    from sales.services import create_order_from_cart
+    from sales.tasks import expire_stale_reservations_task
+    from sales.tests import _make_cart_with_lines
+
+    cart, (item,) = _make_cart_with_lines("late-callback", 1)
+    order = create_order_from_cart(cart)
+    c = APIClient(); c.force_authenticate(cart.user)
+    assert c.post(f"/api/payments/start/{order.pk}/").status_code == 200
+    abandoned_cart, (abandoned_item,) = _make_cart_with_lines("never-paid", 1)
+    abandoned = create_order_from_cart(abandoned_cart)
+
+    sixteen_minutes_ago = timezone.now() - timedelta(minutes=16)
+    StockReservation.objects.update(expires_at=sixteen_minutes_ago + timedelta(minutes=15))
+    Payment.objects.update(updated_at=sixteen_minutes_ago)
+
+    assert expire_stale_reservations_task() == 1
+    assert reconcile_payments_task() == {"paid": 1}
+    order.refresh_from_db(); abandoned.refresh_from_db(); item.refresh_from_db()
+    assert order.status == "PAID" and order.payment.status == "VERIFIED"
+    assert item.stock == 8
+    assert abandoned.status == "CANCELLED"
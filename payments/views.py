@@ -1,9 +1,6 @@
 import uuid
-from decimal import Decimal
 
-import requests
 from django.conf import settings
-from django.db import transaction
 from django.utils import timezone
 
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -14,21 +11,23 @@ from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
 
+from core.idempotency import idempotent
 from sales.models import Order
+from . import gateway
 from .models import Payment
-from .tasks import log_transaction_task
+from .services import to_rial, verify_callback
 from .serializers import StartPayResponseSerializer, VerifyResponseSerializer
 
-ZP_API_REQUEST = "https://sandbox.zarinpal.com/pg/v4/payment/request.json"
-ZP_API_VERIFY  = "https://sandbox.zarinpal.com/pg/v4/payment/verify.json"
-ZP_API_START   = "https://sandbox.zarinpal.com/pg/StartPay/"
-
-MERCHANT_ID   = getattr(settings, "ZARINPAL_MERCHANT_ID", "xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx")
 CALLBACK_URL  = getattr(settings, "ZARINPAL_CALLBACK_URL", "http://127.0.0.1:8000/api/payments/verify/")
 
-def to_rial(amount_toman: Decimal | int | float) -> int:
 
-    return int(Decimal(str(amount_toman)) * 10)
+def gateway_unavailable() -> Response:
+    """The circuit breaker is open; tell the client to come back instead of waiting on timeouts."""
+    return Response(
+        {"error": "Payment gateway is temporarily unavailable"},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(gateway.config()["BREAKER_RESET"])},
+    )
 
 @extend_schema(
     parameters=[
@@ -46,8 +45,10 @@ class StartPayView(APIView):
 
     @extend_schema(
         responses={200: StartPayResponseSerializer},
-        description="Start Zarinpal sandbox payment and return StartPay URL.",
+        description="Start Zarinpal sandbox payment and return StartPay URL. "
+                    "Send an Idempotency-Key header to make retries safe.",
     )
+    @idempotent("payment-start")
     def post(self, request, order_id: uuid.UUID):
 
         try:
@@ -64,25 +65,21 @@ class StartPayView(APIView):
 
         amount_rial = to_rial(order.total_price)
 
-        data = {
-            "merchant_id": MERCHANT_ID,
-            "amount": amount_rial,
-            "callback_url": CALLBACK_URL,
-            "description": f"Order #{order.id}",
-        }
-        headers = {"accept": "application/json", "content-type": "application/json"}
-
-        r = requests.post(ZP_API_REQUEST, json=data, headers=headers, timeout=15)
-        if r.status_code != 200:
+        client = gateway.get_client()
+        try:
+            j = client.request_payment(amount_rial, f"Order #{order.id}", CALLBACK_URL)
+        except gateway.GatewayUnavailable:
+            return gateway_unavailable()
+        except gateway.GatewayError:
             return Response({"error": "Zarinpal request failed"}, status=502)
 
-        j = r.json()
-        if j.get("data", {}).get("code") == 100:
+        if (j.get("data") or {}).get("code") == 100:
             authority = j["data"]["authority"]
             Order.objects.filter(pk=order.id).update(payment_authority=authority)
-            # Keep Payment.authority in sync as update() doesn't trigger signals
-            Payment.objects.filter(order=order).update(authority=authority)
-            return Response({"startpay_url": f"{ZP_API_START}{authority}"}, status=200)
+            # Keep Payment.authority in sync as update() doesn't trigger signals;
+            # updated_at starts the reconciliation sweeper's clock (payments.reconcile)
+            Payment.objects.filter(order=order).update(authority=authority, updated_at=timezone.now())
+            return Response({"startpay_url": client.startpay_url(authority)}, status=200)
 
         return Response({"error": j.get("errors")}, status=400)
 
@@ -109,8 +106,10 @@ class VerifyView(APIView):
     serializer_class = VerifyResponseSerializer
 
     @extend_schema(
-        responses={200: VerifyResponseSerializer},
-        description="Verify Zarinpal sandbox payment callback.",
+        responses={200: VerifyResponseSerializer, 202: VerifyResponseSerializer},
+        description="Verify Zarinpal sandbox payment callback. Repeated callbacks for the same "
+                    "Authority get the stored outcome without another gateway call, or 202 "
+                    "(status \"processing\") while another callback is verifying it.",
     )
     def get(self, request):
         authority = request.GET.get("Authority")
@@ -120,39 +119,9 @@ class VerifyView(APIView):
 
         # اگر کاربر برگشت، باید سفارش متناظر با authority را پیدا کنیم.
         try:
-            order = Order.objects.get(payment_authority=authority, paid_at__isnull=True)
-        except Order.DoesNotExist:
-            return Response({"detail": "Order not found or already verified."}, status=404)
-
-        if status_str != "OK":
-            # Mark order as cancelled when user/payment provider returns non-OK
-            order.status = "CANCELLED"
-            order.save(update_fields=["status"])
-            return Response({"status": "canceled"}, status=200)
-
-        amount_rial = to_rial(order.total_price)
-
-        data = {
-            "merchant_id": MERCHANT_ID,
-            "amount": amount_rial,
-            "authority": authority,
-        }
-        headers = {"accept": "application/json", "content-type": "application/json"}
-
-        r = requests.post(ZP_API_VERIFY, json=data, headers=headers, timeout=15)
-        if r.status_code != 200:
+            body, code = verify_callback(authority, callback_ok=status_str == "OK")
+        except gateway.GatewayUnavailable:
+            return gateway_unavailable()
+        except gateway.GatewayError:
             return Response({"error": "Verify request failed"}, status=502)
-
-        j = r.json()
-        if j.get("data", {}).get("code") == 100:
-            ref_id = str(j["data"]["ref_id"])
-            with transaction.atomic():
-                order.status = "PAID"
-                order.payment_ref_id = ref_id
-                order.paid_at = timezone.now()
-                order.save(update_fields=["status", "payment_ref_id", "paid_at"])
-            # Log transaction asynchronously after commit (ensures Payment exists)
-            transaction.on_commit(lambda: log_transaction_task.delay(str(order.id), ref_id, j))
-            return Response({"status": "success", "ref_id": ref_id}, status=200)
-
-        return Response({"status": "failed", "code": j.get("data", {}).get("code")}, status=400)
+        return Response(body, status=code)
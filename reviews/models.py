@@ -8,9 +8,10 @@ class ProductReview(BaseModel):
     rating = models.PositiveSmallIntegerField()  # 1..5
     comment = models.TextField(blank=True)
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         unique_together = (("user", "product"),)
         indexes = [
+            *BaseModel.Meta.indexes,
             models.Index(fields=["product", "rating"]),
             models.Index(fields=["user"]),
         ]
@@ -28,9 +29,10 @@ class StoreReview(BaseModel):
     rating = models.PositiveSmallIntegerField()  # 1..5
     comment = models.TextField(blank=True)
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         unique_together = (("user", "store"),)
         indexes = [
+            *BaseModel.Meta.indexes,
             models.Index(fields=["store", "rating"]),
             models.Index(fields=["user"]),
         ]
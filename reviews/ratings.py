@@ -0,0 +1,104 @@
+"""
+Incremental maintenance of the RatingSummary fields on Product and Store.
+
+Every review contributes one vote of ``rating`` to its target while it is
+alive. Signals turn a review write into per-star deltas and apply them with a
+single UPDATE of F-expressions, so concurrent reviews never lose counts.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Greatest
+from django.db.models.lookups import GreaterThan
+
+STARS = range(1, 6)
+AVG_QUANTUM = Decimal("0.01")
+
+
+def apply_rating_deltas(target_model, pk, deltas: dict[int, int]) -> None:
+    """
+    Add ``deltas`` ({star: +n/-n}) to one target's histogram and recompute
+    rating_count/rating_avg from the new histogram in the same UPDATE.
+    """
+    counts = {star: Greatest(F(f"rating_{star}") + deltas.get(star, 0), Value(0)) for star in STARS}
+    total = sum(counts.values())
+    weighted = sum(star * counts[star] for star in STARS)
+    target_model.all_objects.filter(pk=pk).update(
+        **{f"rating_{star}": counts[star] for star in STARS},
+        rating_count=total,
+        rating_avg=Case(
+            When(GreaterThan(total, 0), then=Cast(weighted, FloatField()) / total),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+
+
+def vote_of(review, target_field: str):
+    """(target_id, rating) this review currently counts for, or None while soft-deleted."""
+    if review.deleted_at is not None:
+        return None
+    return getattr(review, f"{target_field}_id"), review.rating
+
+
+def apply_vote_change(target_model, before, after) -> bool:
+    """Move a review's vote from ``before`` to ``after``; returns True if anything changed."""
+    if before == after:
+        return False
+    per_target: dict = {}
+    if before is not None:
+        per_target.setdefault(before[0], Counter())[before[1]] -= 1
+    if after is not None:
+        per_target.setdefault(after[0], Counter())[after[1]] += 1
+    for pk, deltas in per_target.items():
+        if any(deltas.values()):
+            apply_rating_deltas(target_model, pk, deltas)
+    return True
+
+
+def average(histogram: dict[int, int]) -> Decimal:
+    total = sum(histogram.values())
+    if not total:
+        return Decimal("0.00")
+    weighted = sum(star * n for star, n in histogram.items())
+    return (Decimal(weighted) / total).quantize(AVG_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def reconcile_ratings(target_model, related_name: str = "reviews", *, fix: bool = True, batch_size: int = 500) -> int:
+    """
+    Recount every target's live reviews with one grouped query and repair the
+    rows whose stored aggregates drifted (e.g. after queryset-level updates,
+    which skip signals). Returns the number of drifted rows.
+    """
+    alive = Q(**{f"{related_name}__deleted_at__isnull": True})
+    annotations = {
+        f"_r{star}": Count(related_name, filter=alive & Q(**{f"{related_name}__rating": star}))
+        for star in STARS
+    }
+    drift = ~Q(rating_count=sum(F(f"_r{star}") for star in STARS))
+    for star in STARS:
+        drift |= ~Q(**{f"rating_{star}": F(f"_r{star}")})
+    # Materialize first: drift should be rare, and writing while iterating is unsafe on SQLite
+    rows = list(
+        target_model.all_objects.annotate(**annotations)
+        .filter(drift)
+        .order_by("pk")
+        .values_list("pk", *annotations)
+    )
+    fixed = []
+    for pk, *counts in rows:
+        histogram = dict(zip(STARS, counts))
+        obj = target_model(pk=pk, rating_count=sum(counts), rating_avg=average(histogram))
+        for star, n in histogram.items():
+            setattr(obj, f"rating_{star}", n)
+        fixed.append(obj)
+    if fix and fixed:
+        target_model.all_objects.bulk_update(
+            fixed,
+            ["rating_avg", "rating_count", *(f"rating_{star}" for star in STARS)],
+            batch_size=batch_size,
+        )
+    return len(fixed)
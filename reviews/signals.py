@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from catalog.cache import bump_catalog_version
+
+from .models import ProductReview, StoreReview
+from .ratings import apply_vote_change, vote_of
+
+# review model -> name of the FK to the rated object
+TARGET_FIELDS = {ProductReview: "product", StoreReview: "store"}
+
+
+def _target_model(sender):
+    return sender._meta.get_field(TARGET_FIELDS[sender]).related_model
+
+
+def _vote_changed(sender, before, after):
+    if apply_vote_change(_target_model(sender), before, after) and sender is ProductReview:
+        # Product responses embed their rating; the aggregate UPDATE skips Product signals
+        bump_catalog_version()
+
+
+@receiver(pre_save, sender=ProductReview, dispatch_uid="reviews.product_review_vote_before")
+@receiver(pre_save, sender=StoreReview, dispatch_uid="reviews.store_review_vote_before")
+def remember_vote_before_save(sender, instance, **kwargs):
+    """Record what the stored row counted for, so post_save can apply only the difference."""
+    if instance._state.adding:
+        instance._vote_before = None
+        return
+    field = TARGET_FIELDS[sender]
+    alive = instance.previous("deleted_at") is None
+    instance._vote_before = (instance.previous(field), instance.previous("rating")) if alive else None
+
+
+@receiver(post_save, sender=ProductReview, dispatch_uid="reviews.product_review_vote_after")
+@receiver(post_save, sender=StoreReview, dispatch_uid="reviews.store_review_vote_after")
+def apply_vote_after_save(sender, instance, **kwargs):
+    """Create, rating edits, soft delete (BaseModel.delete) and restore all land here."""
+    _vote_changed(sender, getattr(instance, "_vote_before", None), vote_of(instance, TARGET_FIELDS[sender]))
+
+
+@receiver(post_delete, sender=ProductReview, dispatch_uid="reviews.product_review_vote_delete")
+@receiver(post_delete, sender=StoreReview, dispatch_uid="reviews.store_review_vote_delete")
+def withdraw_vote_on_hard_delete(sender, instance, **kwargs):
+    _vote_changed(sender, vote_of(instance, TARGET_FIELDS[sender]), None)
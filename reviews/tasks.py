@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from celery import shared_task
+
+
+@shared_task
+def reconcile_rating_aggregates_task():
+    """
+    Recount Product/Store rating aggregates from live reviews and fix drift left by
+    paths that skip signals (queryset updates, admin bulk actions, raw SQL).
+    """
+    from catalog.cache import bump_catalog_version
+    from catalog.models import Product
+    from marketplace.models import Store
+    from .ratings import reconcile_ratings
+
+    products = reconcile_ratings(Product)
+    stores = reconcile_ratings(Store)
+    if products:
+        bump_catalog_version()
+    return {"products": products, "stores": stores}
@@ -31,7 +31,7 @@ def test_product_review_crud_and_uniqueness():
     c2 = APIClient()
     res_list = c2.get(f"/api/reviews/products/?product={p.id}")
     assert res_list.status_code == 200
-    assert len(res_list.json()) == 1
+    assert len(res_list.json()["results"]) == 1
 
 @pytest.mark.django_db
 def test_store_review_and_filtering():
@@ -48,9 +48,47 @@ def test_store_review_and_filtering():
     # filter by store
     res_list = c.get(f"/api/reviews/stores/?store={store.id}")
     assert res_list.status_code == 200
-    assert len(res_list.json()) == 1
+    assert len(res_list.json()["results"]) == 1
 
     # filter by user
     res_list = c.get(f"/api/reviews/stores/?user={u.id}")
     assert res_list.status_code == 200
-    assert len(res_list.json()) == 1
\ No newline at end of file
+    assert len(res_list.json()["results"]) == 1
+
+@pytest.mark.django_db
+def test_rating_aggregates_follow_review_lifecycle_and_reconcile():
+    from decimal import Decimal
+    from reviews.models import ProductReview
+    from reviews.ratings import reconcile_ratings
+
+    User = get_user_model()
+    users = [User.objects.create_user(username=f"r{i}", email=f"r{i}@ex.com", password="p") for i in range(3)]
+    cat = Category.objects.create(name="Audio")
+    p = Product.objects.create(title="Headphones", category=cat, price=10)
+    other = Product.objects.create(title="Speaker", category=cat, price=20)
+
+    r1 = ProductReview.objects.create(user=users[0], product=p, rating=5)
+    r2 = ProductReview.objects.create(user=users[1], product=p, rating=4)
+    p.refresh_from_db()
+    assert (p.rating_count, p.rating_avg) == (2, Decimal("4.50"))
+    assert p.rating_histogram == {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1}
+
+    r2.rating = 1
+    r2.save()
+    r1.delete()  # soft delete
+    p.refresh_from_db()
+    assert (p.rating_count, p.rating_avg, p.rating_1, p.rating_5) == (1, Decimal("1.00"), 1, 0)
+
+    r1.restore()
+    ProductReview.objects.create(user=users[2], product=other, rating=2)
+    c = APIClient()
+    res = c.get("/api/catalog/products/", {"ordering": "-rating_avg"})
+    assert [row["title"] for row in res.json()["results"]] == ["Headphones", "Speaker"]
+    assert res.json()["results"][0]["rating_avg"] == "3.00"
+
+    # queryset updates skip signals; reconciliation repairs the drift
+    ProductReview.objects.filter(pk=r1.pk).update(rating=2)
+    assert reconcile_ratings(Product) == 1
+    p.refresh_from_db()
+    assert (p.rating_count, p.rating_avg, p.rating_2, p.rating_5) == (2, Decimal("1.50"), 1, 0)
+    assert reconcile_ratings(Product) == 0
@@ -1,13 +1,15 @@
-from django.db.models import Avg, Count
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
+from core.instrumentation import InstrumentedViewMixin
 from .models import ProductReview, StoreReview
 from .serializers import ProductReviewSerializer, StoreReviewSerializer
 from marketplace.permissions import IsOwnerOrReadOnly
 
-class ProductReviewViewSet(ModelViewSet):
+class ProductReviewViewSet(InstrumentedViewMixin, ModelViewSet):
     serializer_class = ProductReviewSerializer
+    page_size = 10
+    max_page_size = 50
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
@@ -21,8 +23,10 @@ class ProductReviewViewSet(ModelViewSet):
             qs = qs.filter(product_id=product_id)
         return qs
 
-class StoreReviewViewSet(ModelViewSet):
+class StoreReviewViewSet(InstrumentedViewMixin, ModelViewSet):
     serializer_class = StoreReviewSerializer
+    page_size = 10
+    max_page_size = 50
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
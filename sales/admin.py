@@ -2,13 +2,13 @@ from decimal import Decimal
 
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from django.utils import timezone
 from django.urls import reverse
 from django.utils.html import format_html
-from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Q, Count
 
 from core.admin import SoftDeleteAdminMixin
+from .cache import invalidate_cart_pricing
 from .models import Cart, CartItem, Order, OrderItem, create_order_from_cart
+from .services import cancel_orders, pay_orders
 from payments.models import Payment
 
 
@@ -88,8 +88,8 @@ class CartAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
     def action_clear_items(self, request, queryset):
         total_deleted = 0
         for cart in queryset:
-            deleted, _ = cart.items.all().delete()
-            total_deleted += deleted
+            total_deleted += cart.items.all().delete()
+        invalidate_cart_pricing(*queryset.values_list("pk", flat=True))
         self.message_user(request, _("Removed {} items from selected carts.").format(total_deleted))
 
     @admin.action(description=_("Create orders from selected carts"))
@@ -137,6 +137,7 @@ class OrderAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
         "payment_gateway",
         "payment_link",
         "paid_at",
+        "stock_shortfall",
         "created_at",
     )
     class HasPaymentFilter(admin.SimpleListFilter):
@@ -167,7 +168,7 @@ class OrderAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
                 return queryset.filter(paid_at__isnull=True)
             return queryset
 
-    list_filter = ("status", HasPaymentFilter, HasPaidAtFilter, "created_at", "paid_at", "payment_gateway")
+    list_filter = ("status", "stock_shortfall", HasPaymentFilter, HasPaidAtFilter, "created_at", "paid_at", "payment_gateway")
     search_fields = (
         "user__email",
         "user__username",
@@ -193,31 +194,23 @@ class OrderAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        total_expression = ExpressionWrapper(
-            F("items__unit_price") * F("items__quantity"),
-            output_field=DecimalField(max_digits=12, decimal_places=2),
-        )
+        # Totals are denormalized on Order, so no per-row aggregate is needed here
         return (
             qs.select_related("user", "payment")
             .prefetch_related("items__store_item__variant__product")
-            .annotate(
-                total_quantity=Sum("items__quantity"),
-                total_amount=Sum(total_expression),
-                _has_payment=Count("payment"),
-            )
         )
 
-    @admin.display(ordering="total_quantity", description="Items")
+    @admin.display(ordering="item_count", description="Items")
     def total_items(self, obj):
-        return obj.total_quantity or 0
+        return obj.item_count or 0
 
-    @admin.display(ordering="total_amount", description="Amount")
+    @admin.display(ordering="subtotal", description="Amount")
     def total_price(self, obj):
-        return obj.total_amount or Decimal("0.00")
+        return obj.subtotal or Decimal("0.00")
 
-    @admin.display(ordering="total_amount", description=_("Amount"))
+    @admin.display(ordering="subtotal", description=_("Amount"))
     def total_price_display(self, obj):
-        amount = obj.total_amount or Decimal("0")
+        amount = obj.subtotal or Decimal("0")
         return f"{amount:,.0f}"
 
     @admin.display(ordering="payment__status", description=_("Payment"))
@@ -250,25 +243,23 @@ class OrderAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
         for order in queryset.select_related("payment"):
             if hasattr(order, "payment") and order.payment_id:
                 continue
-            amount = order.total_amount if getattr(order, "total_amount", None) is not None else order.total_price
-            Payment.objects.create(order=order, amount=amount, provider=order.payment_gateway or "zarinpal")
+            Payment.objects.create(order=order, amount=order.subtotal, provider=order.payment_gateway or "zarinpal")
             created += 1
         self.message_user(request, _("{} payments created.").format(created))
 
     @admin.action(description=_("Mark selected orders as PAID"))
     def mark_paid(self, request, queryset):
-        now = timezone.now()
-        updated = queryset.update(status="PAID", paid_at=now)
-        # Sync any related payments to VERIFIED
-        payments_updated = Payment.objects.filter(order__in=queryset).update(status="VERIFIED", paid_at=now)
-        self.message_user(request, _("{} orders marked as PAID. {} payments verified.").format(updated, payments_updated))
+        # Same path as a reconciled payment: stock, Payment and emails (see sales.services.pay_orders)
+        refs = dict(queryset.filter(status="PENDING").order_by().values_list("pk", "payment_ref_id"))
+        paid = pay_orders({pk: ref or "" for pk, ref in refs.items()})
+        skipped = queryset.count() - len(paid)
+        self.message_user(request, _("{} orders marked as PAID. {} skipped (not pending).").format(len(paid), skipped))
 
     @admin.action(description=_("Mark selected orders as CANCELLED"))
     def mark_cancelled(self, request, queryset):
-        updated = queryset.update(status="CANCELLED")
-        # Mark related payments as FAILED (don’t override VERIFIED)
-        payments_updated = Payment.objects.filter(order__in=queryset).exclude(status="VERIFIED").update(status="FAILED")
-        self.message_user(request, _("{} orders marked as CANCELLED. {} payments failed.").format(updated, payments_updated))
+        # Restocks and fails unverified payments too (see sales.services.cancel_orders)
+        cancelled = cancel_orders(queryset)
+        self.message_user(request, _("{} orders marked as CANCELLED and restocked.").format(len(cancelled)))
 
 
 @admin.register(OrderItem)
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.cache import cache
+
+# How long a cart pricing snapshot may live; invalidation normally happens first.
+CART_PRICING_TTL = getattr(settings, "CART_PRICING_CACHE_TTL", 300)
+
+
+def cart_pricing_key(cart_id) -> str:
+    return f"sales:cart-pricing:{cart_id}"
+
+
+def get_cart_pricing(cart_id):
+    return cache.get(cart_pricing_key(cart_id))
+
+
+def set_cart_pricing(cart_id, pricing: dict) -> None:
+    cache.set(cart_pricing_key(cart_id), pricing, CART_PRICING_TTL)
+
+
+def invalidate_cart_pricing(*cart_ids) -> None:
+    """Drop cached pricing snapshots for the given carts (one cache round trip)."""
+    if cart_ids:
+        cache.delete_many([cart_pricing_key(cart_id) for cart_id in cart_ids])
@@ -0,0 +1,166 @@
+"""
+Guest carts for anonymous shoppers, kept in Redis instead of the cart tables.
+
+A guest cart is a Redis hash ``{store_item_id: quantity}`` that expires
+``GUEST_CART["TTL"]`` seconds after its last change. The browser only holds its
+id, in a signed cookie. Each change is one Lua script, so concurrent requests
+cannot drive a line below zero or leave empty lines behind.
+
+On login (accounts LoginView / OTPVerifyView) ``merge`` moves the whole hash
+into the user's database cart with sales.services.apply_cart_changes (quantities
+add up) and deletes it. Database Cart rows are only created when a signed-in
+user first adds something, or when a non-empty guest cart is merged.
+"""
+from __future__ import annotations
+
+import uuid
+from decimal import Decimal
+
+import redis
+from django.conf import settings
+
+KEY_PREFIX = "cart:guest:"
+COOKIE_SALT = "sales.guest_cart"
+
+DEFAULTS = {"COOKIE": "guest_cart", "TTL": 7 * 24 * 60 * 60}
+
+# KEYS: cart. ARGV: ttl, then (store_item_id, mode, value) triples; mode is
+# "set" or "add". Lines that end at zero or below are removed.
+APPLY_SCRIPT = """
+for i = 2, #ARGV, 3 do
+    local field, mode, value = ARGV[i], ARGV[i + 1], tonumber(ARGV[i + 2])
+    if mode == 'add' then
+        value = redis.call('HINCRBY', KEYS[1], field, value)
+    end
+    if value > 0 then
+        redis.call('HSET', KEYS[1], field, value)
+    else
+        redis.call('HDEL', KEYS[1], field)
+    end
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return redis.call('HLEN', KEYS[1])
+"""
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(getattr(settings, "GUEST_CART_REDIS_URL", settings.REDIS_URL))
+    return _client
+
+
+def set_client(client) -> None:
+    """Swap the Redis connection (tests use fakeredis)."""
+    global _client
+    _client = client
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "GUEST_CART", {})}
+
+
+def cart_key(cart_id: str) -> str:
+    return f"{KEY_PREFIX}{cart_id}"
+
+
+def cart_id_from(request) -> str | None:
+    """The guest cart id from the request's signed cookie, or None."""
+    return request.get_signed_cookie(config()["COOKIE"], default=None, salt=COOKIE_SALT)
+
+
+def new_cart_id() -> str:
+    return str(uuid.uuid4())
+
+
+def remember(response, cart_id: str) -> None:
+    """Set (or refresh) the guest cart cookie on ``response``."""
+    conf = config()
+    response.set_signed_cookie(
+        conf["COOKIE"], cart_id, salt=COOKIE_SALT, max_age=conf["TTL"], httponly=True, samesite="Lax"
+    )
+
+
+def forget(response) -> None:
+    response.delete_cookie(config()["COOKIE"], samesite="Lax")
+
+
+def apply(cart_id: str, changes) -> None:
+    """
+    Apply ``{"store_item", "quantity" | "delta"}`` changes (the same shape as
+    sales.services.apply_cart_changes) in one round trip and restart the TTL.
+    """
+    args = []
+    for change in changes:
+        if change.get("delta") is not None:
+            args += [str(change["store_item"]), "add", int(change["delta"])]
+        else:
+            args += [str(change["store_item"]), "set", int(change["quantity"])]
+    if args:
+        get_client().eval(APPLY_SCRIPT, 1, cart_key(cart_id), config()["TTL"], *args)
+
+
+def _decode(raw: dict) -> dict:
+    return {uuid.UUID(pk.decode()): int(quantity) for pk, quantity in raw.items()}
+
+
+def lines(cart_id: str | None) -> dict:
+    """``{store_item_id: quantity}`` for the guest cart (empty if unknown or expired)."""
+    if not cart_id:
+        return {}
+    return _decode(get_client().hgetall(cart_key(cart_id)))
+
+
+def summary(cart_id: str | None) -> dict:
+    """
+    Guest cart state in the CartSummarySerializer shape. Priced with one query;
+    lines whose store item is gone or inactive are left out.
+    """
+    from marketplace.models import StoreItem
+
+    held = lines(cart_id)
+    prices = dict(StoreItem.objects.filter(pk__in=list(held), is_active=True).values_list("pk", "price")) if held else {}
+    kept = [{"store_item": pk, "quantity": quantity} for pk, quantity in held.items() if pk in prices]
+    return {
+        "id": cart_id,
+        "lines": kept,
+        "total_items": sum(line["quantity"] for line in kept),
+        "total_price": sum((prices[line["store_item"]] * line["quantity"] for line in kept), start=Decimal("0")),
+    }
+
+
+def merge(cart_id: str | None, user):
+    """
+    Move a guest cart into ``user``'s database cart and delete it from Redis.
+    The hash is read and deleted in one MULTI, so a repeated login cannot merge
+    it twice. Returns the Cart, or None if there was nothing to merge.
+    """
+    from marketplace.models import StoreItem
+    from .models import Cart
+    from .services import apply_cart_changes
+
+    if not cart_id:
+        return None
+    pipe = get_client().pipeline()
+    pipe.hgetall(cart_key(cart_id))
+    pipe.delete(cart_key(cart_id))
+    raw, _ = pipe.execute()
+    held = _decode(raw)
+    live = set(StoreItem.objects.filter(pk__in=list(held), is_active=True).values_list("pk", flat=True)) if held else set()
+    if not live:
+        return None
+    cart, _ = Cart.objects.get_or_create(user=user)
+    apply_cart_changes(cart, [{"store_item": pk, "delta": quantity} for pk, quantity in held.items() if pk in live])
+    return cart
+
+
+def merge_on_login(request, response, user) -> None:
+    """Merge the request's guest cart into ``user``'s cart and drop the cookie."""
+    cart_id = cart_id_from(request)
+    if cart_id:
+        merge(cart_id, user)
+        forget(response)
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from sales.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Order.subtotal/item_count from live OrderItems and compare them "
+        "with the stored values. Use --check to only report drift (exit code 1)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Report mismatches without fixing them.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows written per bulk_update.")
+
+    def handle(self, *args, check=False, batch_size=500, **options):
+        alive = Q(items__deleted_at__isnull=True)
+        line_total = ExpressionWrapper(
+            F("items__unit_price") * F("items__quantity"),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        drifted = (
+            Order.all_objects.annotate(
+                _count=Coalesce(Sum("items__quantity", filter=alive), Value(0), output_field=models.PositiveIntegerField()),
+                _subtotal=Coalesce(
+                    Sum(line_total, filter=alive),
+                    Value(Decimal("0")),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+            )
+            .filter(~Q(item_count=F("_count")) | ~Q(subtotal=F("_subtotal")))
+            .order_by("pk")
+            .values_list("pk", "item_count", "subtotal", "_count", "_subtotal")
+        )
+
+        # Materialize first: drift is expected to be rare, and writing to the table
+        # while iterating over it is unsafe on SQLite.
+        rows = list(drifted)
+        for pk, item_count, subtotal, count, new_subtotal in rows:
+            self.stdout.write(f"Order {pk}: items {item_count} -> {count}, subtotal {subtotal} -> {new_subtotal}")
+        if not check:
+            Order.all_objects.bulk_update(
+                [Order(pk=pk, item_count=count, subtotal=new_subtotal) for pk, _, _, count, new_subtotal in rows],
+                ["item_count", "subtotal"],
+                batch_size=batch_size,
+            )
+
+        mismatched = len(rows)
+        if check and mismatched:
+            raise CommandError(f"{mismatched} orders have drifted totals.")
+        verb = "found" if check else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"{mismatched} orders with drifted totals {verb}."))
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:20
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model("sales", "Order")
+    OrderItem = apps.get_model("sales", "OrderItem")
+    totals = {}
+    for order_id, unit_price, quantity in (
+        OrderItem.objects.filter(deleted_at__isnull=True)
+        .values_list("order_id", "unit_price", "quantity")
+        .iterator()
+    ):
+        count, subtotal = totals.get(order_id, (0, Decimal("0")))
+        totals[order_id] = (count + quantity, subtotal + unit_price * quantity)
+    for order_id, (count, subtotal) in totals.items():
+        Order.objects.filter(pk=order_id).update(item_count=count, subtotal=subtotal)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:45
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0004_item_import'),
+        ('sales', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('quantity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('expires_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('CONVERTED', 'Converted'), ('RELEASED', 'Released')], default='ACTIVE', max_length=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='sales.order')),
+                ('store_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='marketplace.storeitem')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['deleted_at', 'updated_at'], name='sales_stock_deleted_c5c204_idx'), models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='sales_stockreservation_keyset'), models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['store_item', 'expires_at'], include=('quantity',), name='sales_resv_active_item'), models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['expires_at'], name='sales_resv_active_expiry')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'store_item'), name='uniq_reservation_order_item')],
+            },
+        ),
+    ]
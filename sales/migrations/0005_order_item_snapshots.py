@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:04
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+SNAPSHOT_FIELDS = ["sku", "product_title", "variant_name", "variant_attributes", "store_name"]
+
+
+def backfill_snapshots(apps, schema_editor):
+    """Snapshot existing lines from their (possibly soft-deleted) catalog rows."""
+    OrderItem = apps.get_model("sales", "OrderItem")
+    lines = (
+        OrderItem._base_manager.select_related("store_item__store", "store_item__variant__product")
+        .order_by("pk")
+    )
+    batch = []
+    for line in lines.iterator(chunk_size=BATCH_SIZE):
+        item = line.store_item
+        line.sku = item.sku
+        line.product_title = item.variant.product.title
+        line.variant_name = item.variant.name
+        line.variant_attributes = item.variant.attributes
+        line.store_name = item.store.name
+        batch.append(line)
+        if len(batch) == BATCH_SIZE:
+            OrderItem._base_manager.bulk_update(batch, SNAPSHOT_FIELDS)
+            batch = []
+    if batch:
+        OrderItem._base_manager.bulk_update(batch, SNAPSHOT_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_title',
+            field=models.CharField(blank=True, default='', max_length=180),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='sku',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='store_name',
+            field=models.CharField(blank=True, default='', max_length=150),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='variant_attributes',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='variant_name',
+            field=models.CharField(blank=True, default='', max_length=120),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
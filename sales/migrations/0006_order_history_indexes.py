@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_order_item_snapshots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', '-created_at', '-id'], name='sales_order_user_hist'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'status', '-created_at', '-id'], name='sales_order_user_status'),
+        ),
+    ]
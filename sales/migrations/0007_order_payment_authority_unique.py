@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_order_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('payment_authority__isnull', False), models.Q(('payment_authority', ''), _negated=True)), fields=('payment_authority',), name='uniq_order_payment_authority'),
+        ),
+    ]
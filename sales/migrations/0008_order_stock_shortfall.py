@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_order_payment_authority_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_shortfall',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0005_storeitem_is_hot'),
+        ('sales', '0008_order_stock_shortfall'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stockreservation',
+            name='sales_resv_active_item',
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['store_item', 'expires_at', 'quantity'], name='sales_resv_active_item'),
+        ),
+    ]
@@ -1,6 +1,6 @@
 from decimal import Decimal
 from django.conf import settings
-from django.db import models, transaction
+from django.db import models
 from django.core.validators import MinValueValidator
 from core.models import BaseModel
 
@@ -10,13 +10,37 @@ class Cart(BaseModel):
     def __str__(self):
         return f"Cart<{self.user_id}>"
 
+    def pricing(self) -> dict:
+        """
+        Return ``{"total_items", "total_price"}`` for the cart.
+
+        Both values come from a single aggregate query over the live items and are
+        cached per cart; sales.signals drops the snapshot when a CartItem changes
+        or a StoreItem price changes.
+        """
+        from .cache import get_cart_pricing, set_cart_pricing
+
+        pricing = get_cart_pricing(self.pk)
+        if pricing is None:
+            line_total = models.ExpressionWrapper(
+                models.F("quantity") * models.F("store_item__price"),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            )
+            totals = self.items.aggregate(total_items=models.Sum("quantity"), total_price=models.Sum(line_total))
+            pricing = {
+                "total_items": totals["total_items"] or 0,
+                "total_price": totals["total_price"] or Decimal("0"),
+            }
+            set_cart_pricing(self.pk, pricing)
+        return pricing
+
     @property
     def total_items(self):
-        return self.items.aggregate(total=models.Sum("quantity"))["total"] or 0
+        return self.pricing()["total_items"]
 
     @property
     def total_price(self):
-        return sum((item.subtotal for item in self.items.select_related("store_item")), start=Decimal("0"))
+        return self.pricing()["total_price"]
 
 
 class CartItem(BaseModel):
@@ -24,7 +48,7 @@ class CartItem(BaseModel):
     store_item = models.ForeignKey("marketplace.StoreItem", on_delete=models.CASCADE, related_name="cart_items")
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)], default=1)
 
-    class Meta:
+    class Meta(BaseModel.Meta):
         constraints = [
             models.UniqueConstraint(fields=["cart","store_item"], name="uniq_cart_storeitem"),
         ]
@@ -57,17 +81,65 @@ class Order(BaseModel):
     payment_authority = models.CharField(max_length=64, blank=True, null=True)
     payment_ref_id = models.CharField(max_length=64, blank=True, null=True)
     paid_at = models.DateTimeField(blank=True, null=True)
+    # Paid after its stock holds expired and the units were sold on meanwhile
+    # (see sales.reservations.commit_reservations); the seller restocks or refunds.
+    stock_shortfall = models.BooleanField(default=False)
+
+    # Denormalized totals, kept in sync by sales.signals whenever OrderItems change
+    # (see `manage.py recompute_order_totals` to verify/repair them).
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0"), editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta(BaseModel.Meta):
+        constraints = [
+            # Payment callbacks find their order by authority (see payments.services.verify_callback)
+            models.UniqueConstraint(
+                fields=["payment_authority"],
+                condition=models.Q(payment_authority__isnull=False) & ~models.Q(payment_authority=""),
+                name="uniq_order_payment_authority",
+            ),
+        ]
+        indexes = [
+            *BaseModel.Meta.indexes,
+            # Order history (see OrderViewSet): newest first per user, optionally by status;
+            # both end in (created_at, id) so keyset pages are index range scans.
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="sales_order_user_hist",
+            ),
+            models.Index(
+                fields=["user", "status", "-created_at", "-id"],
+                condition=models.Q(deleted_at__isnull=True),
+                name="sales_order_user_status",
+            ),
+        ]
 
     def __str__(self):
         return f"Order<{self.id}> {self.status}"
 
     @property
     def total_price(self):
-        return sum((item.subtotal for item in self.items.select_related("store_item")), start=Decimal("0"))
+        return self.subtotal
 
     @property
     def total_items(self):
-        return sum((item.quantity for item in self.items.select_related("store_item")), start=0)
+        return self.item_count
+
+    def refresh_totals(self, *, commit=True):
+        """
+        Recompute subtotal/item_count from the live OrderItems with one aggregate
+        query and (optionally) persist them with a single UPDATE.
+        """
+        totals = self.items.aggregate(
+            count=models.Sum("quantity"),
+            subtotal=models.Sum(models.F("unit_price") * models.F("quantity")),
+        )
+        self.item_count = totals["count"] or 0
+        self.subtotal = totals["subtotal"] or Decimal("0")
+        if commit:
+            Order.all_objects.filter(pk=self.pk).update(item_count=self.item_count, subtotal=self.subtotal)
+        return self
 
     def delete(self, *args, **kwargs):
         raise NotImplementedError("Order records cannot be deleted.")
@@ -78,8 +150,15 @@ class OrderItem(BaseModel):
     # Snapshot قیمت در لحظه ثبت سفارش:
     unit_price = models.DecimalField(max_digits=12, decimal_places=2)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)], default=1)
-
-    class Meta:
+    # Catalog snapshot taken at checkout, so order history renders from this row
+    # alone and does not change when the listing is later edited or deleted.
+    sku = models.CharField(max_length=64, blank=True, default="")
+    product_title = models.CharField(max_length=180, blank=True, default="")
+    variant_name = models.CharField(max_length=120, blank=True, default="")
+    variant_attributes = models.JSONField(blank=True, null=True)
+    store_name = models.CharField(max_length=150, blank=True, default="")
+
+    class Meta(BaseModel.Meta):
         constraints = [
             models.UniqueConstraint(fields=["order","store_item"], name="uniq_order_storeitem"),
         ]
@@ -92,39 +171,79 @@ class OrderItem(BaseModel):
         unit_price = self.unit_price if self.unit_price is not None else Decimal("0")
         return Decimal(self.quantity) * unit_price
 
+    def save(self, *args, **kwargs):
+        # Lines written outside checkout (admin, API) snapshot themselves
+        if self._state.adding and not self.sku and self.store_item_id:
+            from marketplace.models import StoreItem
+            self.take_snapshot(
+                StoreItem.all_objects.select_related("store", "variant__product").get(pk=self.store_item_id)
+            )
+        return super().save(*args, **kwargs)
+
+    def take_snapshot(self, store_item=None):
+        """Copy the catalog fields from ``store_item`` (with variant, product and store loaded)."""
+        store_item = store_item or self.store_item
+        self.sku = store_item.sku
+        self.product_title = store_item.variant.product.title
+        self.variant_name = store_item.variant.name
+        self.variant_attributes = store_item.variant.attributes
+        self.store_name = store_item.store.name
+        return self
+
+
+RESERVATION_STATUS = (
+    ("ACTIVE", "Active"),
+    ("CONVERTED", "Converted"),
+    ("RELEASED", "Released"),
+)
+
+
+class StockReservation(BaseModel):
+    """
+    A time-limited hold on StoreItem stock taken at checkout (see sales.reservations).
+
+    ACTIVE holds count against available-to-sell until ``expires_at``. Payment turns
+    them CONVERTED, which decrements StoreItem.stock for good. Cancellation or expiry
+    turns them RELEASED.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="reservations")
+    store_item = models.ForeignKey("marketplace.StoreItem", on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    expires_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=RESERVATION_STATUS, default="ACTIVE")
+
+    class Meta(BaseModel.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=["order", "store_item"], name="uniq_reservation_order_item"),
+        ]
+        indexes = [
+            *BaseModel.Meta.indexes,
+            # Available-to-sell: SUM(quantity) of live holds per item
+            models.Index(
+                # quantity as a trailing key column rather than INCLUDE, which SQLite lacks
+                fields=["store_item", "expires_at", "quantity"],
+                condition=models.Q(status="ACTIVE"),
+                name="sales_resv_active_item",
+            ),
+            # Expiry sweeper: oldest live holds first
+            models.Index(fields=["expires_at"], condition=models.Q(status="ACTIVE"), name="sales_resv_active_expiry"),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} · {self.store_item_id} · {self.quantity} ({self.status})"
+
 
 # یک helper ساده برای تبدیل cart به order
 def create_order_from_cart(cart: Cart) -> Order:
     """
     Helper function to create an order from a cart.
 
-    It checks if there is enough stock for each item in the cart,
-    and if there is, it creates an Order and corresponding the OrderItems,
-    and then deletes the items from the cart.
+    Delegates to the lock-ordered, batched checkout engine in
+    ``sales.services``; kept here so existing imports keep working.
 
     :param cart: The cart to create the order from.
     :raises ValueError: If there is not enough stock for an item.
     :return: The created order.
     """
-    from marketplace.models import StoreItem
-    with transaction.atomic():
-        order = Order.objects.create(user=cart.user)
-        # موجودی را چک کن؛ اگر کافی نبود، خطا بده
-        for ci in cart.items.select_related("store_item"):
-            si: StoreItem = ci.store_item
-            if ci.quantity > si.stock:
-                raise ValueError(f"Not enough stock for SKU {si.sku}")
-        # کم‌کردن موجودی و ساخت OrderItem
-        for ci in cart.items.select_related("store_item"):
-            si: StoreItem = ci.store_item
-            si.stock -= ci.quantity
-            si.save(update_fields=["stock"])
-            OrderItem.objects.create(
-                order=order,
-                store_item=si,
-                unit_price=si.price,   # snapshot قیمت
-                quantity=ci.quantity,
-            )
-        # خالی‌کردن سبد
-        cart.items.all().delete()
-        return order
+    from .services import create_order_from_cart as checkout
+    return checkout(cart)
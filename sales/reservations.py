@@ -0,0 +1,125 @@
+"""
+Time-limited stock reservations.
+
+Checkout no longer decrements ``StoreItem.stock``; it records ACTIVE
+StockReservation rows that expire after ``STOCK_RESERVATION_TTL`` seconds.
+Available-to-sell is ``stock`` minus the unexpired ACTIVE holds, summed from the
+partial ``sales_resv_active_item`` index, so an abandoned order stops holding
+inventory the moment its holds expire, before any cleanup runs.
+
+- Payment converts the holds into a permanent stock decrement (``commit_reservations``);
+  an order paid after its holds expired is re-checked and flagged if short.
+- Cancellation releases them (``sales.services.cancel_orders``).
+- ``sales.tasks.expire_stale_reservations_task`` cancels PENDING orders whose
+  holds have expired, in batches, on a beat schedule.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import StockReservation
+
+logger = logging.getLogger(__name__)
+
+
+def reservation_ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, "STOCK_RESERVATION_TTL", 15 * 60))
+
+
+def active_holds(now=None):
+    return StockReservation.objects.filter(status="ACTIVE", expires_at__gt=now or timezone.now())
+
+
+def reserved_quantities(store_item_ids, now=None) -> dict:
+    """{store_item_id: units held by unexpired ACTIVE reservations}, in one grouped query."""
+    return dict(
+        active_holds(now)
+        .filter(store_item_id__in=store_item_ids)
+        .order_by()
+        .values("store_item_id")
+        .annotate(total=Sum("quantity"))
+        .values_list("store_item_id", "total")
+    )
+
+
+def with_available(queryset, now=None, include_expired=False):
+    """
+    Annotate a StoreItem queryset with ``reserved`` and ``available`` (never below 0).
+
+    ``include_expired`` also counts expired holds still ACTIVE, i.e. everything
+    the expiry sweep has yet to release (what marketplace.hot_stock counters hold).
+    """
+    holds = StockReservation.objects.filter(status="ACTIVE") if include_expired else active_holds(now)
+    held = (
+        holds
+        .filter(store_item=OuterRef("pk"))
+        .order_by()
+        .values("store_item")
+        .annotate(total=Sum("quantity"))
+        .values("total")[:1]
+    )
+    return queryset.annotate(
+        reserved=Coalesce(Subquery(held, output_field=models.IntegerField()), 0),
+        available=Greatest(F("stock") - F("reserved"), 0, output_field=models.IntegerField()),
+    )
+
+
+def commit_reservations(order_ids) -> list:
+    """
+    Turn the orders' ACTIVE holds into a permanent stock decrement: one grouped
+    UPDATE of StoreItem.stock and one UPDATE marking the holds CONVERTED.
+
+    Unexpired holds fit by construction. An expired hold no longer counts
+    against available-to-sell, so its units may have been sold on since: the
+    StoreItems such holds touch are locked and re-checked against the stock
+    still held for other orders. A paid order is converted either way, but one
+    whose expired holds no longer fit is flagged ``Order.stock_shortfall`` for
+    the seller to restock or refund, instead of the overdraft vanishing.
+    Callers own the transaction. Returns the pks of the flagged orders.
+    """
+    from marketplace.models import StoreItem
+    from .models import Order
+
+    now = timezone.now()
+    holds = StockReservation.objects.filter(order_id__in=order_ids, status="ACTIVE")
+    deltas, live, late = {}, {}, {}  # store_item_id -> units / our unexpired units / orders with expired holds
+    for order_id, store_item_id, quantity, expires_at in holds.order_by().values_list(
+        "order_id", "store_item_id", "quantity", "expires_at"
+    ):
+        deltas[store_item_id] = deltas.get(store_item_id, 0) + quantity
+        if expires_at > now:
+            live[store_item_id] = live.get(store_item_id, 0) + quantity
+        else:
+            late.setdefault(store_item_id, set()).add(order_id)
+    if not deltas:
+        return []
+
+    short = set()
+    if late:
+        stock = dict(
+            StoreItem.all_objects.select_for_update().filter(pk__in=list(late)).order_by("pk").values_list("pk", "stock")
+        )
+        held = reserved_quantities(list(late), now)
+        for pk, order_pks in late.items():
+            held_for_others = held.get(pk, 0) - live.get(pk, 0)
+            if stock[pk] - deltas[pk] < held_for_others:
+                short |= order_pks
+    if short:
+        Order.all_objects.filter(pk__in=short).update(stock_shortfall=True, updated_at=now)
+        logger.warning("Orders paid after their holds expired are short of stock: %s", sorted(map(str, short)))
+
+    delta = Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in deltas.items()],
+        output_field=models.IntegerField(),
+    )
+    # stock cannot go below zero; what a short order could not take is on its flag
+    StoreItem.all_objects.filter(pk__in=list(deltas)).update(stock=Greatest(F("stock") - delta, 0))
+    holds.update(status="CONVERTED", updated_at=now)
+    return list(short)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Cart, CartItem, Order, OrderItem
+from .models import ORDER_STATUS, Cart, CartItem, Order, OrderItem
+from marketplace.models import StoreItem
 from marketplace.serializers import StoreItemSerializer
 from decimal import Decimal
 from drf_spectacular.utils import extend_schema_field
@@ -35,18 +36,102 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = OrderItem
-        fields = ["id","order","store_item","store_item_detail","unit_price","quantity","subtotal","created_at","updated_at"]
-        read_only_fields = ["id","created_at","updated_at","subtotal"]
+        fields = [
+            "id","order","store_item","store_item_detail","unit_price","quantity","subtotal",
+            "sku","product_title","variant_name","variant_attributes","store_name","created_at","updated_at",
+        ]
+        read_only_fields = [
+            "id","created_at","updated_at","subtotal",
+            "sku","product_title","variant_name","variant_attributes","store_name",
+        ]
+
+    @extend_schema_field(OpenApiTypes.DECIMAL)
+    def get_subtotal(self, obj) -> Decimal:
+        return obj.subtotal
+
+class OrderItemHistorySerializer(serializers.ModelSerializer):
+    """An order line as it was bought, rendered from its checkout snapshot only (no catalog joins)."""
+    subtotal = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderItem
+        fields = [
+            "id", "store_item", "sku", "product_title", "variant_name", "variant_attributes", "store_name",
+            "unit_price", "quantity", "subtotal",
+        ]
+        read_only_fields = fields
 
     @extend_schema_field(OpenApiTypes.DECIMAL)
     def get_subtotal(self, obj) -> Decimal:
         return obj.subtotal
 
 class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, read_only=True)
+    items = OrderItemHistorySerializer(many=True, read_only=True)
     total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = Order
         fields = ["id","user","status","items","total_price","created_at","updated_at"]
-        read_only_fields = ["id","user","items","total_price","created_at","updated_at"]
+        # Status moves through checkout, payment and the cancel action only
+        read_only_fields = ["id","user","status","items","total_price","created_at","updated_at"]
+
+
+class OrderFilterSerializer(serializers.Serializer):
+    """Order history query params (see OrderViewSet)."""
+    status = serializers.ChoiceField(choices=ORDER_STATUS, required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    paid = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+    def validate(self, attrs):
+        after, before = attrs.get("created_after"), attrs.get("created_before")
+        if after and before and after > before:
+            raise serializers.ValidationError("created_after must not be later than created_before.")
+        return attrs
+
+
+class WaitingRoomSerializer(serializers.Serializer):
+    """A client's place in the checkout waiting room (see sales.waiting_room)."""
+    token = serializers.CharField(allow_null=True, help_text="Checkout pass; send it as X-Checkout-Token")
+    position = serializers.IntegerField(help_text="1-based place in line, 0 once admitted")
+    eta_seconds = serializers.IntegerField()
+
+
+class CartLineChangeSerializer(serializers.Serializer):
+    """One line of a bulk cart update: either an absolute ``quantity`` or a signed ``delta``."""
+    store_item = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=0, required=False, help_text="Set the line to this; 0 removes it")
+    delta = serializers.IntegerField(required=False, help_text="Add this (may be negative) to the line")
+
+    def validate(self, attrs):
+        if ("quantity" in attrs) == ("delta" in attrs):
+            raise serializers.ValidationError("Give exactly one of quantity or delta.")
+        return attrs
+
+
+class CartItemsUpdateSerializer(serializers.Serializer):
+    items = CartLineChangeSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        """All store items are checked with one query."""
+        ids = [item["store_item"] for item in items]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError("Each store item may appear only once.")
+        found = set(StoreItem.objects.filter(pk__in=ids, is_active=True).values_list("pk", flat=True))
+        missing = [str(pk) for pk in ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(f"Unknown or inactive store items: {', '.join(missing)}")
+        return items
+
+
+class CartLineSerializer(serializers.Serializer):
+    store_item = serializers.UUIDField()
+    quantity = serializers.IntegerField()
+
+
+class CartSummarySerializer(serializers.Serializer):
+    """Compact cart state returned by bulk updates (no nested store item details)."""
+    id = serializers.UUIDField()
+    lines = CartLineSerializer(many=True)
+    total_items = serializers.IntegerField()
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2)
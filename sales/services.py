@@ -1,31 +1,324 @@
-# from decimal import Decimal
-# from django.db import transaction
-# from .models import Order, OrderItem
-
-
-# @transaction.atomic
-# def create_order_from_cart(*, cart, user, shipping_address):
-#     """
-#     Creates an order from a cart.
-
-#     This function is wrapped in a transaction and will roll back
-#     if any part of it fails.
-
-#     :param cart: The cart to create the order from.
-#     :param user: The user creating the order.
-#     :param shipping_address: The shipping address for the order.
-#     :return: The created order.
-    
-#     """
-#     order = Order.objects.create(user=user, shipping_address=shipping_address, status="CREATED")
-#     subtotal = Decimal("0")
-#     for ci in cart.items.select_related("store_item","store_item__product"):
-#         price = ci.store_item.price
-#         title = ci.store_item.product.title
-#         OrderItem.objects.create(order=order, store_item=ci.store_item, quantity=ci.quantity,
-#         price_at_purchase=price, title_snapshot=title)
-#         subtotal += price * ci.quantity
-#     order.subtotal = subtotal
-#     order.total = subtotal # + shipping/discount later
-#     order.save(update_fields=["subtotal","total"])
-#     return order
\ No newline at end of file
+from __future__ import annotations
+
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, Exists, F, OuterRef, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core import outbox
+from .cache import invalidate_cart_pricing
+from .models import Cart, CartItem, Order, OrderItem, StockReservation
+from .reservations import reservation_ttl, reserved_quantities
+
+RESTOCK_BATCH_SIZE = 500
+
+
+def create_order_from_cart(cart: Cart) -> Order:
+    """
+    Checkout engine: turn a cart into a PENDING Order with a fixed number of queries.
+
+    - Locks every affected StoreItem with SELECT ... FOR UPDATE, always in primary-key
+      order, so concurrent checkouts that share items cannot deadlock or oversell.
+    - Checks each line against available-to-sell (stock minus live holds, one grouped
+      query) and reserves it with a StockReservation that expires after
+      STOCK_RESERVATION_TTL; stock itself is only decremented once the order is paid
+      (see sales.reservations).
+    - Creates the Order with its final subtotal/item_count (so the Payment created by
+      payments.signals gets the right amount once) and all OrderItems (with their
+      catalog snapshot) and holds with one bulk_create each.
+    - Hot items (``StoreItem.is_hot``) are neither locked nor checked against the
+      database: all their lines are taken at once from Redis counters
+      (marketplace.hot_stock) and given back if the order cannot be written.
+
+    bulk_create bypasses model signals, so the low-stock alert is evaluated here
+    from available-to-sell instead of by the StoreItem pre_save receiver (for
+    database-backed items only).
+
+    :param cart: The cart to create the order from.
+    :raises ValueError: If an item is no longer available or there is not enough stock.
+    :return: The created order.
+    """
+    from marketplace import hot_stock
+    from marketplace.models import StoreItem
+    from marketplace.signals import enqueue_low_stock_alert
+
+    with transaction.atomic():
+        lines = dict(cart.items.values_list("store_item_id", "quantity"))
+        # Store, variant and product come along for the OrderItem snapshots; only StoreItem rows are locked
+        snapshot_related = ("store", "variant__product")
+        store_items = list(
+            StoreItem.objects.select_for_update(of=("self",))
+            .select_related(*snapshot_related)
+            .filter(pk__in=list(lines), is_hot=False)
+            .order_by("pk")
+        )
+        if len(store_items) < len(lines):
+            # Hot items are not locked; their stock comes from Redis counters
+            store_items += StoreItem.objects.select_related(*snapshot_related).filter(pk__in=list(lines), is_hot=True)
+        if len(store_items) != len(lines):
+            raise ValueError("Some items in your cart are no longer available.")
+        now = timezone.now()
+        cold = [si for si in store_items if not si.is_hot]
+        reserved = reserved_quantities([si.pk for si in cold], now) if cold else {}
+        available = {si.pk: max(si.stock - reserved.get(si.pk, 0), 0) for si in cold}
+        # موجودی را چک کن؛ اگر کافی نبود، خطا بده
+        for si in cold:
+            if lines[si.pk] > available[si.pk]:
+                raise ValueError(f"Not enough stock for SKU {si.sku}")
+        hot_lines = {si.pk: lines[si.pk] for si in store_items if si.is_hot}
+        short = hot_stock.take(hot_lines)
+        if short is not None:
+            sku = next(si.sku for si in store_items if si.pk == short)
+            raise ValueError(f"Not enough stock for SKU {sku}")
+
+        try:
+            order = _place_order(cart, store_items, lines, now)
+            # خالی‌کردن سبد (queryset delete skips CartItem signals, so drop the pricing snapshot here)
+            cart.items.all().delete()
+        except Exception:
+            hot_stock.adjust(hot_lines)  # give the counters back
+            raise
+        invalidate_cart_pricing(cart.pk)
+
+        for si in cold:
+            enqueue_low_stock_alert(si.pk, si.sku, available[si.pk], available[si.pk] - lines[si.pk])
+        return order
+
+
+def _place_order(cart: Cart, store_items, lines: dict, now) -> Order:
+    """Write the Order, its lines and their stock holds (one INSERT each)."""
+    # Totals are known up front, so the Order (and the Payment created by its
+    # post_save receiver) are written with the final amount in one go.
+    order = Order.objects.create(
+        user=cart.user,
+        subtotal=sum((si.price * lines[si.pk] for si in store_items), start=Decimal("0")),
+        item_count=sum(lines.values()),
+    )
+    if not store_items:
+        return order
+
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(
+                order=order,
+                store_item=si,
+                unit_price=si.price,  # snapshot قیمت
+                quantity=lines[si.pk],
+            ).take_snapshot(si)
+            for si in store_items
+        ]
+    )
+    # رزرو موجودی تا پایان مهلت پرداخت
+    expires_at = now + reservation_ttl()
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(order=order, store_item=si, quantity=lines[si.pk], expires_at=expires_at)
+            for si in store_items
+        ]
+    )
+    return order
+
+
+def restock_orders(order_ids) -> int:
+    """
+    Give back the stock of the given orders and release their reservations.
+
+    Lines whose stock was actually taken (converted holds, or orders placed before
+    reservations existed) are put back with one grouped
+    ``UPDATE ... SET stock = stock + delta`` per batch of StoreItems; lines still
+    only held need nothing but the release. Callers own the transaction and the
+    status change. Returns StoreItems restocked. Hot items get the units back
+    on their Redis counters after commit.
+
+    Restocking only raises stock, so no low-stock alert can fire here.
+    """
+    from marketplace import hot_stock
+    from marketplace.models import StoreItem
+
+    only_held = StockReservation.objects.filter(
+        order_id=OuterRef("order_id"), store_item_id=OuterRef("store_item_id")
+    ).exclude(status="CONVERTED")
+    deltas, hot_back = {}, {}
+    for pk, is_hot, quantity in (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .exclude(Exists(only_held))
+        .order_by("store_item_id")
+        .values("store_item_id", "store_item__is_hot")
+        .annotate(quantity=Sum("quantity"))
+        .values_list("store_item_id", "store_item__is_hot", "quantity")
+    ):
+        deltas[pk] = quantity
+        if is_hot:
+            hot_back[pk] = quantity
+    # Live holds on hot items also return to their Redis counters
+    for pk, quantity in (
+        StockReservation.objects.filter(order_id__in=order_ids, status="ACTIVE", store_item__is_hot=True)
+        .order_by()
+        .values("store_item_id")
+        .annotate(quantity=Sum("quantity"))
+        .values_list("store_item_id", "quantity")
+    ):
+        hot_back[pk] = hot_back.get(pk, 0) + quantity
+    store_item_ids = list(deltas)
+    for start in range(0, len(store_item_ids), RESTOCK_BATCH_SIZE):
+        batch = store_item_ids[start:start + RESTOCK_BATCH_SIZE]
+        delta = Case(
+            *[When(pk=pk, then=Value(deltas[pk])) for pk in batch],
+            output_field=models.PositiveIntegerField(),
+        )
+        StoreItem.all_objects.filter(pk__in=batch).update(stock=F("stock") + delta)
+    StockReservation.objects.filter(order_id__in=order_ids).exclude(status="RELEASED").update(
+        status="RELEASED", updated_at=timezone.now()
+    )
+    if hot_back:
+        transaction.on_commit(lambda: hot_stock.adjust(hot_back))
+    return len(store_item_ids)
+
+
+def cancel_orders(orders, statuses=None) -> list:
+    """
+    Cancel every order in ``orders`` (a queryset or iterable of pks) that is not
+    cancelled yet, restock its lines and fail its unverified Payment, in one transaction.
+    ``statuses`` optionally limits which current statuses may be cancelled; it is
+    checked under the row lock, so e.g. a concurrently paid order is left alone.
+
+    The query count does not depend on how many orders are cancelled: the orders
+    are locked (in pk order, so concurrent cancellations cannot deadlock or restock
+    twice), restocked and released by restock_orders, and flipped with single UPDATEs. Those
+    UPDATEs skip the Order pre_save receiver, so cancellation emails are queued here
+    (in the outbox, with the same dedup keys the receiver uses).
+    Returns the pks of the orders that were cancelled.
+    """
+    from payments.models import Payment
+    from .tasks import send_order_cancelled_email_task
+
+    if isinstance(orders, models.QuerySet):
+        orders = orders.order_by().values("pk")
+    with transaction.atomic():
+        locked = Order.objects.select_for_update().filter(pk__in=orders).exclude(status="CANCELLED")
+        if statuses is not None:
+            locked = locked.filter(status__in=statuses)
+        order_ids = list(locked.order_by("pk").values_list("pk", flat=True))
+        if not order_ids:
+            return []
+        restock_orders(order_ids)
+        Order.all_objects.filter(pk__in=order_ids).update(status="CANCELLED", updated_at=timezone.now())
+        Payment.objects.filter(order_id__in=order_ids).exclude(status="VERIFIED").update(status="FAILED")
+        outbox.enqueue_all(
+            outbox.message(send_order_cancelled_email_task, str(pk), dedup_key=f"order-cancelled:{pk}")
+            for pk in order_ids
+        )
+    return order_ids
+
+
+def pay_orders(refs: dict) -> list:
+    """
+    Mark many PENDING orders PAID at once; ``refs`` maps order pk to the gateway ref id.
+
+    The bulk counterpart of saving an order as PAID (see the Order pre_save
+    receiver): under the row locks (pk order, as in cancel_orders) the holds are
+    converted into a stock decrement, the orders get their ref id and ``paid_at``
+    and their Payments are VERIFIED, with one UPDATE each. Orders that are no
+    longer PENDING are left alone. Paid emails are queued here since the UPDATEs
+    skip the receivers. Returns the pks of the orders that were paid.
+    """
+    from payments.models import Payment
+    from .reservations import commit_reservations
+
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.select_for_update().filter(pk__in=list(refs), status="PENDING")
+            .order_by("pk").values_list("pk", flat=True)
+        )
+        if not order_ids:
+            return []
+        commit_reservations(order_ids)
+        now = timezone.now()
+        Order.all_objects.filter(pk__in=order_ids).update(
+            status="PAID",
+            payment_ref_id=Case(*[When(pk=pk, then=Value(str(refs[pk]))) for pk in order_ids]),
+            paid_at=now,
+            updated_at=now,
+        )
+        Payment.objects.filter(order_id__in=order_ids).update(status="VERIFIED", paid_at=now, updated_at=now)
+        outbox.enqueue_all(paid_notifications(order_ids))
+    return order_ids
+
+
+def paid_notifications(order_ids) -> list:
+    """Outbox messages for paid orders: the buyer's email and the sellers' notice, one each per order."""
+    from .tasks import notify_sellers_order_paid_task, send_order_paid_email_task
+
+    return [
+        message
+        for pk in order_ids
+        for message in (
+            outbox.message(send_order_paid_email_task, str(pk), dedup_key=f"order-paid:{pk}"),
+            outbox.message(notify_sellers_order_paid_task, str(pk), dedup_key=f"order-paid-sellers:{pk}"),
+        )
+    ]
+
+
+def apply_cart_changes(cart: Cart, changes) -> None:
+    """
+    Apply many cart line changes at once, with a fixed number of queries.
+
+    ``changes`` is an iterable of ``{"store_item": pk, "quantity": n}`` (set the line
+    to ``n``; 0 removes it) or ``{"store_item": pk, "delta": d}`` (add ``d``, which
+    may be negative; lines that drop to 0 are removed). Store items are expected
+    to be validated by the caller.
+
+    - Set lines are written with one ``INSERT ... ON CONFLICT DO UPDATE``.
+    - Delta lines are inserted empty if missing (``ON CONFLICT DO NOTHING``) and then
+      moved with one ``UPDATE ... SET quantity = quantity + delta``, so concurrent
+      adds to the same line are not lost.
+    - Removed lines are soft-deleted with one UPDATE. Soft-deleted lines are revived
+      by a later change and start again from zero.
+
+    Bulk writes skip the CartItem receivers, so the pricing snapshot is dropped here.
+    """
+    set_lines, delta_lines = {}, {}
+    for change in changes:
+        if change.get("delta") is not None:
+            delta_lines[change["store_item"]] = change["delta"]
+        else:
+            set_lines[change["store_item"]] = change["quantity"]
+
+    with transaction.atomic():
+        upserts = [
+            CartItem(cart=cart, store_item_id=pk, quantity=quantity)
+            for pk, quantity in set_lines.items()
+            if quantity
+        ]
+        if upserts:
+            CartItem.all_objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=["cart", "store_item"],
+                update_fields=["quantity", "deleted_at", "updated_at"],
+            )
+        if delta_lines:
+            CartItem.all_objects.bulk_create(
+                [CartItem(cart=cart, store_item_id=pk, quantity=0) for pk in delta_lines],
+                ignore_conflicts=True,
+            )
+            # A soft-deleted line counts from zero again
+            current = Case(
+                When(deleted_at__isnull=True, then=F("quantity")), default=Value(0), output_field=models.IntegerField()
+            )
+            delta = Case(
+                *[When(store_item_id=pk, then=Value(d)) for pk, d in delta_lines.items()],
+                output_field=models.IntegerField(),
+            )
+            CartItem.all_objects.filter(cart=cart, store_item_id__in=list(delta_lines)).update(
+                quantity=Greatest(current + delta, 0, output_field=models.IntegerField()),
+                deleted_at=None,
+                updated_at=timezone.now(),
+            )
+        removed = [pk for pk, quantity in set_lines.items() if not quantity]
+        CartItem.objects.filter(cart=cart).filter(
+            models.Q(store_item_id__in=removed) | models.Q(quantity=0)
+        ).delete()
+    invalidate_cart_pricing(cart.pk)
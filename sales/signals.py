@@ -1,59 +1,82 @@
 from __future__ import annotations
 
-from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from django.db import transaction
 
-from .tasks import (
-    send_order_paid_email_task,
-    send_order_cancelled_email_task,
-    notify_sellers_order_paid_task,
-)
+from core import outbox
+from marketplace.models import StoreItem
 
-from .models import Cart, Order
+from .tasks import send_order_cancelled_email_task
 
-
-@receiver(post_save, sender=get_user_model(), dispatch_uid="sales.ensure_cart_for_new_user")
-def ensure_cart_for_new_user(sender, instance, created, **kwargs):
-    """
-    Create a Cart for each newly-created user (idempotent).
-    """
-    if created:
-        Cart.objects.get_or_create(user=instance)
+from .cache import invalidate_cart_pricing
+from .models import CartItem, Order, OrderItem
+from .reservations import commit_reservations
+from .services import paid_notifications, restock_orders
 
 
 @receiver(pre_save, sender=Order, dispatch_uid="sales.order_status_side_effects")
 def restock_on_order_cancel(sender, instance: Order, **kwargs):
     """
-    When an Order transitions to CANCELLED, restock its StoreItems.
+    When an Order transitions to CANCELLED, restock its StoreItems; when it
+    transitions to PAID, convert its stock reservations into a real decrement.
+    The emails are written to the outbox (core.outbox) in the same transaction.
+    Bulk cancellations go through sales.services.cancel_orders instead.
 
-    Runs before saving the Order so it only applies on real status transitions.
+    Runs before saving the Order so it only applies on real status transitions,
+    read from the instance's loaded snapshot (BaseModel.previous) without a query.
     """
-    if not instance.pk:
-        return
-    try:
-        old = Order.all_objects.select_related(None).get(pk=instance.pk)
-    except Order.DoesNotExist:  # pragma: no cover - defensive; shouldn't happen
+    if instance._state.adding:
         return
+    old_status = instance.previous("status")
 
-    if old.status != "CANCELLED" and instance.status == "CANCELLED":
-        for oi in instance.items.select_related("store_item"):
-            si = oi.store_item
-            si.stock = (si.stock or 0) + oi.quantity
-            si.save(update_fields=["stock"])
-        # Notify user about cancellation after commit
-        transaction.on_commit(lambda: send_order_cancelled_email_task.delay(str(instance.pk)))
+    if old_status != "CANCELLED" and instance.status == "CANCELLED":
+        restock_orders([instance.pk])
+        # Notify user about cancellation once the order commits
+        outbox.enqueue(send_order_cancelled_email_task, str(instance.pk), dedup_key=f"order-cancelled:{instance.pk}")
 
     # If transitioning to PAID and paid_at isn't set (e.g., admin toggled it), set paid_at
-    if old.status != "PAID" and instance.status == "PAID":
+    if old_status != "PAID" and instance.status == "PAID":
+        # The stock held at checkout is now sold for good
+        if commit_reservations([instance.pk]):
+            instance.stock_shortfall = True
         if not instance.paid_at:
             instance.paid_at = timezone.now()
-        # Enqueue notifications after commit
-        transaction.on_commit(
-            lambda: (
-                send_order_paid_email_task.delay(str(instance.pk)),
-                notify_sellers_order_paid_task.delay(str(instance.pk)),
-            )
-        )
+        # Notifications go out once the order commits
+        outbox.enqueue_all(paid_notifications([instance.pk]))
+
+
+@receiver(post_save, sender=OrderItem, dispatch_uid="sales.sync_order_totals_on_item_save")
+@receiver(post_delete, sender=OrderItem, dispatch_uid="sales.sync_order_totals_on_item_delete")
+def sync_order_totals(sender, instance: OrderItem, **kwargs):
+    """
+    Keep Order.subtotal/item_count in sync when a line is added, edited,
+    soft-deleted/restored or hard-deleted.
+
+    Updates the cached ``instance.order`` too, so receivers that run after this
+    one (payments.signals) read the fresh totals without another query.
+    Bulk paths (bulk_create/update) bypass signals and set totals themselves.
+    """
+    try:
+        order = instance.order
+    except Order.DoesNotExist:  # pragma: no cover - order hard-deleted in cascade
+        return
+    order.refresh_totals()
+
+
+@receiver(post_save, sender=CartItem, dispatch_uid="sales.invalidate_cart_pricing_on_item_save")
+@receiver(post_delete, sender=CartItem, dispatch_uid="sales.invalidate_cart_pricing_on_item_delete")
+def invalidate_cart_pricing_on_item_change(sender, instance: CartItem, **kwargs):
+    invalidate_cart_pricing(instance.cart_id)
+
+
+@receiver(post_save, sender=StoreItem, dispatch_uid="sales.invalidate_cart_pricing_on_price_change")
+def invalidate_cart_pricing_on_price_change(sender, instance: StoreItem, created, update_fields=None, **kwargs):
+    """
+    A StoreItem price change re-prices every cart holding it.
+    Saves that explicitly skip ``price`` (e.g. stock updates) are ignored.
+    """
+    if created or (update_fields is not None and "price" not in update_fields):
+        return
+    cart_ids = set(CartItem.objects.filter(store_item=instance).values_list("cart_id", flat=True))
+    invalidate_cart_pricing(*cart_ids)
@@ -1,8 +1,8 @@
 from __future__ import annotations
 
 from celery import shared_task
-from django.conf import settings
-from django.core.mail import EmailMessage
+
+from core.notifications import Notification, dispatch
 
 
 @shared_task
@@ -23,11 +23,7 @@ def send_order_paid_email_task(order_id: str):
         f"Items: {order.total_items}\nTotal: {order.total_price}\n\n"
         f"Thanks for shopping with us!"
     )
-    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", None)
-    try:
-        EmailMessage(subject, body, from_email, [to_email]).send()
-    except Exception:
-        pass
+    dispatch(Notification("order_paid", to_email, body, subject=subject, key=f"order-paid:{order.id}"))
 
 
 @shared_task
@@ -46,17 +42,14 @@ def send_order_cancelled_email_task(order_id: str):
         f"Hi {order.user.username},\n\n"
         f"Your order has been cancelled. If this was a mistake, please contact support.\n"
     )
-    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", None)
-    try:
-        EmailMessage(subject, body, from_email, [to_email]).send()
-    except Exception:
-        pass
+    dispatch(Notification("order_cancelled", to_email, body, subject=subject, key=f"order-cancelled:{order.id}"))
 
 
 @shared_task
 def notify_sellers_order_paid_task(order_id: str):
     """
-    Notify each seller whose items were included in the paid order.
+    Notify each seller whose items were included in the paid order, one message
+    per seller (sellers do not see each other's addresses).
     """
     from .models import Order
     try:
@@ -81,9 +74,35 @@ def notify_sellers_order_paid_task(order_id: str):
         f"An order containing your items has been paid.\n"
         f"Items count: {order.total_items}\nTotal: {order.total_price}\n"
     )
-    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", None)
-    try:
-        EmailMessage(subject, body, from_email, list(seller_emails)).send()
-    except Exception:
-        pass
+    for email in sorted(seller_emails):
+        dispatch(Notification("order_paid_seller", email, body, subject=subject, key=f"order-paid-sellers:{order.id}:{email}"))
+
+
+
+@shared_task
+def expire_stale_reservations_task(batch_size: int = 500, max_batches: int = 20) -> int:
+    """
+    Cancel PENDING orders whose stock reservations have expired, ``batch_size``
+    orders at a time, releasing their holds (see sales.services.cancel_orders).
+    Orders that reached the gateway (they have a payment authority) are left to
+    payments.reconcile: the buyer may have paid, so only the gateway's answer
+    cancels them. Returns the number of orders cancelled.
+    """
+    from django.db.models import Q
+    from django.utils import timezone
+    from .models import StockReservation
+    from .services import cancel_orders
 
+    cancelled = 0
+    for _ in range(max_batches):
+        stale = list(
+            StockReservation.objects.filter(status="ACTIVE", expires_at__lte=timezone.now(), order__status="PENDING")
+            .filter(Q(order__payment_authority__isnull=True) | Q(order__payment_authority=""))
+            .order_by()
+            .values_list("order_id", flat=True)
+            .distinct()[:batch_size]
+        )
+        if not stale:
+            break
+        cancelled += len(cancel_orders(stale, statuses=["PENDING"]))
+    return cancelled
@@ -12,7 +12,7 @@ def test_create_order_from_cart_success():
     """
     Creating an order from a cart should:
     - Validate stock, create an Order and OrderItems
-    - Decrease StoreItem stock
+    - Hold the stock (available-to-sell drops; stock itself only on payment)
     - Empty the cart
     """
     User = get_user_model()
@@ -44,7 +44,9 @@ def test_create_order_from_cart_success():
     oi: OrderItem = order.items.first()
     assert oi.unit_price == Decimal("25.00")
     assert oi.quantity == 2
-    assert item.stock == 3  # 5 - 2
+    from sales.reservations import with_available
+    assert item.stock == 5
+    assert with_available(StoreItem.objects.filter(pk=item.pk)).get().available == 3  # 5 - 2
     assert cart.items.count() == 0
 
 
@@ -77,3 +79,565 @@ def test_create_order_from_cart_insufficient_stock_raises():
     item.refresh_from_db()
     assert item.stock == 1
     assert Order.objects.filter(user=user).count() == 0
+
+
+def _make_cart_with_lines(username: str, lines: int, stock: int = 10):
+    User = get_user_model()
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="p")
+    seller_user = User.objects.create_user(username=f"{username}-s", email=f"{username}-s@example.com", password="p")
+    seller = Seller.objects.create(user=seller_user, display_name=f"Seller {username}")
+    store = Store.objects.create(owner=seller, name=f"Store {username}")
+    cat = Category.objects.create(name=f"Cat {username}")
+    prod = Product.objects.create(category=cat, title=f"P {username}", slug=f"p-{username}", price=Decimal("1.00"))
+
+    cart, _ = Cart.objects.get_or_create(user=user)
+    items = []
+    for i in range(lines):
+        var = ProductVariant.objects.create(product=prod, name=f"V{i}")
+        si = StoreItem.objects.create(store=store, variant=var, sku=f"{username}-{i}", price=Decimal("10.00"), stock=stock)
+        CartItem.objects.create(cart=cart, store_item=si, quantity=2)
+        items.append(si)
+    return cart, items
+
+
+@pytest.mark.django_db
+def test_checkout_query_count_is_flat_in_cart_size():
+    """
+    Benchmark: the checkout engine issues the same number of queries for a
+    1-line cart as for a 20-line cart, and still decrements stock and syncs
+    the Payment amount.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from payments.models import Payment
+
+    small_cart, _ = _make_cart_with_lines("small", 1)
+    big_cart, big_items = _make_cart_with_lines("big", 20)
+
+    with CaptureQueriesContext(connection) as small:
+        create_order_from_cart(small_cart)
+    with CaptureQueriesContext(connection) as big:
+        order = create_order_from_cart(big_cart)
+
+    assert len(big) == len(small)
+    assert order.items.count() == 20
+    # stock is held by reservations until payment, not decremented
+    from sales.reservations import with_available
+    rows = with_available(StoreItem.objects.filter(pk__in=[i.pk for i in big_items]))
+    assert all((si.stock, si.available) == (10, 8) for si in rows)
+    assert Payment.objects.get(order=order).amount == Decimal("400.00")
+    assert big_cart.items.count() == 0
+
+
+@pytest.mark.django_db
+def test_checkout_rolls_back_when_any_line_is_short():
+    """
+    A single short line aborts the whole checkout: no order, no stock change.
+    """
+    cart, items = _make_cart_with_lines("short", 3, stock=5)
+    CartItem.objects.filter(cart=cart, store_item=items[-1]).update(quantity=6)
+
+    with pytest.raises(ValueError):
+        create_order_from_cart(cart)
+
+    assert Order.objects.filter(user=cart.user).count() == 0
+    assert list(StoreItem.objects.filter(pk__in=[i.pk for i in items]).values_list("stock", flat=True)) == [5, 5, 5]
+
+
+@pytest.mark.django_db
+def test_order_totals_are_maintained_on_item_changes():
+    """
+    Order.subtotal/item_count follow OrderItem create, edit and soft delete,
+    and total_price/total_items read them without querying.
+    """
+    cart, items = _make_cart_with_lines("totals", 2)
+    order = create_order_from_cart(cart)
+    assert (order.item_count, order.subtotal) == (4, Decimal("40.00"))
+
+    oi = order.items.first()
+    oi.quantity = 5
+    oi.save()
+    order.refresh_from_db()
+    assert (order.item_count, order.subtotal) == (7, Decimal("70.00"))
+
+    oi.delete()  # soft delete
+    order.refresh_from_db()
+    assert (order.item_count, order.subtotal) == (2, Decimal("20.00"))
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    with CaptureQueriesContext(connection) as ctx:
+        assert order.total_price == Decimal("20.00")
+        assert order.total_items == 2
+    assert len(ctx) == 0
+
+
+@pytest.mark.django_db
+def test_recompute_order_totals_command_detects_and_fixes_drift():
+    from django.core.management import call_command
+    from django.core.management.base import CommandError
+
+    cart, _ = _make_cart_with_lines("drift", 2)
+    order = create_order_from_cart(cart)
+    call_command("recompute_order_totals", "--check")
+
+    Order.objects.filter(pk=order.pk).update(subtotal=Decimal("1.00"), item_count=99)
+    with pytest.raises(CommandError):
+        call_command("recompute_order_totals", "--check")
+
+    call_command("recompute_order_totals")
+    order.refresh_from_db()
+    assert (order.item_count, order.subtotal) == (4, Decimal("40.00"))
+
+
+@pytest.mark.django_db
+def test_order_list_query_count_does_not_grow_with_orders():
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    cart, items = _make_cart_with_lines("lister", 2, stock=100)
+    client = APIClient(); client.force_authenticate(cart.user)
+
+    create_order_from_cart(cart)
+    with CaptureQueriesContext(connection) as one:
+        assert client.get("/api/sales/orders/").status_code == 200
+
+    for _ in range(4):
+        # checkout soft-deletes cart lines; bring them back for the next order
+        CartItem.all_objects.filter(cart=cart).restore()
+        create_order_from_cart(cart)
+    with CaptureQueriesContext(connection) as five:
+        res = client.get("/api/sales/orders/")
+    assert res.status_code == 200
+    assert len(res.json()["results"]) == 5
+    assert len(five) == len(one)
+
+
+@pytest.mark.django_db
+def test_cart_read_path_is_constant_and_pricing_is_invalidated():
+    """
+    GET /api/sales/cart/ costs the same number of queries for 5 or 100 lines;
+    the cached totals follow CartItem and StoreItem price changes.
+    """
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    cache.clear()
+    small_cart, _ = _make_cart_with_lines("cart-small", 5)
+    big_cart, big_items = _make_cart_with_lines("cart-big", 100)
+
+    def read(cart):
+        client = APIClient(); client.force_authenticate(cart.user)
+        with CaptureQueriesContext(connection) as ctx:
+            res = client.get("/api/sales/cart/")
+        assert res.status_code == 200
+        return res.json(), len(ctx)
+
+    _, small_queries = read(small_cart)
+    data, big_queries = read(big_cart)
+    assert big_queries == small_queries
+    assert data["total_items"] == 200
+    assert Decimal(data["total_price"]) == Decimal("2000.00")
+
+    item = big_items[0]
+    item.price = Decimal("20.00")
+    item.save()
+    assert big_cart.total_price == Decimal("2020.00")
+
+    CartItem.objects.filter(cart=big_cart, store_item=item).first().delete()
+    assert big_cart.total_items == 198
+
+
+@pytest.mark.django_db
+def test_cancel_orders_restocks_in_bulk_with_flat_query_count():
+    """
+    Benchmark: cancelling 1 or 10 orders costs the same number of queries;
+    stock comes back once per order, payments fail and repeats are no-ops.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+    from core.models import OutboxMessage
+    from payments.models import Payment
+    from sales import tasks
+    from sales.services import cancel_orders
+
+    emails = OutboxMessage.objects.filter(task=tasks.send_order_cancelled_email_task.name)
+    cart, items = _make_cart_with_lines("canceller", 3, stock=100)
+    orders = []
+    for _ in range(11):
+        CartItem.all_objects.filter(cart=cart).restore()
+        orders.append(create_order_from_cart(cart))
+    from sales.reservations import with_available
+    assert with_available(StoreItem.objects.filter(pk=items[0].pk)).get().available == 100 - 11 * 2
+
+    with CaptureQueriesContext(connection) as one:
+        cancel_orders([orders[0].pk])
+    with CaptureQueriesContext(connection) as ten:
+        cancelled = cancel_orders(Order.objects.filter(pk__in=[o.pk for o in orders[1:]]))
+    assert len(cancelled) == 10
+    assert len(ten) == len(one)
+    assert emails.count() == 11
+    assert all(si.available == 100 for si in with_available(StoreItem.objects.filter(pk__in=[i.pk for i in items])))
+    assert set(Payment.objects.filter(order__in=orders).values_list("status", flat=True)) == {"FAILED"}
+
+    assert cancel_orders([o.pk for o in orders]) == []
+    assert StoreItem.objects.get(pk=items[0].pk).stock == 100
+
+    # API: owners can cancel their own pending orders only
+    CartItem.all_objects.filter(cart=cart).restore()
+    order = create_order_from_cart(cart)
+    client = APIClient(); client.force_authenticate(cart.user)
+    res = client.post(f"/api/sales/orders/{order.pk}/cancel/")
+    assert res.status_code == 200 and res.json()["status"] == "CANCELLED"
+    assert client.post(f"/api/sales/orders/{order.pk}/cancel/").status_code == 400
+    assert StoreItem.objects.get(pk=items[0].pk).stock == 100
+
+
+@pytest.mark.django_db
+def test_reservations_hold_expire_and_convert_on_payment(django_capture_on_commit_callbacks, monkeypatch):
+    """
+    Checkout holds stock for STOCK_RESERVATION_TTL; expired holds stop counting
+    at once and the sweeper cancels their orders; payment turns holds into a decrement.
+    """
+    from datetime import timedelta
+    from django.utils import timezone
+    from sales import tasks
+    from sales.models import StockReservation
+    from sales.reservations import with_available
+
+    monkeypatch.setattr(tasks.send_order_cancelled_email_task, "delay", lambda *a: None)
+    monkeypatch.setattr(tasks.send_order_paid_email_task, "delay", lambda *a: None)
+    monkeypatch.setattr(tasks.notify_sellers_order_paid_task, "delay", lambda *a: None)
+
+    def available(si):
+        return with_available(StoreItem.objects.filter(pk=si.pk)).get().available
+
+    cart, (item,) = _make_cart_with_lines("holder", 1, stock=3)
+    abandoned = create_order_from_cart(cart)
+    assert (StoreItem.objects.get(pk=item.pk).stock, available(item)) == (3, 1)
+    CartItem.all_objects.filter(cart=cart).restore()
+    with pytest.raises(ValueError):
+        create_order_from_cart(cart)  # 2 more than the 1 left
+
+    # the abandoned hold lapses: stock is sellable again before any sweep
+    StockReservation.objects.filter(order=abandoned).update(expires_at=timezone.now() - timedelta(seconds=1))
+    assert available(item) == 3
+    paid = create_order_from_cart(cart)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert tasks.expire_stale_reservations_task() == 1
+    assert Order.objects.get(pk=abandoned.pk).status == "CANCELLED"
+    assert Order.objects.get(pk=paid.pk).status == "PENDING"
+    assert StockReservation.objects.get(order=abandoned).status == "RELEASED"
+
+    paid = Order.objects.get(pk=paid.pk)
+    paid.status = "PAID"
+    paid.save(update_fields=["status", "paid_at", "updated_at"])
+    assert StockReservation.objects.get(order=paid).status == "CONVERTED"
+    assert (StoreItem.objects.get(pk=item.pk).stock, available(item)) == (1, 1)
+
+
+@pytest.mark.django_db
+def test_late_payment_of_an_expired_hold_is_flagged_when_its_stock_was_sold_on():
+    from datetime import timedelta
+    from django.utils import timezone
+    from sales.models import StockReservation
+    from sales.services import pay_orders
+
+    cart, (item,) = _make_cart_with_lines("late", 1, stock=3)
+    late = create_order_from_cart(cart)
+    StockReservation.objects.filter(order=late).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    # while the lapsed order still fits it converts quietly
+    CartItem.all_objects.filter(cart=cart).restore()
+    fits = create_order_from_cart(cart)
+    StockReservation.objects.filter(order=fits).update(expires_at=timezone.now() - timedelta(seconds=1))
+    assert pay_orders({fits.pk: "R-0"}) == [fits.pk]
+    assert not Order.objects.get(pk=fits.pk).stock_shortfall
+    assert StoreItem.objects.get(pk=item.pk).stock == 1
+
+    # another buyer takes the last unit the lapsed hold used to cover
+    other, _ = Cart.objects.get_or_create(user=get_user_model().objects.create_user(username="late-2", email="late-2@example.com", password="p"))
+    CartItem.objects.create(cart=other, store_item=item, quantity=1)
+    on_time = create_order_from_cart(other)
+
+    assert pay_orders({late.pk: "R-1"}) == [late.pk]
+    late.refresh_from_db()
+    assert (late.status, late.stock_shortfall) == ("PAID", True)
+    assert StoreItem.objects.get(pk=item.pk).stock == 0
+    assert StockReservation.objects.get(order=on_time).status == "ACTIVE"
+    assert not Order.objects.get(pk=on_time.pk).stock_shortfall
+
+
+@pytest.fixture
+def fake_waiting_room():
+    import fakeredis
+    from sales import waiting_room
+
+    waiting_room.set_client(fakeredis.FakeRedis())
+    yield waiting_room
+    waiting_room.set_client(None)
+
+
+def test_waiting_room_admits_fifo_at_the_configured_rate(fake_waiting_room, settings):
+    settings.WAITING_ROOM = {"RATE": 1, "BURST": 2}
+    room = fake_waiting_room
+
+    first, second, third, fourth = (room.status(user, join=True, now=100.0) for user in (1, 2, 3, 4))
+    assert first["token"] and second["token"]
+    assert (third["position"], third["eta_seconds"]) == (1, 1)
+    assert fourth["position"] == 2
+
+    # user 3 walks away; one second later the freed slot goes to user 4
+    room.get_client().delete(room.SEEN_PREFIX + "3")
+    assert room.status(4, now=101.0)["token"]
+    assert room.status(3, now=101.0) is None
+
+    assert room.consume(1, first["token"]) and not room.consume(1, first["token"])
+    assert not room.consume(2, "forged")
+
+
+@pytest.mark.django_db
+def test_checkout_of_hot_items_goes_through_the_waiting_room(fake_waiting_room, settings, monkeypatch):
+    import fakeredis
+    from rest_framework.test import APIClient
+    from marketplace import hot_stock
+
+    hot_stock.set_client(fakeredis.FakeRedis())
+    settings.WAITING_ROOM = {"RATE": 1, "BURST": 1}
+    try:
+        carts = [_make_cart_with_lines(f"wr{i}", 1) for i in range(2)]
+        StoreItem.objects.filter(cart_items__cart__in=[c for c, _ in carts]).update(is_hot=True)
+        clients = []
+        for cart, _ in carts:
+            client = APIClient(); client.force_authenticate(cart.user)
+            clients.append(client)
+
+        assert clients[0].post("/api/sales/cart/checkout/").status_code == 201  # pass free: straight through
+        queued = clients[1].post("/api/sales/cart/checkout/")
+        assert queued.status_code == 202 and queued.json()["position"] == 1
+
+        monkeypatch.setattr(fake_waiting_room.time, "time", lambda: 10**10)  # let the bucket refill
+        token = clients[1].get("/api/sales/cart/waiting-room/").json()["token"]
+        res = clients[1].post("/api/sales/cart/checkout/", HTTP_X_CHECKOUT_TOKEN=token)
+        assert res.status_code == 201
+    finally:
+        hot_stock.set_client(None)
+
+
+@pytest.mark.django_db
+def test_bulk_cart_update_applies_many_lines_in_a_few_queries():
+    """
+    PATCH /api/sales/cart/items/ sets, adds to and removes lines in one request;
+    the query count does not grow with the number of lines.
+    """
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    cache.clear()
+    cart, items = _make_cart_with_lines("bulk", 30)  # every line starts at 2
+    client = APIClient(); client.force_authenticate(cart.user)
+
+    def patch(changes):
+        with CaptureQueriesContext(connection) as ctx:
+            res = client.patch("/api/sales/cart/items/", {"items": changes}, format="json")
+        return res, len(ctx)
+
+    _, few = patch([{"store_item": str(items[0].pk), "quantity": 2}, {"store_item": str(items[10].pk), "delta": 0}])
+    res, many = patch(
+        [{"store_item": str(si.pk), "quantity": 5} for si in items[:10]]
+        + [{"store_item": str(si.pk), "delta": 3} for si in items[10:20]]
+        + [{"store_item": str(si.pk), "delta": -2} for si in items[20:25]]
+        + [{"store_item": str(si.pk), "quantity": 0} for si in items[25:]]
+    )
+    assert res.status_code == 200
+    assert many == few
+    data = res.json()
+    assert set(data) == {"id", "lines", "total_items", "total_price"}
+    assert len(data["lines"]) == 20
+    assert data["total_items"] == 10 * 5 + 10 * 5
+    assert Decimal(data["total_price"]) == Decimal("1000.00")
+    assert cart.items.count() == 20
+
+    # removed lines come back from zero; add-item adds atomically to the same row
+    res, _ = patch([{"store_item": str(items[29].pk), "delta": 4}])
+    assert {"store_item": str(items[29].pk), "quantity": 4} in res.json()["lines"]
+    added = client.post("/api/sales/cart/add-item/", {"store_item": str(items[25].pk), "quantity": 2}, format="json")
+    assert added.status_code == 200
+    assert CartItem.all_objects.filter(cart=cart, store_item=items[25]).get().quantity == 2
+
+    bad, _ = patch([{"store_item": str(items[0].pk), "quantity": 1, "delta": 1}])
+    assert bad.status_code == 400
+    StoreItem.objects.filter(pk=items[1].pk).update(is_active=False)
+    bad, _ = patch([{"store_item": str(items[0].pk), "delta": 1}, {"store_item": str(items[1].pk), "delta": 1}])
+    assert bad.status_code == 400
+    assert CartItem.objects.get(cart=cart, store_item=items[0]).quantity == 5
+
+
+@pytest.fixture
+def fake_guest_carts():
+    import fakeredis
+    from sales import guest_cart
+
+    guest_cart.set_client(fakeredis.FakeRedis())
+    yield guest_cart
+    guest_cart.set_client(None)
+
+
+@pytest.mark.django_db
+def test_guest_cart_lives_in_redis_and_merges_on_login(fake_guest_carts):
+    """
+    Anonymous carts never touch the cart tables; logging in adds them to the
+    user's cart (created then, not at registration).
+    """
+    from rest_framework.test import APIClient
+
+    cart, items = _make_cart_with_lines("guest", 3)  # the signed-in user already holds 2 of each
+    user = cart.user
+    loner = get_user_model().objects.create_user(username="loner", email="loner@example.com", password="p")
+    assert not Cart.objects.filter(user=loner).exists()
+
+    guest = APIClient()
+    assert guest.get("/api/sales/cart/").json()["lines"] == []
+    res = guest.post("/api/sales/cart/add-item/", {"store_item": str(items[0].pk), "quantity": 3}, format="json")
+    assert res.status_code == 200 and res.json()["total_items"] == 3
+    res = guest.patch(
+        "/api/sales/cart/items/",
+        {"items": [{"store_item": str(items[1].pk), "quantity": 1}, {"store_item": str(items[0].pk), "delta": -1}]},
+        format="json",
+    )
+    data = res.json()
+    assert data["total_items"] == 3 and Decimal(data["total_price"]) == Decimal("30.00")
+    assert guest.get("/api/sales/cart/").json()["id"] == data["id"]
+    assert CartItem.objects.filter(cart=cart).count() == 3 and Cart.objects.count() == 1
+    assert guest.post("/api/sales/cart/checkout/").status_code == 401
+
+    res = guest.post("/api/accounts/login/", {"identifier": "guest", "password": "p"}, format="json")
+    assert res.status_code == 200 and res.cookies["guest_cart"].value == ""
+    assert dict(cart.items.values_list("store_item", "quantity")) == {items[0].pk: 4, items[1].pk: 3, items[2].pk: 2}
+    assert fake_guest_carts.lines(data["id"]) == {}
+
+    # a forged cookie is ignored
+    guest.cookies["guest_cart"] = data["id"]
+    assert guest.get("/api/sales/cart/").json()["id"] is None
+    client = APIClient(); client.force_authenticate(loner)
+    assert client.get("/api/sales/cart/").json()["items"] == []
+    assert not Cart.objects.filter(user=loner).exists()
+
+
+@pytest.mark.django_db
+def test_order_history_renders_from_line_snapshots():
+    """
+    Order lines keep what was bought even after the listing changes or goes away,
+    and a full page of orders is read with two queries (orders, lines).
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    cart, items = _make_cart_with_lines("history", 1, stock=500)
+    item = items[0]
+    item.variant.attributes = {"color": "red"}
+    item.variant.save()
+    order = create_order_from_cart(cart)
+
+    item.sku = "RENAMED"
+    item.save()
+    item.variant.product.title = "Renamed product"
+    item.variant.product.save()
+    item.delete()
+
+    client = APIClient(); client.force_authenticate(cart.user)
+    line = client.get(f"/api/sales/orders/{order.pk}/").json()["items"][0]
+    assert {k: line[k] for k in ("sku", "product_title", "variant_name", "variant_attributes", "store_name")} == {
+        "sku": "history-0", "product_title": "P history", "variant_name": "V0",
+        "variant_attributes": {"color": "red"}, "store_name": "Store history",
+    }
+
+    orders = Order.objects.bulk_create([Order(user=cart.user) for _ in range(99)])
+    OrderItem.objects.bulk_create(
+        [OrderItem(order=o, store_item=item, unit_price=Decimal("10.00"), quantity=1).take_snapshot(item) for o in orders]
+    )
+    with CaptureQueriesContext(connection) as ctx:
+        res = client.get("/api/sales/orders/?page_size=50")
+    assert res.status_code == 200 and len(res.json()["results"]) == 50
+    assert len(ctx) == 2
+
+
+@pytest.mark.django_db
+def test_order_history_filters_and_uses_the_history_index():
+    from datetime import timedelta
+    from django.db import connection
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+
+    cart, items = _make_cart_with_lines("filters", 1)
+    user = cart.user
+    now = timezone.now()
+    orders = Order.objects.bulk_create(
+        [Order(user=user, status=status) for status in ["PENDING", "PAID", "PAID", "CANCELLED"]]
+    )
+    for age, order in enumerate(orders):
+        Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=age))
+    client = APIClient(); client.force_authenticate(user)
+
+    def ids(query):
+        res = client.get(f"/api/sales/orders/{query}")
+        assert res.status_code == 200, res.json()
+        return [o["id"] for o in res.json()["results"]]
+
+    newest_first = [str(o.pk) for o in orders]
+    assert ids("") == newest_first
+    assert ids("?ordering=created_at") == newest_first[::-1]
+    assert ids("?status=PAID") == newest_first[1:3]
+    assert ids("?paid=true") == newest_first[1:3]
+    assert ids("?paid=false") == [newest_first[0], newest_first[3]]
+    after = (now - timedelta(days=2, hours=1)).isoformat().replace("+00:00", "Z")
+    before = (now - timedelta(hours=1)).isoformat().replace("+00:00", "Z")
+    assert ids(f"?created_after={after}&created_before={before}") == newest_first[1:3]
+    assert client.get("/api/sales/orders/?status=LOST").status_code == 400
+
+    if connection.vendor == "sqlite":
+        sql, params = Order.objects.filter(user=user, status="PAID").order_by("-created_at", "-id")[:10].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+        assert "sales_order_user_status" in plan
+
+
+@pytest.mark.django_db
+def test_admin_mark_paid_goes_through_pay_orders_and_skips_settled_orders(monkeypatch):
+    from django.contrib import admin
+    from core.models import OutboxMessage
+    from sales.admin import OrderAdmin
+    from sales.models import StockReservation
+    from sales.services import cancel_orders
+
+    cart, (item,) = _make_cart_with_lines("adm", 1, stock=5)
+    pending = create_order_from_cart(cart)
+    CartItem.all_objects.filter(cart=cart).restore()
+    cancelled = create_order_from_cart(cart)
+    cancel_orders([cancelled.pk])
+
+    messages = []
+    model_admin = OrderAdmin(Order, admin.site)
+    monkeypatch.setattr(model_admin, "message_user", lambda request, message: messages.append(str(message)))
+    model_admin.mark_paid(None, Order.objects.filter(pk__in=[pending.pk, cancelled.pk]))
+
+    assert messages == ["1 orders marked as PAID. 1 skipped (not pending)."]
+    pending.refresh_from_db()
+    assert (pending.status, pending.payment.status) == ("PAID", "VERIFIED")
+    assert StockReservation.objects.get(order=pending).status == "CONVERTED"
+    assert Order.objects.get(pk=cancelled.pk).status == "CANCELLED"
+    assert StoreItem.objects.get(pk=item.pk).stock == 3
+    assert OutboxMessage.objects.filter(task="sales.tasks.send_order_paid_email_task").count() == 1
+
+    paid_at = pending.paid_at
+    model_admin.mark_paid(None, Order.objects.filter(pk=pending.pk))
+    assert Order.objects.get(pk=pending.pk).paid_at == paid_at
@@ -1,20 +1,66 @@
+from django.db.models import Prefetch, prefetch_related_objects
+from drf_spectacular.utils import extend_schema
+from rest_framework.filters import OrderingFilter
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework import status
+from rest_framework import serializers, status
+from core.idempotency import idempotent
+from core.instrumentation import InstrumentedViewMixin
 from .models import Cart, CartItem, Order, OrderItem, create_order_from_cart
-from .serializers import CartSerializer, CartItemSerializer, OrderSerializer, OrderItemSerializer
-
-class CartViewSet(ModelViewSet):
+from .serializers import (
+    CartSerializer, CartItemSerializer, CartItemsUpdateSerializer, CartSummarySerializer,
+    OrderFilterSerializer, OrderSerializer, OrderItemSerializer, WaitingRoomSerializer,
+)
+from .services import apply_cart_changes, cancel_orders
+from . import guest_cart, waiting_room
+
+def cart_items_prefetch():
+    """Everything CartItemSerializer renders, fetched in one query for the whole cart."""
+    return Prefetch(
+        "items",
+        queryset=CartItem.objects.select_related("store_item__store", "store_item__variant__product"),
+    )
+
+
+class CartViewSet(InstrumentedViewMixin, ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
+    # Anonymous shoppers use a Redis guest cart (see sales.guest_cart)
+    guest_actions = {"list", "add_item", "update_items"}
+
+    def get_permissions(self):
+        if self.action in self.guest_actions:
+            return [AllowAny()]
+        return super().get_permissions()
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user).prefetch_related("items__store_item")
+        return Cart.objects.filter(user=self.request.user).prefetch_related(cart_items_prefetch())
+
+    def _update_guest_cart(self, request, changes):
+        serializer = CartItemsUpdateSerializer(data={"items": changes})
+        serializer.is_valid(raise_exception=True)
+        cart_id = guest_cart.cart_id_from(request) or guest_cart.new_cart_id()
+        guest_cart.apply(cart_id, serializer.validated_data["items"])
+        response = Response(CartSummarySerializer(guest_cart.summary(cart_id)).data)
+        guest_cart.remember(response, cart_id)
+        return response
 
     def list(self, request, *args, **kwargs):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
+        """
+        The user's cart. Guests get the compact summary of their guest cart.
+        Users who never added anything have no Cart row yet and get an empty cart.
+        """
+        if not request.user.is_authenticated:
+            return Response(CartSummarySerializer(guest_cart.summary(guest_cart.cart_id_from(request))).data)
+        cart = Cart.objects.filter(user=request.user).first()
+        if cart is None:
+            return Response({
+                "id": None, "user": request.user.pk, "items": [], "total_items": 0, "total_price": "0.00",
+                "created_at": None, "updated_at": None,
+            })
+        prefetch_related_objects([cart], cart_items_prefetch())
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
 
@@ -27,22 +73,47 @@ class CartViewSet(ModelViewSet):
         - store_item: The ID of the store item to add to the cart.
         - quantity: The quantity of the store item to add to the cart.
 
-        Returns a response with the updated cart data.
+        Returns a response with the updated cart data (guests: the guest cart summary).
         """
+        if not request.user.is_authenticated:
+            quantity = serializers.IntegerField(min_value=1).run_validation(request.data.get("quantity", 1))
+            return self._update_guest_cart(request, [{"store_item": request.data.get("store_item"), "delta": quantity}])
         cart, _ = Cart.objects.get_or_create(user=request.user)
         serializer = CartItemSerializer(data={**request.data, "cart": cart.id})
         serializer.is_valid(raise_exception=True)
-        item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            store_item=serializer.validated_data["store_item"],
-            defaults={"quantity": serializer.validated_data["quantity"]},
+        # Atomic ``quantity + n``, and revives a previously removed line
+        apply_cart_changes(
+            cart,
+            [{"store_item": serializer.validated_data["store_item"].pk, "delta": serializer.validated_data["quantity"]}],
         )
-        if not created:
-            item.quantity += serializer.validated_data["quantity"]
-            item.save(update_fields=["quantity"])
+        prefetch_related_objects([cart], cart_items_prefetch())
         return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["patch"], url_path="items")
+    def update_items(self, request):
+        """
+        Change many cart lines in one request.
+
+        Accepts ``{"items": [{"store_item": <id>, "quantity": n} | {"store_item": <id>, "delta": d}, ...]}``:
+        ``quantity`` sets a line (0 removes it), ``delta`` adds to it (lines that reach 0
+        are removed). All lines are validated together and applied atomically with a
+        few bulk queries (see sales.services.apply_cart_changes).
+
+        Returns a compact summary (lines and totals) instead of the full cart.
+        Guests update their guest cart the same way.
+        """
+        if not request.user.is_authenticated:
+            return self._update_guest_cart(request, request.data.get("items"))
+        serializer = CartItemsUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        apply_cart_changes(cart, serializer.validated_data["items"])
+        lines = cart.items.order_by("created_at").values("store_item", "quantity")
+        summary = {"id": cart.pk, "lines": lines, **cart.pricing()}
+        return Response(CartSummarySerializer(summary).data)
+
     @action(detail=False, methods=["post"], url_path="checkout")
+    @idempotent("checkout")
     def checkout(self, request):
         """
         Checkout the user's cart and create an order.
@@ -50,8 +121,24 @@ class CartViewSet(ModelViewSet):
         Returns a response with the created order data.
 
         Raises a 400_BAD_REQUEST error if the cart is empty or if the total price of the cart is zero.
+
+        Carts with limited (hot) items need a waiting-room pass in the
+        ``X-Checkout-Token`` header; without one the client is put in line and
+        gets 202 with its position (poll ``cart/waiting-room/``), or goes straight
+        through if a pass is free.
+
+        Retries carrying the same ``Idempotency-Key`` get the first response back
+        instead of a second order (see core.idempotency).
         """
-        cart, _ = Cart.objects.get_or_create(user=request.user)
+        cart = Cart.objects.filter(user=request.user).first()
+        if cart is None:
+            return Response({"detail": "Your cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
+        if waiting_room.required_for(cart) and not waiting_room.consume(
+            request.user.pk, request.headers.get("X-Checkout-Token")
+        ):
+            place = waiting_room.status(request.user.pk, join=True)
+            if not waiting_room.consume(request.user.pk, place["token"]):
+                return Response(WaitingRoomSerializer(place).data, status=status.HTTP_202_ACCEPTED)
         try:
             order = create_order_from_cart(cart)
         except ValueError as e:
@@ -59,7 +146,16 @@ class CartViewSet(ModelViewSet):
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
 
-class CartItemViewSet(ModelViewSet):
+    @action(detail=False, methods=["get"], url_path="waiting-room")
+    def waiting_room_status(self, request):
+        """Poll the checkout waiting room; the token appears once admitted."""
+        place = waiting_room.status(request.user.pk)
+        if place is None:
+            return Response({"detail": "Not in the waiting room."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(WaitingRoomSerializer(place).data)
+
+
+class CartItemViewSet(InstrumentedViewMixin, ModelViewSet):
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
 
@@ -67,14 +163,54 @@ class CartItemViewSet(ModelViewSet):
         return CartItem.objects.filter(cart__user=self.request.user).select_related("store_item","cart")
 
 
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(InstrumentedViewMixin, ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    page_size = 10
+    max_page_size = 50
+    filter_backends = [OrderingFilter]
+    ordering_fields = ["created_at"]
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related("items__store_item")
+        # Totals are stored on Order and lines render from their snapshots: one query each
+        return Order.objects.filter(user=self.request.user).prefetch_related("items")
 
-class OrderItemViewSet(ModelViewSet):
+    def filter_queryset(self, queryset):
+        """
+        ``?status=``, ``?created_after=`` / ``?created_before=`` and ``?paid=`` on the
+        list. Pages walk the partial (user, [status,] created_at, id) indexes on Order.
+        """
+        queryset = super().filter_queryset(queryset)
+        if self.action != "list":
+            return queryset
+        params = OrderFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        if "status" in filters:
+            queryset = queryset.filter(status=filters["status"])
+        if "created_after" in filters:
+            queryset = queryset.filter(created_at__gte=filters["created_after"])
+        if "created_before" in filters:
+            queryset = queryset.filter(created_at__lt=filters["created_before"])
+        if filters["paid"] is not None:
+            # Paid orders are exactly status PAID, which keeps the status index usable
+            queryset = queryset.filter(status="PAID") if filters["paid"] else queryset.exclude(status="PAID")
+        return queryset
+
+    @extend_schema(parameters=[OrderFilterSerializer])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        """Cancel a pending order and return its stock (see sales.services.cancel_orders)."""
+        order = self.get_object()
+        if not cancel_orders([order.pk], statuses=["PENDING"]):
+            return Response({"detail": "Only pending orders can be cancelled."}, status=status.HTTP_400_BAD_REQUEST)
+        order.refresh_from_db()
+        return Response(self.get_serializer(order).data)
+
+class OrderItemViewSet(InstrumentedViewMixin, ModelViewSet):
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated]
 
@@ -0,0 +1,125 @@
+"""
+Virtual waiting room in front of checkout for limited (hot) items.
+
+Carts holding a ``StoreItem.is_hot`` item need a checkout pass. Passes are
+handed out first come, first served from a Redis FIFO (a sorted set scored by
+arrival) at ``WAITING_ROOM["RATE"]`` per second, with bursts of up to
+``WAITING_ROOM["BURST"]``; each admission run is one Lua script, so
+concurrent pollers cannot admit more than the rate allows. A pass is valid for
+``PASS_TTL`` seconds and is used up by one checkout.
+
+Queued clients poll with their place in line and an ETA. A client that stops
+polling for ``HEARTBEAT_TTL`` seconds is dropped when it reaches the head
+instead of using up an admission.
+"""
+from __future__ import annotations
+
+import math
+import secrets
+import time
+
+import redis
+from django.conf import settings
+
+QUEUE_KEY = "waiting-room:queue"
+SEQ_KEY = "waiting-room:seq"
+BUCKET_KEY = "waiting-room:bucket"
+PASS_PREFIX = "waiting-room:pass:"
+SEEN_PREFIX = "waiting-room:seen:"
+
+DEFAULTS = {"ENABLED": True, "RATE": 10, "BURST": 10, "PASS_TTL": 120, "HEARTBEAT_TTL": 30}
+
+# KEYS: queue, bucket. ARGV: now, rate, burst, pass_ttl, pass prefix, seen prefix, candidate passes...
+ADMIT_SCRIPT = """
+local now, rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local allowance = tonumber(redis.call('HGET', KEYS[2], 'allowance') or burst)
+local last = tonumber(redis.call('HGET', KEYS[2], 'ts') or now)
+allowance = math.min(burst, allowance + math.max(0, now - last) * rate)
+local next_pass = 7
+while allowance >= 1 and next_pass <= #ARGV do
+    local head = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+    if not head then break end
+    redis.call('ZREM', KEYS[1], head)
+    if redis.call('EXISTS', ARGV[6] .. head) == 1 then
+        redis.call('SET', ARGV[5] .. head, ARGV[next_pass], 'EX', ARGV[4])
+        next_pass = next_pass + 1
+        allowance = allowance - 1
+    end
+end
+redis.call('HSET', KEYS[2], 'allowance', tostring(allowance), 'ts', tostring(now))
+return next_pass - 7
+"""
+
+# KEYS: pass key. ARGV: token. Deletes and returns 1 only if the token matches.
+CONSUME_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(getattr(settings, "WAITING_ROOM_REDIS_URL", settings.REDIS_URL))
+    return _client
+
+
+def set_client(client) -> None:
+    """Swap the Redis connection (tests use fakeredis)."""
+    global _client
+    _client = client
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, "WAITING_ROOM", {})}
+
+
+def required_for(cart) -> bool:
+    """Whether checking out ``cart`` has to go through the waiting room."""
+    return config()["ENABLED"] and cart.items.filter(store_item__is_hot=True).exists()
+
+
+def _admit(now: float) -> int:
+    conf = config()
+    candidates = [secrets.token_urlsafe(16) for _ in range(int(conf["BURST"]))]
+    return get_client().eval(
+        ADMIT_SCRIPT, 2, QUEUE_KEY, BUCKET_KEY,
+        now, conf["RATE"], conf["BURST"], conf["PASS_TTL"], PASS_PREFIX, SEEN_PREFIX, *candidates,
+    )
+
+
+def status(user_id, *, join=False, now=None) -> dict | None:
+    """
+    Admit whoever is due, then report ``user_id``'s state:
+    ``{"token": ..., "position": 0, "eta_seconds": 0}`` once admitted, else the
+    1-based position and ETA. ``join`` puts the user in line if they are not yet;
+    without it, users who are neither queued nor admitted get None.
+    """
+    conf = config()
+    client = get_client()
+    member = str(user_id)
+    now = time.time() if now is None else now
+    client.set(SEEN_PREFIX + member, 1, ex=conf["HEARTBEAT_TTL"])
+    if join and client.get(PASS_PREFIX + member) is None:
+        client.zadd(QUEUE_KEY, {member: client.incr(SEQ_KEY)}, nx=True)
+    _admit(now)
+
+    token = client.get(PASS_PREFIX + member)
+    if token is not None:
+        return {"token": token.decode(), "position": 0, "eta_seconds": 0}
+    rank = client.zrank(QUEUE_KEY, member)
+    if rank is None:
+        return None
+    return {"token": None, "position": rank + 1, "eta_seconds": math.ceil((rank + 1) / conf["RATE"])}
+
+
+def consume(user_id, token: str | None) -> bool:
+    """Use up ``user_id``'s checkout pass if ``token`` is it."""
+    if not token:
+        return False
+    return bool(get_client().eval(CONSUME_SCRIPT, 1, PASS_PREFIX + str(user_id), token))
@@ -15,3 +15,10 @@ def _celery_eager(settings):
     settings.CELERY_TASK_EAGER_PROPAGATES = True
     settings.CELERY_BROKER_URL = "memory://"
     settings.CELERY_RESULT_BACKEND = "cache+memory://"
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    # locmem cache outlives the per-test DB rollback; don't serve stale catalog pages
+    from django.core.cache import cache
+    cache.clear()
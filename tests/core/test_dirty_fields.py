@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from catalog.models import Category, Product, ProductVariant
+from marketplace.models import Seller, Store, StoreItem
+from sales.models import Order, OrderItem
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def store_item():
+    user = get_user_model().objects.create_user(username="dirty", email="dirty@example.com", password="p")
+    store = Store.objects.create(owner=Seller.objects.create(user=user, display_name="D"), name="Dirty Shop")
+    product = Product.objects.create(category=Category.objects.create(name="C"), title="T", price=1)
+    variant = ProductVariant.objects.create(product=product, name="V", attributes={"color": "red"})
+    return StoreItem.objects.create(store=store, variant=variant, sku="DIRTY-1", price=Decimal("10.00"), stock=10)
+
+
+def test_loaded_instances_track_changes(store_item):
+    item = StoreItem.objects.get(pk=store_item.pk)
+    assert item.changed_fields == set()
+    assert not item.has_changed("stock")
+
+    item.stock = 4
+    item.price = Decimal("12.50")
+    assert item.changed_fields == {"stock", "price"}
+    assert (item.previous("stock"), item.has_changed("stock")) == (10, True)
+
+    item.save(update_fields=["stock"])
+    assert item.changed_fields == {"price"}
+    assert item.previous("stock") == 4
+
+    variant = ProductVariant.objects.get(pk=store_item.variant_id)
+    variant.attributes["color"] = "blue"  # in-place JSON edits count too
+    assert variant.has_changed("attributes")
+
+    # a deferred field is fetched once, on first ask
+    deferred = StoreItem.objects.only("sku").get(pk=store_item.pk)
+    with CaptureQueriesContext(connection) as ctx:
+        assert deferred.previous("stock") == 4
+        assert deferred.previous("stock") == 4
+    assert len(ctx) == 1
+
+    fresh = StoreItem(sku="NEW")
+    assert fresh.previous("stock") is None and fresh.has_changed("sku")
+
+
+def test_signal_saves_skip_the_prefetch_of_the_old_row(store_item):
+    """
+    Benchmark: a stock save is one UPDATE (it used to SELECT the old stock
+    first) plus the alert's outbox INSERT, and an order status save no longer
+    re-reads the order.
+    """
+    from core.models import OutboxMessage
+
+    item = StoreItem.objects.get(pk=store_item.pk)
+    item.stock = 2
+    with CaptureQueriesContext(connection) as ctx:
+        item.save(update_fields=["stock"])
+    assert sorted(q["sql"].split()[0] for q in ctx) == ["INSERT", "UPDATE"]
+    alerts = OutboxMessage.objects.filter(task="marketplace.tasks.notify_low_stock_email_task")
+    assert list(alerts.values_list("args", flat=True)) == [[str(item.pk), "DIRTY-1", 2, 3]]
+
+    order = Order.objects.create(user=store_item.store.owner.user)
+    OrderItem.objects.create(order=order, store_item=item, quantity=3, unit_price=Decimal("10.00"))
+    order = Order.objects.get(pk=order.pk)
+    order.status = "CANCELLED"
+    with CaptureQueriesContext(connection) as ctx:
+        order.save(update_fields=["status", "updated_at"])
+    order_reads = [q for q in ctx if q["sql"].startswith("SELECT") and 'FROM "sales_order"' in q["sql"]]
+    assert order_reads == []
+    item.refresh_from_db()
+    assert item.stock == 5
@@ -0,0 +1,85 @@
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+from catalog.models import Category, Product, ProductVariant
+from core import idempotency
+from marketplace.models import Seller, Store, StoreItem
+from sales.models import Cart, CartItem, Order
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def buyer():
+    User = get_user_model()
+    seller = Seller.objects.create(user=User.objects.create_user(username="is", email="is@example.com", password="p"), display_name="S")
+    store = Store.objects.create(owner=seller, name="Idem Shop")
+    variant = ProductVariant.objects.create(product=Product.objects.create(category=Category.objects.create(name="C"), title="T", price=1), name="V")
+    item = StoreItem.objects.create(store=store, variant=variant, sku="IDEM-1", price=Decimal("10.00"), stock=10)
+    user = User.objects.create_user(username="ib", email="ib@example.com", password="p")
+    cart, _ = Cart.objects.get_or_create(user=user)
+    CartItem.objects.create(cart=cart, store_item=item, quantity=1)
+    client = APIClient(); client.force_authenticate(user)
+    return user, client
+
+
+def test_checkout_retries_replay_the_first_order(buyer):
+    user, client = buyer
+    first = client.post("/api/sales/cart/checkout/", HTTP_IDEMPOTENCY_KEY="k-1")
+    assert first.status_code == 201
+
+    again = client.post("/api/sales/cart/checkout/", HTTP_IDEMPOTENCY_KEY="k-1")
+    assert again.status_code == 201 and again["Idempotent-Replayed"] == "true"
+    assert again.json()["id"] == first.json()["id"]
+    assert Order.objects.filter(user=user).count() == 1
+
+    # without a key, or with a new one, the (now empty) cart is checked out again
+    assert client.post("/api/sales/cart/checkout/", HTTP_IDEMPOTENCY_KEY="k-2").status_code == 201
+    mismatch = client.post("/api/sales/cart/checkout/", {"note": "x"}, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+    assert mismatch.status_code == 422
+
+
+def test_concurrent_duplicate_waits_for_the_first_response(buyer, settings, monkeypatch):
+    user, client = buyer
+    settings.IDEMPOTENCY = {"WAIT": 2}
+    monkeypatch.setattr(idempotency, "fingerprint", lambda request, args, kwargs: "same-body")
+    held = idempotency.lock_key("checkout", user.pk, "k-3")
+    cache.add(held, "someone-else")
+
+    def first_request_finishes():
+        time.sleep(0.2)
+        stored = {"status": 201, "data": {"id": "from-first"}, "fingerprint": "same-body"}
+        cache.set(idempotency.response_key("checkout", user.pk, "k-3"), stored)
+        cache.delete(held)
+
+    threading.Thread(target=first_request_finishes).start()
+    res = client.post("/api/sales/cart/checkout/", HTTP_IDEMPOTENCY_KEY="k-3")
+    assert res.status_code == 201 and res.json() == {"id": "from-first"}
+    assert Order.objects.filter(user=user).count() == 0
+
+    settings.IDEMPOTENCY = {"WAIT": 0}
+    cache.add(idempotency.lock_key("checkout", user.pk, "k-4"), "someone-else")
+    assert client.post("/api/sales/cart/checkout/", HTTP_IDEMPOTENCY_KEY="k-4").status_code == 409
+
+
+def test_payment_start_retry_does_not_call_the_gateway_twice(buyer):
+    from payments import gateway
+    from payments.stub_gateway import StubGateway
+
+    user, client = buyer
+    order = Order.objects.get(pk=client.post("/api/sales/cart/checkout/").json()["id"])
+    with StubGateway() as stub:
+        gateway.set_client(gateway.ZarinpalClient({"BASE_URL": stub.url}))
+        try:
+            first = client.post(f"/api/payments/start/{order.pk}/", HTTP_IDEMPOTENCY_KEY="pay-1")
+            again = client.post(f"/api/payments/start/{order.pk}/", HTTP_IDEMPOTENCY_KEY="pay-1")
+        finally:
+            gateway.set_client(None)
+    assert first.status_code == again.status_code == 200
+    assert again.json() == first.json()
+    assert stub.calls["request"] == 1
@@ -0,0 +1,65 @@
+import pytest
+from rest_framework.test import APIClient
+from catalog.models import Category
+from core.instrumentation import QueryBudgetExceeded, registry
+
+pytestmark = pytest.mark.django_db
+
+CATEGORY_ROUTE = "api/catalog/categories/$"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_registry():
+    registry.reset()
+    yield
+    registry.reset()
+
+
+def test_requests_report_server_timing_and_route_metrics():
+    Category.objects.create(name="Phones")
+    client = APIClient()
+    for _ in range(3):
+        resp = client.get("/api/catalog/categories/?page_size=5")
+        assert resp.status_code == 200
+
+    timing = resp["Server-Timing"]
+    assert timing.startswith("db;dur=") and "queries" in timing
+    assert "serializer;dur=" in timing and "total;dur=" in timing
+
+    stats = registry.snapshot()[("GET", CATEGORY_ROUTE)]
+    assert stats["duration"]["count"] == 3
+    # first request renders, the next two are catalog cache hits with no queries
+    assert stats["queries"]["quantiles"][0.5] == 0
+    assert stats["queries"]["quantiles"][0.99] >= 1
+    assert stats["serializer"]["sum"] > 0
+
+    body = client.get("/metrics").content.decode()
+    assert "# TYPE http_request_duration_seconds summary" in body
+    assert f'http_request_queries_count{{method="GET",route="{CATEGORY_ROUTE}"}} 3' in body
+    assert 'quantile="0.99"' in body
+    # the scrape itself is recorded for the next one, not counted in its own body
+    assert 'route="metrics"' not in body
+
+
+def test_query_budget_overrun_fails_in_tests(settings):
+    Category.objects.create(name="Phones")
+    settings.QUERY_BUDGET = {"DEFAULT": None, "ROUTES": {CATEGORY_ROUTE: 0}, "RAISE": True}
+    with pytest.raises(QueryBudgetExceeded):
+        APIClient().get("/api/catalog/categories/")
+
+    settings.QUERY_BUDGET = {**settings.QUERY_BUDGET, "RAISE": False}
+    assert APIClient().get("/api/catalog/categories/").status_code == 200
+
+
+def test_metrics_are_for_staff_and_allowed_scrapers(settings, django_user_model):
+    settings.METRICS_PUBLIC = False
+    settings.METRICS_ALLOWED_IPS = ["10.0.0.5"]
+    client = APIClient()
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", REMOTE_ADDR="10.0.0.5").status_code == 200
+
+    client.force_login(django_user_model.objects.create_user(username="ops", email="ops@example.com", password="p", is_staff=True))
+    assert client.get("/metrics").status_code == 200
+
+    settings.METRICS_PUBLIC = True
+    assert APIClient().get("/metrics").status_code == 200
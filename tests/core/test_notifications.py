@@ -0,0 +1,98 @@
+from decimal import Decimal
+
+import fakeredis
+import pytest
+import redis
+from django.contrib.auth import get_user_model
+from django.core import mail
+from rest_framework.test import APIClient
+
+from catalog.models import Category, Product, ProductVariant
+from core import notifications, outbox
+from core.models import OutboxMessage
+from core.notifications import Notification, dispatch
+from marketplace.models import Seller, Store, StoreItem
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def fake_redis():
+    notifications.set_client(fakeredis.FakeRedis())
+    yield
+    notifications.set_client(None)
+
+
+def test_an_otp_request_sends_one_code(monkeypatch):
+    from accounts.views import OTPRequestView
+
+    monkeypatch.setattr(OTPRequestView, "throttle_classes", [])
+    res = APIClient().post("/api/accounts/otp/request/", {"target": "otp@example.com", "purpose": "login"})
+    assert res.status_code == 200
+    assert list(OutboxMessage.objects.values_list("task", flat=True)) == ["accounts.tasks.send_otp_task"]
+
+    assert outbox.drain() == {"sent": 1}
+    OutboxMessage.objects.update(status="PENDING")  # the relay died before committing: published again
+    assert outbox.drain() == {"sent": 1}
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].to == ["otp@example.com"] and "verification code is" in mail.outbox[0].body
+
+
+def test_channel_routing_and_dedup(caplog):
+    caplog.set_level("INFO", logger="core.notifications")
+    assert dispatch(Notification("otp", "+989120000000", "code 1", key="otp:1")) == "sent"
+    assert dispatch(Notification("otp", "+989120000000", "code 1", key="otp:1")) == "duplicate"
+    assert dispatch(Notification("otp", "a@example.com", "code 2", subject="Code", key="otp:2")) == "sent"
+    assert [m.to for m in mail.outbox] == [["a@example.com"]]
+    assert "SMS to +989120000000: code 1" in caplog.text
+
+
+def test_low_stock_bursts_become_one_email_per_owner(monkeypatch, settings):
+    from core import tasks
+
+    User = get_user_model()
+    owner = User.objects.create_user(username="ls", email="owner@example.com", password="p")
+    store = Store.objects.create(owner=Seller.objects.create(user=owner, display_name="LS"), name="Low Shop")
+    product = Product.objects.create(category=Category.objects.create(name="LS"), title="T", price=1)
+    items = [
+        StoreItem.objects.create(store=store, variant=ProductVariant.objects.create(product=product, name=f"V{i}"),
+                                 sku=f"LOW-{i}", price=Decimal("5.00"), stock=10)
+        for i in range(3)
+    ]
+    # the same item crossing the threshold again and again is recorded once
+    for stock in (3, 10, 2, 10, 1):
+        items[0].stock = stock
+        items[0].save(update_fields=["stock"])
+    for item in items[1:]:
+        item.stock = 0
+        item.save(update_fields=["stock"])
+    assert OutboxMessage.objects.filter(task="marketplace.tasks.notify_low_stock_email_task").count() == 3
+
+    # as the worker runs them: the first one opens the owner's window and schedules its flush
+    flushes = []
+    monkeypatch.setattr(tasks.flush_notifications_task, "apply_async", lambda args, countdown: flushes.append((args, countdown)))
+    from marketplace.tasks import notify_low_stock_email_task
+    for row in OutboxMessage.objects.order_by("id"):
+        notify_low_stock_email_task(*row.args)
+    notify_low_stock_email_task(*row.args)  # redelivered
+    assert mail.outbox == []
+    assert flushes == [(("low_stock", "email", "owner@example.com"), settings.NOTIFICATIONS["COALESCE"]["low_stock"])]
+
+    assert tasks.flush_notifications_task(*flushes[0][0]) == 3
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].subject == "Low stock alert for LOW-0 (+2 more)"
+    assert mail.outbox[0].body.count("Current stock:") == 3
+    assert tasks.flush_notifications_task(*flushes[0][0]) == 0
+
+
+def test_sends_without_dedup_when_redis_is_down():
+    class DownRedis:
+        def __getattr__(self, name):
+            def fail(*args, **kwargs):
+                raise redis.ConnectionError("Connection refused")
+            return fail
+
+    notifications.set_client(DownRedis())
+    assert dispatch(Notification("low_stock", "o@example.com", "low", key="low-stock:1")) == "sent"
+    assert dispatch(Notification("low_stock", "o@example.com", "low", key="low-stock:1")) == "sent"
+    assert len(mail.outbox) == 2
@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+import pytest
+from celery import current_app as celery_app
+from django.db import transaction
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from core import outbox
+from core.models import OutboxMessage
+from core.tasks import prune_outbox_task
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    """Record publishes instead of talking to a broker; set ``broker.down`` to make them fail."""
+    class Broker:
+        down = False
+        published = []
+
+    def send_task(name, args=None, kwargs=None, task_id=None, **options):
+        if Broker.down:
+            raise OperationalError("Error 111 connecting to broker. Connection refused.")
+        Broker.published.append((name, args, task_id))
+
+    monkeypatch.setitem(celery_app.conf, "CELERY_TASK_ALWAYS_EAGER", False)  # the app reads CELERY_-namespaced keys
+    monkeypatch.setattr(celery_app, "send_task", send_task)
+    Broker.published = []
+    return Broker
+
+
+def test_messages_are_written_with_the_transaction_and_deduplicated():
+    with pytest.raises(RuntimeError), transaction.atomic():
+        outbox.enqueue(prune_outbox_task, dedup_key="rolled-back")
+        raise RuntimeError
+    assert not OutboxMessage.objects.exists()
+
+    with transaction.atomic():
+        outbox.enqueue("sales.tasks.send_order_paid_email_task", "o-1", dedup_key="order-paid:o-1")
+        outbox.enqueue_all([
+            outbox.message("sales.tasks.send_order_paid_email_task", "o-1", dedup_key="order-paid:o-1"),
+            outbox.message("sales.tasks.send_order_paid_email_task", "o-2", dedup_key="order-paid:o-2"),
+        ])
+    assert list(OutboxMessage.objects.order_by("id").values_list("args", "status")) == [(["o-1"], "PENDING"), (["o-2"], "PENDING")]
+
+
+def test_relay_survives_a_broker_outage_and_backs_off(broker):
+    outbox.enqueue_all(outbox.message(prune_outbox_task, dedup_key=f"m-{i}") for i in range(3))
+    first = OutboxMessage.objects.order_by("id").first()
+
+    broker.down = True
+    assert outbox.drain() == {"retry": 1}
+    first.refresh_from_db()
+    assert (first.status, first.attempts) == ("PENDING", 1) and first.available_at > timezone.now()
+    assert "Connection refused" in first.last_error
+    assert OutboxMessage.objects.filter(attempts=0).count() == 2
+
+    broker.down = False
+    assert outbox.drain({"BATCH_SIZE": 2}) == {"sent": 2}
+    OutboxMessage.objects.update(available_at=timezone.now())
+    assert outbox.drain({"BATCH_SIZE": 2}) == {"sent": 1}
+    assert outbox.drain() == {}
+    assert sorted(task_id for _, _, task_id in broker.published) == sorted(
+        f"outbox-{pk}" for pk in OutboxMessage.objects.values_list("pk", flat=True)
+    )
+    assert set(OutboxMessage.objects.values_list("status", flat=True)) == {"SENT"}
+
+    # published rows are pruned after RETENTION, and their dedup keys with them
+    OutboxMessage.objects.update(sent_at=timezone.now() - timedelta(days=30))
+    assert prune_outbox_task() == 3
+    outbox.enqueue(prune_outbox_task, dedup_key="m-0")
+    assert OutboxMessage.objects.count() == 1
+
+
+def test_relay_gives_up_after_max_attempts(broker):
+    outbox.enqueue(prune_outbox_task)
+    broker.down = True
+    assert outbox.relay({"MAX_ATTEMPTS": 1}) == {"dead": 1}
+    assert OutboxMessage.objects.get().status == "DEAD"
+    assert outbox.drain() == {}
+
+
+def test_relay_runs_tasks_inline_when_celery_is_eager():
+    from sales.models import Order
+
+    outbox.enqueue("sales.tasks.send_order_paid_email_task", "00000000-0000-0000-0000-000000000000")
+    assert not Order.objects.exists()
+    assert outbox.drain() == {"sent": 1}
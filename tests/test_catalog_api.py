@@ -14,7 +14,7 @@ def test_category_crud():
     # list
     resp = client.get("/api/catalog/categories/")
     assert resp.status_code == 200
-    assert len(resp.data) == 1
+    assert len(resp.data["results"]) == 1
     # retrieve
     resp = client.get(f"/api/catalog/categories/{cid}/")
     assert resp.status_code == 200
@@ -30,7 +30,132 @@ def test_product_crud():
     # list
     resp = client.get("/api/catalog/products/")
     assert resp.status_code == 200
-    assert len(resp.data) == 1
+    assert len(resp.data["results"]) == 1
     # retrieve
     resp = client.get(f"/api/catalog/products/{pid}/")
     assert resp.status_code == 200
+
+def test_product_list_is_cursor_paginated():
+    client = APIClient()
+    cat = Category.objects.create(name="Tablets")
+    Product.objects.bulk_create(
+        [Product(category=cat, title=f"Tab {i}", slug=f"tab-{i}", price="10.00") for i in range(30)]
+    )
+    # default page size comes from ProductViewSet
+    resp = client.get("/api/catalog/products/")
+    assert resp.status_code == 200
+    assert len(resp.data["results"]) == 24
+    seen = [p["id"] for p in resp.data["results"]]
+    resp = client.get(resp.data["next"])
+    seen += [p["id"] for p in resp.data["results"]]
+    assert resp.data["next"] is None
+    assert len(set(seen)) == 30
+    # ?page_size is capped at the view's max_page_size
+    resp = client.get("/api/catalog/products/", {"page_size": 1000})
+    assert len(resp.data["results"]) == 30
+
+def test_catalog_reads_are_cached_with_etag_and_invalidated_on_write():
+    from catalog.cache import cache_stats, reset_cache_stats
+
+    client = APIClient()
+    cat = Category.objects.create(name="Monitors")
+    product = Product.objects.create(category=cat, title="UltraWide", price="300.00")
+    reset_cache_stats()
+
+    first = client.get("/api/catalog/products/")
+    second = client.get("/api/catalog/products/")
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert cache_stats() == {"hits": 1, "misses": 1}
+    metrics = client.get("/metrics").content.decode()
+    assert 'catalog_cache_lookups_total{result="hit"} 1' in metrics
+
+    etag = first["ETag"]
+    resp = client.get("/api/catalog/products/", HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 304
+
+    # a save bumps the catalog version: fresh body, new ETag
+    product.title = "UltraWide Pro"
+    product.save()
+    resp = client.get("/api/catalog/products/", HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp.data["results"][0]["title"] == "UltraWide Pro"
+    assert resp["ETag"] != etag
+
+    # soft delete goes through BaseModel.delete -> post_save
+    product.delete()
+    resp = client.get("/api/catalog/products/")
+    assert resp.data["results"] == []
+    assert client.get(f"/api/catalog/products/{product.pk}/").status_code == 404
+
+def test_product_search_ranks_prefix_matches_with_category_facets():
+    from catalog.models import ProductVariant
+
+    client = APIClient()
+    phones = Category.objects.create(name="Phones")
+    cases = Category.objects.create(name="Cases")
+    galaxy = Product.objects.create(category=phones, title="Galaxy S24", price="900.00")
+    Product.objects.create(category=cases, title="Leather case", description="Fits the Galaxy S24", price="20.00")
+    pixel = Product.objects.create(category=phones, title="Pixel 9", price="800.00")
+    ProductVariant.objects.create(product=pixel, name="Obsidian", attributes={"color": "obsidian"})
+    Product.objects.create(category=phones, title="Galaxy S10", price="100.00", is_active=False)
+
+    resp = client.get("/api/catalog/search/", {"q": "galax"})
+    assert resp.status_code == 200
+    assert resp.data["count"] == 2
+    # a title hit outranks a description hit
+    assert resp.data["results"][0]["id"] == str(galaxy.id)
+    assert {f["name"]: f["count"] for f in resp.data["facets"]} == {"Phones": 1, "Cases": 1}
+
+    # category narrows results, facets still cover the whole query
+    resp = client.get("/api/catalog/search/", {"q": "galaxy", "category": str(cases.id)})
+    assert resp.data["count"] == 1
+    assert len(resp.data["facets"]) == 2
+
+    # variant attributes are indexed and follow variant writes
+    assert client.get("/api/catalog/search/", {"q": "obsidian"}).data["count"] == 1
+    ProductVariant.objects.filter(product=pixel).get().delete()
+    assert client.get("/api/catalog/search/", {"q": "obsidian"}).data["count"] == 0
+
+    # category renames reach their products' documents
+    phones.name = "Smartphones"
+    phones.save()
+    assert client.get("/api/catalog/search/", {"q": "smartph"}).data["count"] == 2
+
+    pixel.hard_delete()
+    assert client.get("/api/catalog/search/", {"q": "pixel"}).data["count"] == 0
+    assert client.get("/api/catalog/search/").status_code == 400
+
+
+@pytest.mark.django_db(transaction=True)
+def test_search_survives_a_migration_that_rebuilds_the_product_table():
+    """
+    SQLite rebuilds catalog_product for 0005 (new columns), renumbering its rowids
+    after a hard delete left a gap; the index is keyed on product ids, not rowids.
+    """
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+    from catalog.search import reindex_products
+
+    executor = MigrationExecutor(connection)
+    leaves = executor.loader.graph.leaf_nodes()
+    executor.migrate([("catalog", "0004_variant_attribute_index")])
+    try:
+        apps = executor.loader.project_state([("catalog", "0004_variant_attribute_index")]).apps
+        OldCategory = apps.get_model("catalog", "Category")
+        OldProduct = apps.get_model("catalog", "Product")
+        category = OldCategory.objects.create(name="Radios", slug="radios")
+        products = {
+            name: OldProduct.objects.create(category=category, title=name.title(), slug=name, price=1)
+            for name in ("alpha", "bravo", "charlie")
+        }
+        reindex_products([p.pk for p in products.values()])
+        OldProduct.objects.filter(pk=products["alpha"].pk).delete()
+    finally:
+        executor = MigrationExecutor(connection)
+        executor.migrate(leaves)
+
+    client = APIClient()
+    for name in ("bravo", "charlie"):
+        resp = client.get("/api/catalog/search/", {"q": name})
+        assert [r["id"] for r in resp.data["results"]] == [str(products[name].pk)]